@@ -40,6 +40,100 @@ class Config:
     #: Postgres credentials
     POSTGRES = {}
 
+    #: Maximum memory (in bytes) used by cached guild snapshots.
+    #  least recently used guilds are evicted past this limit.
+    GUILD_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    #: How many channels get their type, guild and
+    #  category cached. least recently used channels
+    #  are evicted past this limit.
+    CHANNEL_CACHE_SIZE = 100_000
+
+    #: How many of the newest messages of a channel are kept
+    #  in memory to answer message history requests.
+    MESSAGE_BUFFER_DEPTH = 100
+
+    #: Maximum memory (in bytes) used by buffered messages,
+    #  across all channels. least recently used channels
+    #  are evicted past this limit.
+    MESSAGE_BUFFER_MAX_BYTES = 32 * 1024 * 1024
+
+    #: Guilds with at least this many members get their
+    #  members x channels permissions precomputed in a matrix.
+    #  requires numpy, which is optional.
+    PERMISSION_MATRIX_MIN_MEMBERS = 1000
+
+    #: Outbound queue of each gateway connection. Connections
+    #  with more than GATEWAY_QUEUE_HIGH_WATER payloads waiting
+    #  for longer than GATEWAY_QUEUE_TIMEOUT seconds, or with
+    #  GATEWAY_QUEUE_MAX payloads waiting, are closed.
+    GATEWAY_QUEUE_HIGH_WATER = 1000
+    GATEWAY_QUEUE_MAX = 5000
+    GATEWAY_QUEUE_TIMEOUT = 30
+
+    #: How many dispatches, and how many bytes of them, are
+    #  kept per session so that it can be resumed.
+    GATEWAY_RESUME_MAX_EVENTS = 250
+    GATEWAY_RESUME_MAX_BYTES = 1024 * 1024
+
+    #: How often (in seconds) connections that missed
+    #  their heartbeat are looked for.
+    HEARTBEAT_RESOLUTION = 1.0
+
+    #: How many parts of READYs (guilds, settings, ...) are
+    #  fetched at once, across all connections. Defaults to
+    #  half of the database pool (POSTGRES['max_size']).
+    READY_CONCURRENCY = None
+
+    #: How many IDENTIFYs and RESUMEs are processed at once.
+    #  Other connections wait in line, RESUMEs first.
+    IDENTIFY_CONCURRENCY = 16
+
+    #: Draining (on shutdown, SIGUSR1 or 'manage.py drain start')
+    #  disconnects at least DRAIN_RATE sessions per second, faster
+    #  if needed to finish within DRAIN_WINDOW seconds. Progress
+    #  is written to DRAIN_STATUS_FILE, when set.
+    DRAIN_RATE = 50
+    DRAIN_WINDOW = 60
+    DRAIN_STATUS_FILE = None
+
+    #: Sessions drained on shutdown are saved next to
+    #  SESSION_STORE_PATH, in a file per worker only readable by
+    #  the server's user, and loaded back on startup, so clients
+    #  can resume them. Each file is loaded by a single worker.
+    #  Saves older than SESSION_STORE_MAX_AGE seconds are ignored,
+    #  and restored sessions not resumed within
+    #  SESSION_RESTORE_TIMEOUT seconds are dropped.
+    SESSION_STORE_PATH = None
+    SESSION_STORE_MAX_AGE = 300
+    SESSION_RESTORE_TIMEOUT = 60
+
+    #: Unix socket of the bus between gateway workers, needed to
+    #  run many of them on a host (e.g 'hypercorn --workers 4').
+    #  Workers then share WS_PORT. Dispatches, subscriptions
+    #  made through the API and changes to the guild, channel,
+    #  permission and message caches are published on the bus,
+    #  so every worker applies them to its own sessions and caches.
+    GATEWAY_BUS = None
+
+    #: 'host:port' of a broker started with 'manage.py broker',
+    #  to share the same messages as GATEWAY_BUS between many
+    #  server nodes. Takes precedence over GATEWAY_BUS.
+    PUBSUB_BROKER = None
+
+    #: zstd-stream gateway compression, which needs the
+    #  zstandard package. GATEWAY_ZSTD_DICT can point to a
+    #  dictionary trained with 'manage.py bench compression
+    #  --train-dict', clients must then use the same dictionary.
+    GATEWAY_ZSTD_LEVEL = 3
+    GATEWAY_ZSTD_WINDOW_LOG = None
+    GATEWAY_ZSTD_DICT = None
+
+    #: Log the counters of the identify queue, dispatch
+    #  delivery, outbound queues, resume buffers and caches
+    #  every STATS_LOG_INTERVAL seconds. None disables it.
+    STATS_LOG_INTERVAL = 60
+
 
 class Development(Config):
     DEBUG = True
@@ -65,33 +65,10 @@ async def get_messages(channel_id):
         await _dm_pre_dispatch(channel_id, peer_id)
 
     limit = extract_limit(request, 50)
-
-    where_clause = ''
     before, after = query_tuple_from_args(request.args, limit)
 
-    if before:
-        where_clause += f'AND id < {before}'
-
-    if after:
-        where_clause += f'AND id > {after}'
-
-    message_ids = await app.db.fetch(f"""
-    SELECT id
-    FROM messages
-    WHERE channel_id = $1 {where_clause}
-    ORDER BY id DESC
-    LIMIT {limit}
-    """, channel_id)
-
-    result = []
-
-    for message_id in message_ids:
-        msg = await app.storage.get_message(message_id['id'], user_id)
-
-        if msg is None:
-            continue
-
-        result.append(msg)
+    result = await app.storage.get_channel_messages(
+        channel_id, user_id, limit, before, after)
 
     log.info('Fetched {} messages', len(result))
     return jsonify(result)
@@ -170,6 +147,9 @@ async def create_message(channel_id: int, actual_guild_id: int,
             data.get('embeds', [])
         )
 
+        await app.storage.chan_bump_last_message(
+            conn, channel_id, message_id)
+
     return message_id
 
 async def _guild_text_mentions(payload: dict, guild_id: int,
@@ -267,6 +247,7 @@ async def _create_message(channel_id):
         })
 
     payload = await app.storage.get_message(message_id, user_id)
+    app.message_buffer.append(channel_id, payload)
 
     if ctype == ChannelType.DM:
         # guild id here is the peer's ID.
@@ -328,6 +309,7 @@ async def edit_message(channel_id, message_id):
     # only dispatch MESSAGE_UPDATE if any update
     # actually happened
     if updated:
+        app.message_buffer.update(channel_id, message)
         await app.dispatcher.dispatch('channel', channel_id,
                                       'MESSAGE_UPDATE', message)
 
@@ -359,6 +341,9 @@ async def delete_message(channel_id, message_id):
     WHERE messages.id = $1
     """, message_id)
 
+    await app.storage.chan_reset_last_message(channel_id, message_id)
+    app.message_buffer.remove(channel_id, message_id)
+
     await app.dispatcher.dispatch(
         'channel', channel_id,
         'MESSAGE_DELETE', {
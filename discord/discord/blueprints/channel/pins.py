@@ -25,12 +25,7 @@ async def get_pins(channel_id):
     """, channel_id)
 
     ids = [r['message_id'] for r in ids]
-    res = []
-
-    for message_id in ids:
-        message = await app.storage.get_message(message_id)
-        if message is not None:
-            res.append(message)
+    res = await app.storage.get_messages_bulk(ids, user_id)
 
     return jsonify(res)
 
@@ -48,6 +43,8 @@ async def add_pin(channel_id, message_id):
     VALUES ($1, $2)
     """, channel_id, message_id)
 
+    app.message_buffer.set_pinned(channel_id, message_id, True)
+
     row = await app.db.fetchrow("""
     SELECT message_id
     FROM channel_pins
@@ -85,6 +82,8 @@ async def delete_pin(channel_id, message_id):
     WHERE channel_id = $1 AND message_id = $2
     """, channel_id, message_id)
 
+    app.message_buffer.set_pinned(channel_id, message_id, False)
+
     row = await app.db.fetchrow("""
     SELECT message_id
     FROM channel_pins
@@ -103,6 +103,13 @@ async def add_reaction(channel_id: int, message_id: int, emoji: str):
         emoji_id, emoji_text
     )
 
+    app.message_buffer.add_reaction(channel_id, message_id, {
+        'user_id': user_id,
+        'emoji_type': emoji_type,
+        'emoji_id': emoji_id,
+        'emoji_text': emoji_text,
+    })
+
     partial = partial_emoji(emoji_type, emoji_id, emoji_name)
     payload = _make_payload(user_id, channel_id, message_id, partial)
 
@@ -154,6 +161,11 @@ async def remove_reaction(channel_id: int, message_id: int,
           {where_ext}
         """, message_id, user_id, emoji_type, main_emoji)
 
+    app.message_buffer.remove_reaction(
+        channel_id, message_id, user_id, emoji_type,
+        'emoji_id' if emoji_type == EmojiType.CUSTOM else 'emoji_text',
+        main_emoji)
+
     partial = partial_emoji(emoji_type, emoji_id, emoji_name)
     payload = _make_payload(user_id, channel_id, message_id, partial)
 
@@ -225,6 +237,8 @@ async def remove_all_reactions(channel_id, message_id):
     WHERE message_id = $1
     """, message_id)
 
+    app.message_buffer.clear_reactions(channel_id, message_id)
+
     payload = {
         'channel_id': str(channel_id),
         'message_id': str(message_id),
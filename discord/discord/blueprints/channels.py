@@ -92,6 +92,8 @@ async def _update_guild_chan_cat(guild_id: int, channel_id: int):
     WHERE guild_id = $1 AND parent_id = $2
     """, guild_id, channel_id)
 
+    app.channel_cache.invalidate_guild(guild_id)
+
     # tell all people in the guild of the category removal
     for child_id in childs:
         child = await app.storage.get_channel(child_id)
@@ -116,6 +118,8 @@ async def delete_messages(channel_id):
     WHERE channel_id = $1
     """, channel_id)
 
+    app.message_buffer.drop(channel_id)
+
 
 async def guild_cleanup(channel_id):
     await app.db.execute("""
@@ -185,9 +189,14 @@ async def close_channel(channel_id):
         WHERE id = $1
         """, channel_id)
 
+        # the guild's channel fields might have changed
+        # on _update_func as well.
+        app.guild_cache.invalidate(guild_id, 'guild', 'channels')
+        app.channel_cache.invalidate(channel_id)
+        app.perm_engine.invalidate_channel(guild_id, channel_id)
+
         # clean its member list representation
-        lazy_guilds = app.dispatcher.backends['lazy_guild']
-        lazy_guilds.remove_channel(channel_id)
+        await app.dispatcher.remove('lazy_guild', channel_id)
 
         await app.dispatcher.dispatch_guild(
             guild_id, 'CHANNEL_DELETE', chan)
@@ -288,6 +297,9 @@ async def put_channel_overwrite(channel_id: int, overwrite_id: int):
         'id': overwrite_id
     }])
 
+    app.guild_cache.invalidate(guild_id, 'channels')
+    app.perm_engine.invalidate_channel(guild_id, channel_id)
+
     await _mass_chan_update(guild_id, [channel_id])
     return '', 204
 
@@ -358,6 +370,10 @@ async def _common_guild_chan(channel_id, j: dict):
         WHERE id = $2
         """, j[field], channel_id)
 
+    # moving between categories
+    if 'parent_id' in j:
+        app.channel_cache.invalidate(channel_id)
+
 
 async def _update_text_channel(channel_id: int, j: dict):
     # first do the specific ones related to guild_text_channels
@@ -407,6 +423,9 @@ async def update_channel(channel_id):
     await _update_channel_common(channel_id, guild_id, j)
     await update_handler(channel_id, j)
 
+    app.guild_cache.invalidate(guild_id, 'channels')
+    app.perm_engine.invalidate_channel(guild_id, channel_id)
+
     chan = await app.storage.get_channel(channel_id)
 
 
@@ -519,7 +538,7 @@ async def _search_channel(channel_id):
     """, channel_id, j['offset'], j['content'])
 
     results = 0 if not rows else rows[0]['total_results']
-    main_messages = [r['message_id'] for r in rows]
+    main_messages = [r['id'] for r in rows]
 
     # fetch contexts for each message
     # (2 messages before, 2 messages after).
@@ -527,8 +546,7 @@ async def _search_channel(channel_id):
     # TODO: actual contexts
     res = []
 
-    for message_id in main_messages:
-        msg = await app.storage.get_message(message_id)
+    for msg in await app.storage.get_messages_bulk(main_messages):
         msg['hit'] = True
         res.append([msg])
 
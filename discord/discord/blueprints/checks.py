@@ -1,5 +1,6 @@
 from quart import current_app as app
 
+from discord import request_cache
 from discord.enums import ChannelType, GUILD_CHANS
 from discord.errors import (
     GuildNotFound, ChannelNotFound, Forbidden, MissingPermissions
@@ -7,14 +8,20 @@ from discord.errors import (
 from discord.permissions import base_permissions, get_permissions
 
 
-async def guild_check(user_id: int, guild_id: int):
-    """Check if a user is in a guild."""
-    joined_at = await app.db.fetchval("""
+async def _joined_at(user_id: int, guild_id: int):
+    return await app.db.fetchval("""
     SELECT joined_at
     FROM members
     WHERE user_id = $1 AND guild_id = $2
     """, user_id, guild_id)
 
+
+async def guild_check(user_id: int, guild_id: int):
+    """Check if a user is in a guild."""
+    joined_at = await request_cache.memoize(
+        ('joined_at', user_id, guild_id),
+        lambda: _joined_at(user_id, guild_id))
+
     if not joined_at:
         raise GuildNotFound('guild not found')
 
@@ -37,22 +44,19 @@ async def guild_owner_check(user_id: int, guild_id: int):
 async def channel_check(user_id, channel_id):
     """Check if the current user is authorized
     to read the channel's information."""
-    chan_type = await app.storage.get_chan_type(channel_id)
+    meta = await request_cache.memoize(
+        ('chan_meta', channel_id),
+        lambda: app.storage.channel_meta(channel_id),
+        0 if app.storage.channel_cache is not None else 1)
 
-    if chan_type is None:
+    if meta is None:
         raise ChannelNotFound(f'channel type not found')
 
-    ctype = ChannelType(chan_type)
+    ctype = ChannelType(meta.type)
 
     if ctype in GUILD_CHANS:
-        guild_id = await app.db.fetchval("""
-        SELECT guild_id
-        FROM guild_channels
-        WHERE guild_channels.id = $1
-        """, channel_id)
-
-        await guild_check(user_id, guild_id)
-        return ctype, guild_id
+        await guild_check(user_id, meta.guild_id)
+        return ctype, meta.guild_id
 
     if ctype == ChannelType.DM:
         peer_id = await app.storage.get_dm_peer(channel_id, user_id)
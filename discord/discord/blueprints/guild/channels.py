@@ -64,6 +64,10 @@ async def create_guild_channel(guild_id: int, channel_id: int,
     # so we use this function.
     await _specific_chan_create(channel_id, ctype, **kwargs)
 
+    app.guild_cache.invalidate(guild_id, 'channels')
+    app.channel_cache.invalidate(channel_id)
+    app.perm_engine.invalidate_channel(guild_id, channel_id)
+
 
 @bp.route('/<int:guild_id>/channels', methods=['GET'])
 async def get_guild_channels(guild_id):
@@ -95,16 +99,10 @@ async def create_channel(guild_id):
     await create_guild_channel(
         guild_id, new_channel_id, channel_type, **j)
 
-    # TODO: do a better method
-    # subscribe the currently subscribed users to the new channel
-    # by getting all user ids and subscribing each one by one.
-
+    # subscribe the currently subscribed users to the new channel.
     # since GuildDispatcher calls Storage.get_channel_ids,
     # it will subscribe all users to the newly created channel.
-    guild_pubsub = app.dispatcher.backends['guild']
-    user_ids = guild_pubsub.state[guild_id]
-    for uid in user_ids:
-        await app.dispatcher.sub('guild', guild_id, uid)
+    await app.dispatcher.resubscribe('guild', guild_id)
 
     chan = await app.storage.get_channel(new_channel_id)
     await app.dispatcher.dispatch_guild(
@@ -140,6 +138,8 @@ async def _do_single_swap(guild_id: int, pair: tuple):
 
     await app.db.release(conn)
 
+    app.guild_cache.invalidate(guild_id, 'channels')
+
     await _chan_update_dispatch(guild_id, channel_1)
     await _chan_update_dispatch(guild_id, channel_2)
 
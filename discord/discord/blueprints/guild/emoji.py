@@ -11,6 +11,8 @@ bp = Blueprint('guild.emoji', __name__)
 
 async def _dispatch_emojis(guild_id):
     """Dispatch a Guild Emojis Update payload to a guild."""
+    app.guild_cache.invalidate(guild_id, 'emojis')
+
     await app.dispatcher.dispatch('guild', guild_id, 'GUILD_EMOJIS_UPDATE', {
         'guild_id': str(guild_id),
         'emojis': await app.storage.get_guild_emojis(guild_id)
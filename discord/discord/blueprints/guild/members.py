@@ -38,10 +38,11 @@ async def get_members(guild_id):
 
     user_ids = await app.db.fetch(f"""
     SELECT user_id
-    WHERE guild_id = $1, user_id > $2
-    LIMIT {limit}
+    FROM members
+    WHERE guild_id = $1 AND user_id > $2
     ORDER BY user_id ASC
-    """, guild_id, after)
+    LIMIT {limit}
+    """, guild_id, int(after))
 
     user_ids = [r[0] for r in user_ids]
     members = await app.storage.get_member_multi(guild_id, user_ids)
@@ -95,6 +96,9 @@ async def _update_member_roles(guild_id: int, member_id: int,
 
     await app.db.release(conn)
 
+    app.perm_engine.invalidate_member(guild_id, member_id)
+    app.message_buffer.invalidate_user(member_id)
+
 
 @bp.route('/<int:guild_id>/members/<int:member_id>', methods=['PATCH'])
 async def modify_guild_member(guild_id, member_id):
@@ -116,6 +120,7 @@ async def modify_guild_member(guild_id, member_id):
         WHERE user_id = $2 AND guild_id = $3
         """, nick, member_id, guild_id)
 
+        app.message_buffer.invalidate_user(member_id)
         nick_flag = True
 
     if 'mute' in j:
@@ -184,6 +189,8 @@ async def update_nickname(guild_id):
     WHERE user_id = $2 AND guild_id = $3
     """, nick, user_id, guild_id)
 
+    app.message_buffer.invalidate_user(user_id)
+
     member = await app.storage.get_member_data_one(guild_id, user_id)
     member.pop('joined_at')
 
@@ -17,6 +17,10 @@ async def remove_member(guild_id: int, member_id: int):
     WHERE guild_id = $1 AND user_id = $2
     """, guild_id, member_id)
 
+    app.guild_cache.patch_member_count(guild_id, -1)
+    app.perm_engine.invalidate_member(guild_id, member_id)
+    app.message_buffer.invalidate_user(member_id)
+
     await app.dispatcher.dispatch_user_guild(
         member_id, guild_id, 'GUILD_DELETE', {
             'guild_id': str(guild_id),
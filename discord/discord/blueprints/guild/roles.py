@@ -84,6 +84,9 @@ async def create_role(guild_id, name: str, **kwargs):
         dict_get(kwargs, 'mentionable', False)
     )
 
+    app.guild_cache.invalidate(guild_id, 'roles')
+    app.perm_engine.invalidate_roles(guild_id)
+
     role = await app.storage.get_role(new_role_id, guild_id)
 
     # we need to update the lazy guild handlers for the newly created group
@@ -159,6 +162,8 @@ async def _role_pairs_update(guild_id: int, pairs: list):
 
         await app.db.release(conn)
 
+        app.guild_cache.invalidate(guild_id, 'roles')
+
         # the route fires multiple Guild Role Update.
         await _role_update_dispatch(role_1, guild_id)
         await _role_update_dispatch(role_2, guild_id)
@@ -312,6 +317,9 @@ async def update_guild_role(guild_id, role_id):
         WHERE roles.id = $2 AND roles.guild_id = $3
         """, j[field], role_id, guild_id)
 
+    app.guild_cache.invalidate(guild_id, 'roles')
+    app.perm_engine.invalidate_roles(guild_id)
+
     role = await _role_update_dispatch(role_id, guild_id)
     await _maybe_lg(guild_id, 'role_update', role, True)
     return jsonify(role)
@@ -335,6 +343,11 @@ async def delete_guild_role(guild_id, role_id):
     if res == 'DELETE 0':
         return '', 204
 
+    # channel overwrites for the role are deleted
+    # alongside it, so channels are invalidated too.
+    app.guild_cache.invalidate(guild_id, 'roles', 'channels')
+    app.perm_engine.invalidate(guild_id)
+
     await _maybe_lg(guild_id, 'role_delete', role_id, True)
 
     await app.dispatcher.dispatch_guild(guild_id, 'GUILD_ROLE_DELETE', {
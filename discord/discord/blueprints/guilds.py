@@ -49,6 +49,8 @@ async def add_member(guild_id: int, user_id: int):
     VALUES ($1, $2)
     """, user_id, guild_id)
 
+    app.guild_cache.patch_member_count(guild_id, 1)
+
     await create_guild_settings(guild_id, user_id)
 
 
@@ -68,6 +70,9 @@ async def guild_create_roles_prep(guild_id: int, roles: list):
         WHERE roles.id = $1
         """, guild_id)
 
+    app.guild_cache.invalidate(guild_id, 'roles')
+    app.perm_engine.invalidate_roles(guild_id)
+
     default_perms = (everyone_patches.get('permissions')
                      or DEFAULT_EVERYONE_PERMS)
 
@@ -111,7 +116,7 @@ async def create_guild():
 
     guild_id = get_snowflake()
 
-    image = await put_guild_icon(guild_id, j['icon'])
+    image = await put_guild_icon(guild_id, j.get('icon'))
 
     await app.db.execute(
         """
@@ -143,6 +148,8 @@ async def create_guild():
     VALUES ($1, $2, $3)
     """, user_id, guild_id, guild_id)
 
+    app.perm_engine.invalidate_member(guild_id, user_id)
+
     # create a single #general channel.
     general_id = get_snowflake()
 
@@ -243,6 +250,11 @@ async def _update_guild(guild_id):
         WHERE id = $2
         """, j[field], guild_id)
 
+    app.guild_cache.invalidate(guild_id, 'guild')
+
+    if 'owner_id' in j:
+        app.perm_engine.invalidate(guild_id)
+
     guild = await app.storage.get_guild_full(
         guild_id, user_id
     )
@@ -260,11 +272,20 @@ async def delete_guild(guild_id):
     user_id = await token_check()
     await guild_owner_check(user_id, guild_id)
 
+    channel_ids = await app.storage.get_channel_ids(guild_id)
+
     await app.db.execute("""
     DELETE FROM guilds
     WHERE guilds.id = $1
     """, guild_id)
 
+    app.guild_cache.remove(guild_id)
+    app.channel_cache.invalidate_guild(guild_id)
+    app.perm_engine.invalidate(guild_id)
+
+    for channel_id in channel_ids:
+        app.message_buffer.drop(channel_id)
+
     # Discord's client expects IDs being string
     await app.dispatcher.dispatch('guild', guild_id, 'GUILD_DELETE', {
         'guild_id': str(guild_id),
@@ -315,8 +336,7 @@ async def search_messages(guild_id):
     # TODO: actual contexts
     res = []
 
-    for message_id in main_messages:
-        msg = await app.storage.get_message(message_id)
+    for msg in await app.storage.get_messages_bulk(main_messages):
         msg['hit'] = True
         res.append([msg])
 
@@ -60,6 +60,8 @@ async def use_invite(user_id, invite_code):
     VALUES ($1, $2)
     """, user_id, guild_id)
 
+    app.guild_cache.patch_member_count(guild_id, 1)
+
     await create_guild_settings(guild_id, user_id)
 
     # add the @everyone role to the invited member
@@ -68,6 +70,9 @@ async def use_invite(user_id, invite_code):
     VALUES ($1, $2, $3)
     """, user_id, guild_id, guild_id)
 
+    app.perm_engine.invalidate_member(guild_id, user_id)
+    app.message_buffer.invalidate_user(user_id)
+
     await app.db.execute("""
     UPDATE invites
     SET uses = uses + 1
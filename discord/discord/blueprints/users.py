@@ -27,36 +27,24 @@ async def mass_user_update(user_id, app_=None):
     if app_ is None:
         app_ = app
 
-    # by using dispatch_with_filter
+    # by using dispatch_unique
     # we're guaranteeing all shards will get
     # a USER_UPDATE once and not any others.
 
-    session_ids = []
+    # buffered messages embed the old user
+    app_.message_buffer.invalidate_user(user_id)
 
     public_user = await app_.storage.get_user(user_id)
     private_user = await app_.storage.get_user(user_id, secure=True)
 
-    session_ids.extend(
-        await app_.dispatcher.dispatch_user(
-            user_id, 'USER_UPDATE', private_user)
-    )
-
     guild_ids = await app_.user_storage.get_user_guilds(user_id)
     friend_ids = await app_.user_storage.get_friend_ids(user_id)
 
-    session_ids.extend(
-        await app_.dispatcher.dispatch_many_filter_list(
-            'guild', guild_ids, session_ids,
-            'USER_UPDATE', public_user
-        )
-    )
-
-    session_ids.extend(
-        await app_.dispatcher.dispatch_many_filter_list(
-            'friend', friend_ids, session_ids,
-            'USER_UPDATE', public_user
-        )
-    )
+    await app_.dispatcher.dispatch_unique([
+        ('user', [user_id], 'USER_UPDATE', private_user),
+        ('guild', guild_ids, 'USER_UPDATE', public_user),
+        ('friend', friend_ids, 'USER_UPDATE', public_user),
+    ])
 
     await app_.dispatcher.dispatch_many(
         'lazy_guild', guild_ids, 'update_user', user_id
@@ -440,8 +428,10 @@ async def _get_mentions():
     """, *args)
 
     res = []
-    for row in rows:
-        message = await app.storage.get_message(row['id'])
+    messages = await app.storage.get_messages_bulk(
+        [row['id'] for row in rows])
+
+    for message in messages:
         gid = int(message['guild_id'])
 
         # ignore messages pre-messages.guild_id
@@ -551,4 +541,7 @@ async def delete_account():
     await _del_from_table('member_roles', user_id)
     await _del_from_table('channel_overwrites', user_id)
 
+    app.perm_engine.invalidate_user(user_id)
+    app.message_buffer.invalidate_user(user_id)
+
     return '', 204
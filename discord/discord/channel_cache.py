@@ -0,0 +1,139 @@
+"""
+discord.channel_cache: in-process cache of channel metadata.
+
+Dispatching to a channel, checking access to it and calculating
+permissions in it all start by finding out the channel's type
+and guild. Those rarely change, so they are kept in memory
+instead of being fetched from the database every time.
+"""
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from logbook import Logger
+
+from discord.shared_cache import shared
+
+log = Logger(__name__)
+
+
+@dataclass(frozen=True)
+class ChannelMeta:
+    """The type, guild and category of a channel.
+
+    guild_id and parent_id are None for non-guild channels.
+    """
+    __slots__ = ('channel_id', 'type', 'guild_id', 'parent_id')
+
+    channel_id: int
+    type: int
+    guild_id: Optional[int]
+    parent_id: Optional[int]
+
+
+class ChannelCache:
+    """LRU cache of :class:`ChannelMeta`, capped by channel count.
+
+    Code that creates, deletes or moves a channel must call
+    :meth:`invalidate` (or :meth:`invalidate_guild`) *after*
+    writing to the database.
+    """
+    def __init__(self, max_channels: int = 100_000):
+        self.max_channels = max_channels
+
+        #: {channel_id: ChannelMeta}, least recently used first
+        self._channels = OrderedDict()
+
+        #: {guild_id: set of cached channel ids}
+        self._guild_channels = defaultdict(set)
+
+        #: bumped on every invalidation, so that metadata
+        #  loaded concurrently with a change is not stored.
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        #: set by the app to share changes with other nodes,
+        #  see :mod:`discord.shared_cache`
+        self.publish = None
+
+    def __len__(self):
+        return len(self._channels)
+
+    @property
+    def stats(self) -> dict:
+        """Get counters about the cache."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'channels': len(self._channels),
+            'max_channels': self.max_channels,
+        }
+
+    @property
+    def generation(self) -> int:
+        """Get the current generation.
+
+        Pass it back to :meth:`put_many` so that metadata
+        read before an invalidation is dropped.
+        """
+        return self._generation
+
+    def get(self, channel_id: int) -> Optional[ChannelMeta]:
+        """Get the metadata of a channel, marking it as recently used."""
+        try:
+            meta = self._channels[channel_id]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._channels.move_to_end(channel_id)
+        self.hits += 1
+        return meta
+
+    def _drop(self, channel_id: int):
+        meta = self._channels.pop(channel_id, None)
+
+        if meta is None or meta.guild_id is None:
+            return
+
+        guild_channels = self._guild_channels[meta.guild_id]
+        guild_channels.discard(channel_id)
+
+        if not guild_channels:
+            self._guild_channels.pop(meta.guild_id)
+
+    def put_many(self, metas: Iterable[ChannelMeta], generation: int):
+        """Store the metadata of channels, unless
+        anything was invalidated after ``generation``."""
+        if generation != self._generation:
+            return
+
+        for meta in metas:
+            self._drop(meta.channel_id)
+            self._channels[meta.channel_id] = meta
+
+            if meta.guild_id is not None:
+                self._guild_channels[meta.guild_id].add(meta.channel_id)
+
+        while len(self._channels) > self.max_channels:
+            channel_id = next(iter(self._channels))
+            self._drop(channel_id)
+            self.evictions += 1
+
+    @shared
+    def invalidate(self, channel_id: int):
+        """Drop the metadata of a channel."""
+        self._generation += 1
+        self._drop(channel_id)
+
+    @shared
+    def invalidate_guild(self, guild_id: int):
+        """Drop the metadata of all channels in a guild."""
+        self._generation += 1
+
+        for channel_id in list(self._guild_channels.get(guild_id, ())):
+            self._drop(channel_id)
@@ -5,6 +5,9 @@ from logbook import Logger
 from .pubsub import GuildDispatcher, MemberDispatcher, \
     UserDispatcher, ChannelDispatcher, FriendDispatcher, \
     LazyGuildDispatcher
+from .pubsub.broker import pack_message, unpack_message
+from .pubsub.delivery import Delivery
+from .shared_cache import apply_shared
 
 log = Logger(__name__)
 
@@ -24,11 +27,24 @@ class EventDispatcher:
 
     when dispatching, the backend can do its own logic, given
     its subscriber ids.
+
+    When running as many nodes or workers, dispatches,
+    subscriptions made by REST code and changes to the caches
+    of the app are also published on the broker, so that the
+    other nodes apply them to their own subscribers and caches.
+    Subscriptions of a connecting client (:meth:`sub_many`)
+    and filtered dispatches stay on the node they are made on.
     """
     def __init__(self, app):
         self.state_manager = app.state_manager
         self.app = app
 
+        #: set by the app when running with many nodes or workers
+        self.broker = None
+
+        #: sends dispatches to the sessions of this node
+        self.delivery = Delivery()
+
         self.backends = {
             'guild': GuildDispatcher(self),
             'member': MemberDispatcher(self),
@@ -52,18 +68,64 @@ class EventDispatcher:
 
         return await method(key, identifier)
 
+    def publish(self, kind: str, *args):
+        """Send a message to the other nodes, if any.
+
+        They handle it with the ``_remote_<kind>`` method.
+        """
+        if self.broker is not None:
+            self.broker.publish(pack_message([kind, *args]))
+
+    def share_cache(self, name: str, cache):
+        """Publish the shared methods of a cache of the app,
+        so the other nodes apply them to their own."""
+        cache.publish = (
+            lambda method, args: self.publish('cache', name, method, args))
+
+    async def handle_broker(self, frame: bytes):
+        """Handle a message published by another node."""
+        kind, *args = unpack_message(frame)
+        handler = getattr(self, f'_remote_{kind}')
+        await handler(*args)
+
+    async def _remote_dispatch(self, backend_str, key, args, kwargs):
+        await self.dispatch_local(backend_str, key, *args, **kwargs)
+
+    async def _remote_action(self, backend_str, action, key, identifier):
+        await self.action(backend_str, action, key, identifier)
+
+    async def _remote_key_action(self, backend_str, action, key):
+        await self._key_action(backend_str, action, key)
+
+    async def _remote_resubscribe(self, backend_str, key):
+        await self.resubscribe_local(backend_str, key)
+
+    async def _remote_unique(self, steps):
+        await self.dispatch_unique_local(steps)
+
+    async def _remote_guild_presence(self, guild_id, member, state):
+        await self.app.presence.dispatch_guild_pres_local(
+            guild_id, member, state)
+
+    async def _remote_cache(self, name, method, args):
+        apply_shared(getattr(self.app, name), method, args)
+
     async def subscribe(self, backend: str, key: Any, identifier: Any):
-        """Subscribe a single element to the given backend."""
+        """Subscribe a single element to the given backend,
+        on all nodes."""
         log.debug('SUB backend={} key={} <= id={}',
                   backend, key, identifier, backend)
 
+        self.publish('action', backend, 'sub', key, identifier)
         return await self.action(backend, 'sub', key, identifier)
 
     async def unsubscribe(self, backend: str, key: Any, identifier: Any):
-        """Unsubscribe an element from the given backend."""
+        """Unsubscribe an element from the given backend,
+        on all nodes."""
         log.debug('UNSUB backend={} key={} => id={}',
                   backend, key, identifier, backend)
 
+        self.publish('action', backend, 'unsub', key, identifier)
         return await self.action(backend, 'unsub', key, identifier)
 
     async def sub(self, backend, key, identifier):
@@ -79,17 +141,39 @@ class EventDispatcher:
         at a time.
 
         Usually used when connecting to the gateway and the client
-        needs to subscribe to all their guids.
+        needs to subscribe to all their guids. Only this node, where
+        the client is connected, makes the subscriptions.
         """
         for key in keys:
-            await self.subscribe(backend_str, key, identifier)
+            await self.action(backend_str, 'sub', key, identifier)
+
+    async def resubscribe(self, backend_str: str, key: Any):
+        """Subscribe everyone subscribed to a key again, on all nodes,
+        e.g so that guild subscribers get into new channels."""
+        self.publish('resubscribe', backend_str, key)
+        await self.resubscribe_local(backend_str, key)
+
+    async def resubscribe_local(self, backend_str: str, key: Any):
+        """Subscribe the subscribers of a key of this node again."""
+        backend = self.backends[backend_str]
+        key = backend.KEY_TYPE(key)
+
+        for identifier in set(backend.state[key]):
+            await backend.sub(key, identifier)
 
     async def dispatch(self, backend_str: str, key: Any, *args, **kwargs):
-        """Dispatch an event to the backend.
+        """Dispatch an event to the backend, on all nodes.
 
         The backend is responsible for everything regarding the
-        actual dispatch.
+        actual dispatch. The result is the one of this node.
         """
+        # the routing key goes along with the event
+        self.publish('dispatch', backend_str, key, args, kwargs)
+        return await self.dispatch_local(backend_str, key, *args, **kwargs)
+
+    async def dispatch_local(self, backend_str: str, key: Any,
+                             *args, **kwargs):
+        """Dispatch an event to the subscribers of this node."""
         backend = self.backends[backend_str]
 
         # convert types
@@ -109,7 +193,11 @@ class EventDispatcher:
                               key: Any, func, *args):
         """Dispatch to a backend that only accepts
         (event, data) arguments with an optional filter
-        function."""
+        function.
+
+        The filter can't be sent to other nodes, so this
+        only dispatches to the subscribers of this node.
+        """
         backend = self.backends[backend_str]
         key = backend.KEY_TYPE(key)
         return await backend.dispatch_filter(key, func, *args)
@@ -121,7 +209,8 @@ class EventDispatcher:
 
         This only works for backends that have a dispatch_filter
         handler and return session id lists in their dispatch
-        results.
+        results. Like :meth:`dispatch_filter`, this only
+        dispatches to the subscribers of this node.
         """
         for key in keys:
             sess_list.extend(
@@ -133,18 +222,42 @@ class EventDispatcher:
 
         return sess_list
 
+    async def dispatch_unique(self, steps: List[tuple]) -> List[str]:
+        """Make many dispatches, on all nodes, where each session
+        only gets the first one that reaches it.
+
+        Each step is a (backend, keys, event, data) tuple.
+        Returns the session IDs of this node that got any of them.
+        """
+        self.publish('unique', steps)
+        return await self.dispatch_unique_local(steps)
+
+    async def dispatch_unique_local(self, steps: List[tuple]) -> List[str]:
+        """Make the dispatches of :meth:`dispatch_unique`
+        to the subscribers of this node."""
+        sess_list = []
+
+        for backend_str, keys, event, data in steps:
+            await self.dispatch_many_filter_list(
+                backend_str, keys, sess_list, event, data)
+
+        return sess_list
+
     async def reset(self, backend_str: str, key: Any):
-        """Reset the bucket in the given backend."""
-        backend = self.backends[backend_str]
-        key = backend.KEY_TYPE(key)
-        return await backend.reset(key)
+        """Reset the bucket in the given backend, on all nodes."""
+        self.publish('key_action', backend_str, 'reset', key)
+        return await self._key_action(backend_str, 'reset', key)
 
     async def remove(self, backend_str: str, key: Any):
-        """Remove a key from the backend. This
+        """Remove a key from the backend, on all nodes. This
         might be a different operation than resetting."""
+        self.publish('key_action', backend_str, 'remove', key)
+        return await self._key_action(backend_str, 'remove', key)
+
+    async def _key_action(self, backend_str: str, action: str, key: Any):
         backend = self.backends[backend_str]
         key = backend.KEY_TYPE(key)
-        return await backend.remove(key)
+        return await getattr(backend, action)(key)
 
     async def dispatch_guild(self, guild_id, event, data):
         """Backwards compatibility with old EventDispatcher."""
@@ -0,0 +1,132 @@
+"""
+discord.gateway.admission: admission control for IDENTIFY and RESUME.
+
+When many clients connect at once (after a restart, or after
+every connection got an OP 7 Reconnect), each IDENTIFY hits the
+database for authentication, shard checks, READY and subscriptions.
+:class:`AdmissionController` only lets a fixed amount of them run
+at the same time, the others wait in line.
+
+RESUMEs are much cheaper than IDENTIFYs and let clients keep their
+session, so they always get in before any waiting IDENTIFY.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from logbook import Logger
+
+from discord.stats import percentile
+
+log = Logger(__name__)
+
+#: kinds of admissions, by priority
+KINDS = ('resume', 'identify')
+
+
+class AdmissionController:
+    """Limit how many IDENTIFY and RESUME payloads are
+    being processed at once.
+
+    Waiting connections are let in first come, first
+    served, with RESUMEs before IDENTIFYs.
+    """
+    def __init__(self, max_concurrent: int = 16, samples: int = 1000):
+        self.max_concurrent = max_concurrent
+
+        #: admissions currently running
+        self.active = 0
+
+        #: {kind: deque of futures}
+        self._waiters = {kind: deque() for kind in KINDS}
+
+        #: {kind: recent queue waits, in milliseconds}
+        self._waits = {kind: deque(maxlen=samples) for kind in KINDS}
+
+        #: {kind: admissions that had to wait}
+        self.queued = {kind: 0 for kind in KINDS}
+        self.max_queued = 0
+
+    def __len__(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _wake_next(self):
+        """Hand free slots to the next waiting connections."""
+        for kind in KINDS:
+            waiters = self._waiters[kind]
+
+            while waiters and self.active < self.max_concurrent:
+                fut = waiters.popleft()
+
+                # the slot is taken on behalf of the waiter,
+                # so nobody can get in between.
+                self.active += 1
+                fut.set_result(None)
+
+    async def _acquire(self, kind: str):
+        if self.active < self.max_concurrent and not len(self):
+            self.active += 1
+            return
+
+        fut = asyncio.get_event_loop().create_future()
+        self._waiters[kind].append(fut)
+
+        self.queued[kind] += 1
+        self.max_queued = max(self.max_queued, len(self))
+
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # got a slot while being cancelled
+                self._release()
+            else:
+                self._waiters[kind].remove(fut)
+
+            raise
+
+    def _release(self):
+        self.active -= 1
+        self._wake_next()
+
+    @asynccontextmanager
+    async def slot(self, kind: str):
+        """Wait for a free slot for an IDENTIFY
+        (``'identify'``) or RESUME (``'resume'``)."""
+        start = time.perf_counter()
+        await self._acquire(kind)
+
+        waited = (time.perf_counter() - start) * 1000
+        self._waits[kind].append(waited)
+
+        if waited >= 1000:
+            log.info('{} waited {:.1f}ms for admission, {} waiting',
+                     kind, waited, len(self))
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        """Get queue wait times and counters, by kind."""
+        stats = {}
+
+        for kind in KINDS:
+            waits = self._waits[kind]
+
+            stats[kind] = {
+                'waiting': len(self._waiters[kind]),
+                'queued': self.queued[kind],
+                'wait_p50': percentile(waits, 50),
+                'wait_p99': percentile(waits, 99),
+            }
+
+        return {**stats, **{
+            'active': self.active,
+            'max_concurrent': self.max_concurrent,
+            'max_queued': self.max_queued,
+        }}
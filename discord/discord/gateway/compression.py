@@ -0,0 +1,96 @@
+"""
+discord.gateway.compression: gateway transport compression.
+
+Each connection that asked for a streaming transport gets its
+own compression context, which keeps history between frames
+and is flushed after each one, so every frame can be decompressed
+as soon as it arrives.
+
+zstd-stream needs the zstandard package, which is optional.
+"""
+import zlib
+from typing import Optional
+
+from logbook import Logger
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+log = Logger(__name__)
+
+#: loaded zstd dictionaries, by path
+_dicts = {}
+
+
+class ZlibStream:
+    """zlib-stream: a single deflate stream for the whole
+    connection, with a full flush after every frame."""
+    def __init__(self):
+        self.ctx = zlib.compressobj()
+
+    def compress(self, data) -> bytes:
+        return self.ctx.compress(data) + self.ctx.flush(zlib.Z_FULL_FLUSH)
+
+
+class ZstdStream:
+    """zstd-stream: a single zstd stream for the whole
+    connection, with a block flush after every frame."""
+    def __init__(self, level: int = 3, window_log: Optional[int] = None,
+                 dict_data=None):
+        params = zstd.ZstdCompressionParameters.from_level(
+            level, window_log=window_log or 0)
+
+        # compressors hold the context used by their compressobj,
+        # so they can't be shared between connections.
+        compressor = zstd.ZstdCompressor(
+            compression_params=params, dict_data=dict_data)
+
+        self.ctx = compressor.compressobj()
+
+    def compress(self, data) -> bytes:
+        return (self.ctx.compress(data)
+                + self.ctx.flush(zstd.COMPRESSOBJ_FLUSH_BLOCK))
+
+
+def transports() -> tuple:
+    """Get the streaming transports that can be used."""
+    if zstd is None:
+        return ('zlib-stream',)
+
+    return ('zlib-stream', 'zstd-stream')
+
+
+def load_dict(path: str):
+    """Load a trained zstd dictionary from a file."""
+    try:
+        return _dicts[path]
+    except KeyError:
+        pass
+
+    with open(path, 'rb') as dict_file:
+        dict_data = zstd.ZstdCompressionDict(dict_file.read())
+
+    log.info('loaded zstd dictionary {}, id {}',
+             path, dict_data.dict_id())
+
+    _dicts[path] = dict_data
+    return dict_data
+
+
+def make_stream(transport: Optional[str], config):
+    """Create the compression context for a transport,
+    None if the transport isn't a streaming one."""
+    if transport == 'zlib-stream':
+        return ZlibStream()
+
+    if transport == 'zstd-stream':
+        dict_path = config.get('GATEWAY_ZSTD_DICT')
+
+        return ZstdStream(
+            config.get('GATEWAY_ZSTD_LEVEL', 3),
+            config.get('GATEWAY_ZSTD_WINDOW_LOG'),
+            load_dict(dict_path) if dict_path else None)
+
+    return None
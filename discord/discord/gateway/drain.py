@@ -0,0 +1,159 @@
+"""
+discord.gateway.drain: staggered disconnection of all sessions.
+
+Sending OP 7 Reconnect to every connection at once makes every
+client come back at the same time, wherever they reconnect to.
+:class:`Drainer` instead disconnects sessions in waves, paced
+so that the whole drain fits in a time window, starting with
+the sessions whose users aren't around.
+
+Drained sessions keep storing their dispatches until they are
+saved (see :class:`discord.gateway.state.ParkedConnection`).
+"""
+import asyncio
+import json
+import math
+import time
+from typing import List, Optional
+
+from logbook import Logger
+
+from discord.gateway.state import GatewayState, ParkedConnection
+
+log = Logger(__name__)
+
+#: sessions with a lower rank are drained first
+_STATUS_RANK = {
+    'offline': 0,
+    'invisible': 0,
+    'idle': 1,
+    'dnd': 2,
+    'online': 3,
+}
+
+
+def idle_rank(state: GatewayState) -> tuple:
+    """Get how active a session is, for ordering the drain."""
+    presence = state.presence or {}
+
+    return (not presence.get('afk', False),
+            _STATUS_RANK.get(presence.get('status'), 0))
+
+
+class Drainer:
+    """Disconnect all sessions in paced waves.
+
+    Each wave disconnects at least ``rate`` sessions per
+    ``interval``, more when needed to finish in ``window``
+    seconds. New connections are refused while draining.
+    """
+    def __init__(self, state_manager, rate: int = 50, window: float = 60,
+                 interval: float = 1.0, status_path: Optional[str] = None):
+        self.state_manager = state_manager
+        self.rate = rate
+        self.window = window
+        self.interval = interval
+
+        #: file the progress is written to after each wave
+        self.status_path = status_path
+
+        self._task = None
+
+        #: sessions that were drained, in order
+        self.drained_states: List[GatewayState] = []
+
+        self.progress = {
+            'draining': False,
+            'finished': False,
+            'total': 0,
+            'drained': 0,
+            'waves': 0,
+            'started_at': None,
+            'elapsed': 0.0,
+        }
+
+    @property
+    def draining(self) -> bool:
+        return self._task is not None
+
+    def _order(self) -> List[GatewayState]:
+        states = [state for state in self.state_manager.states_raw.values()
+                  if state.ws]
+
+        return sorted(states, key=idle_rank)
+
+    def _wave_size(self, total: int) -> int:
+        return max(math.ceil(self.rate * self.interval),
+                   math.ceil(total * self.interval / self.window), 1)
+
+    def _report(self):
+        progress = self.progress
+        progress['elapsed'] = time.time() - progress['started_at']
+
+        log.info('drain: {}/{} sessions, {} waves, {:.1f}s',
+                 progress['drained'], progress['total'],
+                 progress['waves'], progress['elapsed'])
+
+        if not self.status_path:
+            return
+
+        try:
+            with open(self.status_path, 'w') as status_file:
+                json.dump(progress, status_file)
+        except OSError as err:
+            log.warning('failed to write drain status: {!r}', err)
+
+    async def _shutdown(self, state: GatewayState):
+        # the session might have gone away since
+        # the drain order was made
+        if not state.ws or isinstance(state.ws, ParkedConnection):
+            return
+
+        try:
+            await self.state_manager.shutdown_single(state)
+        except Exception as err:
+            log.warning('failed to drain {}: {!r}', state, err)
+
+    async def _drain(self):
+        self.state_manager.accept_new = False
+
+        states = self._order()
+        wave_size = self._wave_size(len(states))
+
+        self.progress.update({
+            'draining': True,
+            'total': len(states),
+            'started_at': time.time(),
+        })
+
+        log.info('draining {} sessions, {} per wave',
+                 len(states), wave_size)
+
+        for index in range(0, len(states), wave_size):
+            wave_start = time.monotonic()
+            wave = states[index:index + wave_size]
+
+            await asyncio.gather(*(self._shutdown(state) for state in wave))
+
+            self.drained_states.extend(wave)
+            self.progress['drained'] += len(wave)
+            self.progress['waves'] += 1
+            self._report()
+
+            if index + wave_size < len(states):
+                elapsed = time.monotonic() - wave_start
+                await asyncio.sleep(max(self.interval - elapsed, 0))
+
+        self.progress.update({'draining': False, 'finished': True})
+        self._report()
+
+    def start(self) -> asyncio.Future:
+        """Start draining, if it wasn't started already."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+
+        return self._task
+
+    async def drain(self):
+        """Drain all sessions, waiting for it to finish."""
+        await self.start()
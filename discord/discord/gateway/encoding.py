@@ -0,0 +1,127 @@
+"""
+discord.gateway.encoding: gateway payload encoding.
+
+Besides the plain encoders and decoders for each encoding,
+this has :class:`DispatchFrames`, which lets an event that
+goes to many sessions be serialized only once per encoding.
+"""
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+import earl
+
+from discord.utils import DiscordJSONEncoder
+from discord.gateway.opcodes import OP
+
+
+def encode_json(payload) -> str:
+    return json.dumps(payload, separators=(',', ':'),
+                      cls=DiscordJSONEncoder)
+
+
+def decode_json(data: str):
+    return json.loads(data)
+
+
+def encode_etf(payload) -> str:
+    return earl.pack(payload)
+
+
+def decode_etf(data: bytes):
+    """Decode an ETF payload.
+
+    earl decodes binaries (including map keys) into strings
+    while unpacking, so nested dicts and lists of dicts
+    come out str-keyed without another pass over them.
+    """
+    return earl.unpack(data, encoding='utf-8', encode_binary_ext=True)
+
+
+#: {encoding: (encoder, decoder)}
+ENCODINGS = {
+    'json': (encode_json, decode_json),
+    'etf': (encode_etf, decode_etf),
+}
+
+
+def _etf_term(value) -> bytes:
+    """Encode a single ETF term, without the version byte."""
+    return earl.pack(value)[1:]
+
+
+def _etf_int(value: int) -> bytes:
+    """Encode an integer as an ETF term, matching what earl does
+    for the ranges sequence numbers can be in."""
+    if 0 <= value < 256:
+        return b'a' + bytes((value,))
+
+    return b'b' + struct.pack('>i', value)
+
+
+#: version byte and a 4-element map header
+_ETF_HEAD = b'\x83t' + struct.pack('>I', 4)
+
+
+class DispatchFrames:
+    """A dispatch event to be sent to many sessions.
+
+    The event data is only serialized once per encoding, into
+    a frame template. Each session's sequence number is then
+    spliced into the template, giving the same bytes as encoding
+    the full payload for that session.
+    """
+    __slots__ = ('event', 'data', '_templates')
+
+    def __init__(self, event: str, data: Any):
+        self.event = event.upper()
+        self.data = data
+
+        #: {encoding: (head, tail)}
+        self._templates = {}
+
+    def _template(self, encoding: str) -> Tuple[bytes, bytes]:
+        if encoding == 'json':
+            # key order doesn't matter to clients, so 's' goes last
+            # and is the only part that changes between sessions.
+            head = encode_json({
+                'op': OP.DISPATCH,
+                't': self.event,
+                'd': self.data,
+            })[:-1] + ',"s":'
+
+            return head.encode(), b'}'
+
+        if encoding == 'etf':
+            head = b''.join((
+                _ETF_HEAD,
+                _etf_term('op'), _etf_term(OP.DISPATCH),
+                _etf_term('t'), _etf_term(self.event),
+                _etf_term('d'), _etf_term(self.data),
+                _etf_term('s'),
+            ))
+
+            return head, b''
+
+        raise ValueError(f'unknown encoding {encoding!r}')
+
+    def frame(self, encoding: str, seq: int) -> bytes:
+        """Get the encoded payload for a given sequence number."""
+        try:
+            head, tail = self._templates[encoding]
+        except KeyError:
+            head, tail = self._templates[encoding] = self._template(encoding)
+
+        if encoding == 'etf':
+            return head + _etf_int(seq) + tail
+
+        return head + str(seq).encode() + tail
+
+    def payload(self, seq: int) -> Dict[str, Any]:
+        """Get the payload for a given sequence number, as a dict."""
+        return {
+            'op': OP.DISPATCH,
+            't': self.event,
+            's': seq,
+            'd': self.data,
+        }
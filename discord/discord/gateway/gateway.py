@@ -1,5 +1,6 @@
 import urllib.parse
 from .websocket import GatewayWebsocket
+from .compression import transports
 
 
 async def websocket_handler(app, ws, url):
@@ -32,7 +33,7 @@ async def websocket_handler(app, ws, url):
     except (KeyError, IndexError):
         gw_compress = None
 
-    if gw_compress and gw_compress not in ('zlib-stream',):
+    if gw_compress and gw_compress not in transports():
         return await ws.close(1000, 'Invalid gateway compress')
 
     gws = GatewayWebsocket(ws, app, v=gw_version,
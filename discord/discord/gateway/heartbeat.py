@@ -0,0 +1,125 @@
+"""
+discord.gateway.heartbeat: heartbeat deadlines of all connections.
+
+Instead of one sleeping task per connection, recreated on every
+heartbeat, a single :class:`HeartbeatSupervisor` keeps the
+deadlines of every connection in a hashed timer wheel and wakes
+up once per tick to expire the connections that missed theirs.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from logbook import Logger
+
+log = Logger(__name__)
+
+
+class HeartbeatSupervisor:
+    """Hashed timer wheel of heartbeat deadlines.
+
+    The wheel has ``slots`` buckets of ``resolution`` seconds
+    each. A connection sits in the bucket of the tick its deadline
+    falls on, so a heartbeat is only moving it between two sets.
+    Deadlines further away than a full turn of the wheel stay in
+    their bucket until the turn they're due.
+
+    Tracked connections must have an ``async heartbeat_expired()``
+    method, which is called when their deadline passes.
+    """
+    def __init__(self, resolution: float = 1.0, slots: int = 128,
+                 clock=time.monotonic):
+        self.resolution = resolution
+        self.clock = clock
+
+        self._slots = [set() for _ in range(slots)]
+
+        #: {connection: (deadline tick, slot index)}
+        self._deadlines = {}
+
+        #: last tick that was processed
+        self._tick = self._now_tick()
+
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _now_tick(self) -> int:
+        return int(self.clock() / self.resolution)
+
+    def beat(self, conn, interval: float):
+        """Set a connection's deadline to ``interval``
+        seconds from now."""
+        # deadlines are rounded up, so connections never
+        # expire before their interval.
+        tick = -int(-(self.clock() + interval) // self.resolution)
+        idx = tick % len(self._slots)
+
+        old = self._deadlines.get(conn)
+        if old is not None:
+            self._slots[old[1]].discard(conn)
+
+        self._slots[idx].add(conn)
+        self._deadlines[conn] = (tick, idx)
+
+    def forget(self, conn):
+        """Stop tracking a connection."""
+        old = self._deadlines.pop(conn, None)
+
+        if old is not None:
+            self._slots[old[1]].discard(conn)
+
+    def deadline(self, conn) -> Optional[float]:
+        """Get a connection's deadline, in clock time."""
+        try:
+            tick, _ = self._deadlines[conn]
+        except KeyError:
+            return None
+
+        return tick * self.resolution
+
+    def advance(self) -> list:
+        """Process all ticks up to now, returning (and forgetting)
+        the connections whose deadline passed."""
+        now_tick = self._now_tick()
+        expired = []
+
+        # a full turn already covers every slot
+        first = max(self._tick + 1, now_tick - len(self._slots) + 1)
+
+        for tick in range(first, now_tick + 1):
+            bucket = self._slots[tick % len(self._slots)]
+
+            for conn in list(bucket):
+                if self._deadlines[conn][0] <= now_tick:
+                    bucket.discard(conn)
+                    self._deadlines.pop(conn)
+                    expired.append(conn)
+
+        self._tick = now_tick
+        return expired
+
+    async def _expire(self, conns: list):
+        results = await asyncio.gather(
+            *(conn.heartbeat_expired() for conn in conns),
+            return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, Exception):
+                log.error('error expiring connection: {!r}', result)
+
+    async def run(self):
+        """Expire connections, once every tick, forever."""
+        while True:
+            await asyncio.sleep(self.resolution)
+            expired = self.advance()
+
+            if expired:
+                self.expired += len(expired)
+                log.info('{} connections missed their heartbeat',
+                         len(expired))
+
+                # closing can take a while, the
+                # next tick shouldn't wait for it.
+                asyncio.ensure_future(self._expire(expired))
@@ -0,0 +1,169 @@
+"""
+discord.gateway.outbound: outbound queue of a gateway connection.
+
+Producers (dispatchers, op handlers) only put payloads in the
+queue of a connection, and a writer task owned by the connection
+sends them over the socket. This way, a slow client only delays
+its own events.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, Optional
+
+from discord.gateway.encoding import DispatchFrames
+
+
+def _presence_key(data: Dict[str, Any]) -> Hashable:
+    return (data.get('guild_id'), (data.get('user') or {}).get('id'))
+
+
+def _typing_key(data: Dict[str, Any]) -> Hashable:
+    return (data.get('channel_id'), data.get('user_id'))
+
+
+#: events where a newer one makes older, still queued,
+#  ones useless. maps event names to functions giving
+#  what the event is about.
+COALESCED_EVENTS = {
+    'PRESENCE_UPDATE': _presence_key,
+    'TYPING_START': _typing_key,
+}
+
+
+def coalesce_key(frames: DispatchFrames) -> Optional[Hashable]:
+    """Get the coalescing key of an event, if it has any."""
+    key_func = COALESCED_EVENTS.get(frames.event)
+
+    if key_func is None or not isinstance(frames.data, dict):
+        return None
+
+    return (frames.event, key_func(frames.data))
+
+
+class OutboundQueue:
+    """Bounded queue of payloads waiting to be sent.
+
+    Items are either already encoded payloads (bytes) or
+    :class:`DispatchFrames`, which only get a sequence number
+    when they are written.
+    """
+    def __init__(self, high_water: int = 1000, max_size: int = 5000,
+                 timeout: float = 30):
+        #: depth after which the connection is considered slow
+        self.high_water = high_water
+
+        #: depth at which the connection is closed right away
+        self.max_size = max_size
+
+        #: how long the connection can stay slow, in seconds
+        self.timeout = timeout
+
+        #: entries are [item, coalescing key]
+        self._items = deque()
+        self._keys = {}
+
+        self._ready = asyncio.Event()
+        self._empty = asyncio.Event()
+        self._empty.set()
+
+        #: when the queue went over the high water mark
+        self._over_since = None
+
+        self.max_depth = 0
+        self.coalesced = 0
+        self.written = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def stats(self) -> dict:
+        """Get counters about the queue."""
+        return {
+            'depth': len(self._items),
+            'max_depth': self.max_depth,
+            'coalesced': self.coalesced,
+            'written': self.written,
+            'high_water': self.high_water,
+        }
+
+    def put(self, item, key: Optional[Hashable] = None):
+        """Put an item in the queue.
+
+        When an item with the same coalescing key is
+        still queued, it is replaced instead.
+        """
+        if key is not None:
+            entry = self._keys.get(key)
+
+            if entry is not None:
+                entry[0] = item
+                self.coalesced += 1
+                return
+
+        entry = [item, key]
+        self._items.append(entry)
+
+        if key is not None:
+            self._keys[key] = entry
+
+        depth = len(self._items)
+        self.max_depth = max(self.max_depth, depth)
+
+        if depth > self.high_water and self._over_since is None:
+            self._over_since = time.monotonic()
+
+        self._ready.set()
+        self._empty.clear()
+
+    def overflowing(self) -> bool:
+        """Return if the connection is too slow to be kept around:
+        either at the maximum size or over the high water mark
+        for longer than the timeout."""
+        if len(self._items) >= self.max_size:
+            return True
+
+        return (self._over_since is not None
+                and time.monotonic() - self._over_since >= self.timeout)
+
+    def _pop(self):
+        item, key = self._items.popleft()
+
+        if key is not None:
+            self._keys.pop(key, None)
+
+        if len(self._items) <= self.high_water:
+            self._over_since = None
+
+        return item
+
+    async def get(self):
+        """Wait for and remove the oldest item."""
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+
+        return self._pop()
+
+    def task_done(self):
+        """Mark the last item given by :meth:`get` as written."""
+        self.written += 1
+
+        if not self._items:
+            self._empty.set()
+
+    def drain(self) -> list:
+        """Remove and return all queued items."""
+        items = [entry[0] for entry in self._items]
+
+        self._items.clear()
+        self._keys.clear()
+        self._over_since = None
+        self._empty.set()
+
+        return items
+
+    async def join(self):
+        """Wait until all queued items were written."""
+        await self._empty.wait()
@@ -0,0 +1,79 @@
+"""
+discord.gateway.ready: helpers for assembling READY.
+
+READY is made of many independent parts (guilds, relationships,
+settings, ...). Those are fetched concurrently, and each part is
+timed. A single semaphore, shared by all connections, bounds how
+many parts are being fetched at once, so that connecting clients
+can't take the whole database pool.
+
+Only the parts that actually query the database take the
+semaphore, never a part waiting on other parts, so that
+they can't wait on each other for it.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Iterable, List
+
+from logbook import Logger
+
+log = Logger(__name__)
+
+
+def ready_semaphore(config) -> asyncio.Semaphore:
+    """Make the semaphore shared by all READYs.
+
+    By default it is sized to half of the database pool,
+    leaving the other half to everything else.
+    """
+    pool_size = config['POSTGRES'].get('max_size', 10)
+
+    return asyncio.Semaphore(
+        config.get('READY_CONCURRENCY') or max(pool_size // 2, 1))
+
+
+async def limited(semaphore: asyncio.Semaphore,
+                  coro: Awaitable[Any]) -> Any:
+    """Run a coroutine while holding the semaphore."""
+    async with semaphore:
+        return await coro
+
+
+async def bounded_gather(semaphore: asyncio.Semaphore,
+                         coros: Iterable[Awaitable[Any]]) -> List[Any]:
+    """Run coroutines concurrently, each holding the
+    semaphore, returning their results in order."""
+    return await asyncio.gather(
+        *(limited(semaphore, coro) for coro in coros))
+
+
+class ReadyTimings:
+    """Time taken by each section of a READY, in milliseconds."""
+    def __init__(self):
+        self.start = time.perf_counter()
+
+        #: {section: milliseconds}
+        self.sections: Dict[str, float] = {}
+
+    async def section(self, name: str, coro: Awaitable[Any]) -> Any:
+        """Run a coroutine as a named section."""
+        start = time.perf_counter()
+
+        try:
+            return await coro
+        finally:
+            self.sections[name] = (time.perf_counter() - start) * 1000
+
+    @property
+    def total(self) -> float:
+        """Milliseconds since the READY started being assembled."""
+        return (time.perf_counter() - self.start) * 1000
+
+    def report(self, session_id: str):
+        """Log the timings, slowest section first."""
+        breakdown = ' '.join(
+            f'{name}={elapsed:.1f}ms' for name, elapsed in sorted(
+                self.sections.items(), key=lambda item: -item[1]))
+
+        log.info('READY sid={} total={:.1f}ms {}',
+                 session_id, self.total, breakdown)
@@ -0,0 +1,199 @@
+"""
+discord.gateway.session_store: keeping sessions across restarts.
+
+On shutdown, the sessions that were drained are saved to a
+:class:`SessionStore`, and loaded back on startup, so that
+clients can RESUME against the new process instead of going
+through IDENTIFY and READY again.
+
+Stores only have to implement :meth:`SessionStore.save` and
+:meth:`SessionStore.load`. :class:`FileSessionStore` keeps
+sessions in local files.
+"""
+import asyncio
+import base64
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from logbook import Logger
+
+from discord.gateway.state import GatewayState, ParkedConnection
+
+log = Logger(__name__)
+
+#: GatewayState attributes that are saved
+FIELDS = ('session_id', 'user_id', 'bot', 'compress', 'large',
+          'shard', 'current_shard', 'shard_count', 'seq', 'encoding',
+          'presence')
+
+
+def snapshot(state: GatewayState) -> Dict[str, Any]:
+    """Get a JSON-serializable snapshot of a session."""
+    store = state.store.dump()
+
+    store['frames'] = [
+        [seq, event, encoding, base64.b64encode(frame).decode()]
+        for seq, event, encoding, frame in store['frames']]
+
+    return {**{field: getattr(state, field, None) for field in FIELDS},
+            **{'store': store}}
+
+
+def restore(data: Dict[str, Any], **store_limits) -> GatewayState:
+    """Make a session out of a snapshot.
+
+    Until it is resumed, the session's dispatches are stored.
+    """
+    state = GatewayState(
+        **{field: data[field] for field in FIELDS if field != 'presence'},
+        restored=True, **store_limits)
+
+    state.presence = data['presence'] or {}
+
+    store = data['store']
+    state.store.load({**store, **{'frames': [
+        (seq, event, encoding, base64.b64decode(frame))
+        for seq, event, encoding, frame in store['frames']]}})
+
+    state.ws = ParkedConnection(state, state.encoding)
+    return state
+
+
+class SessionStore:
+    """Storage for sessions between restarts."""
+    async def save(self, sessions: List[Dict[str, Any]]):
+        """Save session snapshots, replacing older ones."""
+        raise NotImplementedError
+
+    async def load(self) -> List[Dict[str, Any]]:
+        """Get the saved session snapshots. Sessions can only
+        be resumed once, so they are removed from the store."""
+        raise NotImplementedError
+
+
+class FileSessionStore(SessionStore):
+    """Store sessions in local JSON files.
+
+    Each worker saves to its own file, ``path`` suffixed
+    with its PID. On startup, every saved file is loaded
+    by a single worker, whichever claims it first.
+
+    Snapshots older than ``max_age`` seconds are ignored,
+    those sessions would have expired on clients anyways.
+    """
+    def __init__(self, path: str, max_age: float = 300):
+        self.path = path
+        self.max_age = max_age
+
+    async def save(self, sessions):
+        path = f'{self.path}.{os.getpid()}'
+        tmp_path = f'{path}.tmp'
+
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+        # the replayed dispatches are private to their users
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+
+        with open(fd, 'w') as sessions_file:
+            json.dump({
+                'saved_at': time.time(),
+                'sessions': sessions,
+            }, sessions_file)
+
+        # never leave a half written file around
+        os.replace(tmp_path, path)
+
+    def _claim(self) -> List[str]:
+        """Take the files saved by workers,
+        so that no other worker loads them."""
+        claimed = []
+
+        for path in glob.glob(f'{glob.escape(self.path)}.*'):
+            if not path.rpartition('.')[2].isdigit():
+                continue
+
+            claimed_path = f'{path}.{os.getpid()}.load'
+
+            try:
+                os.rename(path, claimed_path)
+            except FileNotFoundError:
+                # another worker got to it first
+                continue
+
+            claimed.append(claimed_path)
+
+        return claimed
+
+    async def load(self):
+        sessions = []
+
+        for path in self._claim():
+            with open(path) as sessions_file:
+                data = json.load(sessions_file)
+
+            os.remove(path)
+
+            age = time.time() - data['saved_at']
+            if age > self.max_age:
+                log.info('ignoring {} sessions saved {:.0f}s ago',
+                         len(data['sessions']), age)
+                continue
+
+            sessions.extend(data['sessions'])
+
+        return sessions
+
+
+def make_store(config) -> Optional[SessionStore]:
+    """Create the session store set in the config, if any."""
+    path = config.get('SESSION_STORE_PATH')
+
+    if not path:
+        return None
+
+    return FileSessionStore(path, config.get('SESSION_STORE_MAX_AGE', 300))
+
+
+async def save_sessions(store: SessionStore, states: List[GatewayState]):
+    """Save sessions to a store."""
+    await store.save([snapshot(state) for state in states])
+    log.info('saved {} sessions', len(states))
+
+
+async def restore_sessions(store: SessionStore, state_manager,
+                           **store_limits) -> List[GatewayState]:
+    """Load sessions from a store into the state manager."""
+    states = []
+
+    for data in await store.load():
+        try:
+            state = restore(data, **store_limits)
+        except (KeyError, TypeError, ValueError) as err:
+            log.warning('failed to restore a session: {!r}', err)
+            continue
+
+        state_manager.insert(state)
+        states.append(state)
+
+    log.info('restored {} sessions', len(states))
+    return states
+
+
+async def expire_sessions(state_manager, states: List[GatewayState],
+                          timeout: float):
+    """Remove restored sessions that weren't resumed
+    after ``timeout`` seconds."""
+    await asyncio.sleep(timeout)
+
+    expired = [state for state in states if state.restored]
+
+    for state in expired:
+        state_manager.remove(state)
+
+    log.info('{} restored sessions were not resumed', len(expired))
@@ -1,5 +1,6 @@
 import hashlib
 import os
+from typing import List, Optional, Tuple
 
 
 def gen_session_id() -> str:
@@ -7,31 +8,157 @@ def gen_session_id() -> str:
     return hashlib.sha1(os.urandom(128)).hexdigest()
 
 
-class PayloadStore:
-    """Store manager for payloads.
+#: a stored dispatch: (seq, event name, encoding, encoded frame)
+StoredFrame = Tuple[int, str, str, bytes]
 
-    This will only store a maximum of MAX_STORE_SIZE,
-    dropping the older payloads when adding new ones.
+
+class ResumeBuffer:
+    """Ring buffer of the last dispatches sent to a session,
+    used to replay them when the session is resumed.
+
+    Dispatches are stored already encoded, indexed by their
+    sequence number. The buffer holds at most ``max_events``
+    dispatches and ``max_bytes`` bytes of frames, dropping the
+    oldest ones to make room.
     """
-    MAX_STORE_SIZE = 250
+    def __init__(self, max_events: int = 250,
+                 max_bytes: int = 1024 * 1024):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+
+        self._slots: List[Optional[StoredFrame]] = [None] * max_events
+
+        #: oldest and newest sequence numbers in the buffer
+        self.first = 1
+        self.last = 0
+
+        #: total size of the stored frames
+        self.nbytes = 0
+
+        #: how many dispatches were dropped to make room
+        self.evicted = 0
+
+    def __len__(self):
+        return max(self.last - self.first + 1, 0)
+
+    @property
+    def stats(self) -> dict:
+        """Get memory information about the buffer."""
+        return {
+            'events': len(self),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'evicted': self.evicted,
+        }
+
+    def _evict(self):
+        idx = self.first % self.max_events
+        entry = self._slots[idx]
+
+        if entry is not None:
+            self.nbytes -= len(entry[3])
+            self._slots[idx] = None
+
+        self.first += 1
+        self.evicted += 1
+
+    def append(self, seq: int, event: str, encoding: str, frame: bytes):
+        """Store the frame of a dispatch.
+
+        Sequence numbers must grow by one with each dispatch.
+        Frames bigger than the whole byte budget are not kept,
+        leaving a hole in the buffer.
+        """
+        if seq != self.last + 1:
+            # can't happen on a normal session,
+            # start over instead of mixing sequences.
+            while len(self):
+                self._evict()
+
+            self.first = seq
+
+        if len(self) >= self.max_events:
+            self._evict()
+
+        size = len(frame)
+        entry = None
+
+        if size <= self.max_bytes:
+            while self.nbytes + size > self.max_bytes:
+                self._evict()
+
+            entry = (seq, event, encoding, frame)
+            self.nbytes += size
+
+        self._slots[seq % self.max_events] = entry
+        self.last = seq
+
+    def get(self, seq: int) -> Optional[StoredFrame]:
+        """Get a stored dispatch by its sequence number."""
+        if not self.first <= seq <= self.last:
+            return None
+
+        return self._slots[seq % self.max_events]
+
+    def first_missing(self, start: int, end: int) -> Optional[int]:
+        """Get the first sequence number from ``start`` to ``end``,
+        inclusive, that can't be replayed, if any.
 
-    def __init__(self):
-        self.store = {}
+        Dispatches are missing when they were evicted, or
+        when they were too big to be stored.
+        """
+        if start < self.first and self.evicted:
+            return start
 
-    def __getitem__(self, opcode: int):
-        return self.store[opcode]
+        for seq in range(max(start, self.first), min(end, self.last) + 1):
+            if self._slots[seq % self.max_events] is None:
+                return seq
 
-    def __setitem__(self, opcode: int, payload: dict):
-        if len(self.store) > 250:
-            # if more than 250, remove old keys until we get 250
-            opcodes = sorted(list(self.store.keys()))
-            to_remove = len(opcodes) - self.MAX_STORE_SIZE
+        return None
 
-            for idx in range(to_remove):
-                opcode = opcodes[idx]
-                self.store.pop(opcode)
+    def replay(self, start: int, end: int) -> List[StoredFrame]:
+        """Get all stored dispatches from ``start`` to ``end``,
+        inclusive, in order."""
+        entries = []
 
-        self.store[opcode] = payload
+        for seq in range(max(start, self.first), min(end, self.last) + 1):
+            entry = self._slots[seq % self.max_events]
+
+            if entry is not None:
+                entries.append(entry)
+
+        return entries
+
+    def dump(self) -> dict:
+        """Get the contents of the buffer,
+        to be given back to :meth:`load`."""
+        return {
+            'first': self.first,
+            'last': self.last,
+            'evicted': self.evicted,
+            'frames': self.replay(self.first, self.last),
+        }
+
+    def load(self, data: dict):
+        """Replace the contents of the buffer with the ones
+        given by :meth:`dump`, which might come from a buffer
+        with other limits."""
+        self._slots = [None] * self.max_events
+        self.nbytes = 0
+
+        self.last = data['last']
+        self.first = max(data['first'], self.last - self.max_events + 1)
+        self.evicted = data['evicted'] + (self.first - data['first'])
+
+        for seq, event, encoding, frame in data['frames']:
+            if seq < self.first:
+                continue
+
+            self._slots[seq % self.max_events] = (seq, event, encoding, frame)
+            self.nbytes += len(frame)
+
+        while self.nbytes > self.max_bytes:
+            self._evict()
 
 
 class GatewayState:
@@ -56,6 +183,10 @@ class GatewayState:
         self.user_id = kwargs.get('user_id')
         self.bot = kwargs.get('bot', False)
 
+        #: encoding of the connection, stored frames
+        #  keep their own
+        self.encoding = kwargs.get('encoding', 'json')
+
         #: set by the gateway connection
         #  on OP STATUS_UPDATE
         self.presence = {}
@@ -63,8 +194,18 @@ class GatewayState:
         #: set by the backend once identify happens
         self.ws = None
 
-        #: store (kind of) all payloads sent by us
-        self.store = PayloadStore()
+        #: if the session comes from a session store,
+        #  and wasn't resumed yet
+        self.restored = False
+
+        #: guilds the state is indexed under
+        #  in the state manager
+        self.guild_ids = set()
+
+        #: the last dispatches sent by us, for resuming
+        self.store = ResumeBuffer(
+            kwargs.pop('store_max_events', 250),
+            kwargs.pop('store_max_bytes', 1024 * 1024))
 
         for key in kwargs:
             value = kwargs[key]
@@ -73,3 +214,23 @@ class GatewayState:
     def __repr__(self):
         return (f'GatewayState<seq={self.seq} '
                 f'shard={self.shard} uid={self.user_id}>')
+
+
+class ParkedConnection:
+    """Stands in for the connection of a session that was
+    drained, until the session is saved.
+
+    The session stays subscribed, and its dispatches are
+    only stored, so that resuming it after the restart
+    doesn't miss any.
+    """
+    def __init__(self, state: GatewayState, encoding: str):
+        self.state = state
+        self.encoding = encoding
+
+    async def dispatch_frames(self, frames):
+        state = self.state
+        state.seq += 1
+
+        state.store.append(state.seq, frames.event, self.encoding,
+                           frames.frame(self.encoding, state.seq))
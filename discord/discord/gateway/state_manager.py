@@ -1,12 +1,12 @@
 import asyncio
 
-from typing import List
+from typing import List, Dict
 from collections import defaultdict
 
 from websockets.exceptions import ConnectionClosed
 from logbook import Logger
 
-from discord.gateway.state import GatewayState
+from discord.gateway.state import GatewayState, ParkedConnection
 from discord.gateway.opcodes import OP
 
 
@@ -46,6 +46,9 @@ class StateDictWrapper:
     def __iter__(self):
         return self._map.__iter__()
 
+    def __contains__(self, key):
+        return key in self._map
+
     def pop(self, key):
         return self._map.pop(key)
 
@@ -75,6 +78,20 @@ class StateManager:
         #: raw mapping from session ids to GatewayState
         self.states_raw = StateDictWrapper(self, {})
 
+        # {
+        #  guild_id: {
+        #   user_id: {session_id: GatewayState, ...},
+        #   user_id_2: {...}, ...
+        #  }, ...
+        # }
+        #: connected states that get the events of
+        #  each guild, kept by the guild dispatcher.
+        self.guild_index = defaultdict(dict)
+
+        #: {guild_id: set of user ids} that lost
+        #  their last indexed state in the guild
+        self.stale = defaultdict(set)
+
     def insert(self, state: GatewayState):
         """Insert a new state object."""
         user_states = self.states[state.user_id]
@@ -114,6 +131,96 @@ class StateManager:
         except KeyError:
             pass
 
+        self._unindex(state)
+
+    def _shard_match(self, state: GatewayState, guild_id: int) -> bool:
+        # this works if shard_count == 1 (the default for
+        # single gw connections) since N % 1 is always 0
+        return (guild_id >> 22) % state.shard_count == state.current_shard
+
+    def index_member(self, user_id: int, guild_id: int):
+        """Add the connected states of a user
+        that are tied to a guild to the guild index.
+
+        Users without any such state are marked stale,
+        so that their subscription gets cleaned up.
+        """
+        states = (self.states[user_id].values()
+                  if user_id in self.states else ())
+
+        # restored states get indexed once resumed
+        states = [state for state in states
+                  if state.ws is not None
+                  and self._shard_match(state, guild_id)]
+
+        if not states:
+            self.stale[guild_id].add(user_id)
+            return
+
+        user_states = self.guild_index[guild_id].setdefault(user_id, {})
+
+        for state in states:
+            user_states[state.session_id] = state
+            state.guild_ids.add(guild_id)
+
+    def unindex_member(self, user_id: int, guild_id: int):
+        """Remove all states of a user from a guild in the index."""
+        members = self.guild_index.get(guild_id, {})
+
+        for state in members.pop(user_id, {}).values():
+            state.guild_ids.discard(guild_id)
+
+        if not members:
+            self.guild_index.pop(guild_id, None)
+
+    def unindex_guild(self, guild_id: int):
+        """Remove a guild from the index."""
+        for user_states in self.guild_index.pop(guild_id, {}).values():
+            for state in user_states.values():
+                state.guild_ids.discard(guild_id)
+
+        self.stale.pop(guild_id, None)
+
+    def _unindex(self, state: GatewayState):
+        for guild_id in state.guild_ids:
+            members = self.guild_index.get(guild_id, {})
+            user_states = members.get(state.user_id, {})
+            user_states.pop(state.session_id, None)
+
+            if user_states:
+                continue
+
+            # the user's subscription to the guild
+            # is cleaned up on the next dispatch
+            members.pop(state.user_id, None)
+            self.stale[guild_id].add(state.user_id)
+
+            if not members:
+                self.guild_index.pop(guild_id, None)
+
+        state.guild_ids.clear()
+
+    def guild_sessions(self, guild_id: int) -> List[GatewayState]:
+        """Fetch all indexed states of a guild."""
+        return [state
+                for user_states in self.guild_index.get(guild_id, {}).values()
+                for state in user_states.values()]
+
+    def guild_user_states(self, guild_id: int,
+                          user_id: int) -> List[GatewayState]:
+        """Fetch the indexed states of a user in a guild."""
+        members = self.guild_index.get(guild_id, {})
+        return list(members.get(user_id, {}).values())
+
+    def pop_stale(self, guild_id: int) -> List[int]:
+        """Get the users of a guild that lost all their
+        indexed states, and still don't have any."""
+        user_ids = self.stale.pop(guild_id, set())
+        members = self.guild_index.get(guild_id, {})
+
+        # they might have reconnected in the meantime
+        return [user_id for user_id in user_ids if user_id not in members]
+
     def fetch_states(self, user_id: int, guild_id: int) -> List[GatewayState]:
         """Fetch all states that are tied to a guild."""
         states = []
@@ -133,6 +240,30 @@ class StateManager:
         """Fetch all states tied to a single user."""
         return list(self.states[user_id].values())
 
+    def online_states(self, member_ids: List[int], guild_id: int,
+                      limit: int = None) -> List[GatewayState]:
+        """Fetch the states of members in a guild that aren't
+        offline, one per member, and at most limit of them."""
+        states = []
+
+        for member_id in member_ids:
+            # checking first, so that offline members
+            # don't get an empty entry in the defaultdict
+            if member_id not in self.states:
+                continue
+
+            for state in self.fetch_states(member_id, guild_id):
+                if state.presence.get('status', 'offline') == 'offline':
+                    continue
+
+                states.append(state)
+                break
+
+            if limit is not None and len(states) >= limit:
+                break
+
+        return states
+
     def guild_states(self, member_ids: List[int],
                      guild_id: int) -> List[GatewayState]:
         """Fetch all possible states about members in a guild."""
@@ -172,44 +303,30 @@ class StateManager:
             'op': OP.RECONNECT
         })
 
-        # wait 200ms
+        # wait for the payload to be written, then 200ms
         # so that the client has time to process
         # our payload then close the connection
+        await websocket.flush()
         await asyncio.sleep(0.2)
 
         try:
             # try to close the connection ourselves
-            await websocket.ws.close(
-                code=4000,
-                reason='discord shutting down'
-            )
+            await websocket.close(4000, 'discord shutting down')
         except ConnectionClosed:
             log.info('client {} already closed', state)
 
-    def gen_close_tasks(self):
-        """Generate the tasks that will order the clients
-        to reconnect.
-
-        This is required to be ran before :meth:`StateManager.close`,
-        since this function doesn't wait for the tasks to complete.
-        """
-
-        self.accept_new = False
-
-        #: store the shutdown tasks
-        tasks = []
-
-        for state in self.states_raw.values():
-            if not state.ws:
-                continue
-
-            tasks.append(
-                self.shutdown_single(state)
-            )
-
-        log.info('made {} shutdown tasks', len(tasks))
-
-        return tasks
+    def queue_stats(self) -> Dict[str, dict]:
+        """Get the outbound queue counters of
+        every connected state, by session ID."""
+        return {state.session_id: state.ws.outbound.stats
+                for state in self.states_raw.values()
+                if state.ws and not isinstance(state.ws, ParkedConnection)}
+
+    def resume_stats(self) -> Dict[str, dict]:
+        """Get the memory used by the resume buffer
+        of every state, by session ID."""
+        return {state.session_id: state.store.stats
+                for state in self.states_raw.values()}
 
     def close(self):
         """Close the state manager."""
@@ -2,22 +2,25 @@ import collections
 import asyncio
 import pprint
 import zlib
-import json
 from typing import List, Dict, Any
 from random import randint
 
 import websockets
 from logbook import Logger
-import earl
 
+from discord import request_cache
 from discord.auth import raw_token_check
 from discord.enums import RelationshipType
 from discord.schemas import validate, GW_STATUS_UPDATE
-from discord.utils import task_wrapper, DiscordJSONEncoder
+from discord.utils import task_wrapper
 from discord.permissions import get_permissions
 
 from discord.gateway.opcodes import OP
-from discord.gateway.state import GatewayState
+from discord.gateway.state import GatewayState, ParkedConnection
+from discord.gateway.encoding import ENCODINGS, DispatchFrames
+from discord.gateway.outbound import OutboundQueue, coalesce_key
+from discord.gateway.compression import make_stream
+from discord.gateway.ready import ReadyTimings, bounded_gather, limited
 
 from discord.errors import (
     WebsocketClose, Unauthorized, Forbidden, BadRequest
@@ -34,55 +37,57 @@ WebsocketProperties = collections.namedtuple(
 WebsocketObjects = collections.namedtuple(
     'WebsocketObjects', ('db', 'state_manager', 'storage',
                          'loop', 'dispatcher', 'presence', 'ratelimiter',
-                         'user_storage')
+                         'user_storage', 'heartbeats', 'admission')
 )
 
 
-def encode_json(payload) -> str:
-    return json.dumps(payload, separators=(',', ':'),
-                      cls=DiscordJSONEncoder)
+async def state_guild_ids(user_storage, state: GatewayState) -> list:
+    """Get a list of Guild IDs that are tied to a state.
 
+    The implementation is shard-aware.
+    """
+    guild_ids = await user_storage.get_user_guilds(state.user_id)
 
-def decode_json(data: str):
-    return json.loads(data)
+    shard_id = state.current_shard
+    shard_count = state.shard_count
 
+    def _get_shard(guild_id):
+        return (guild_id >> 22) % shard_count
 
-def encode_etf(payload) -> str:
-    return earl.pack(payload)
+    filtered = filter(
+        lambda guild_id: _get_shard(guild_id) == shard_id,
+        guild_ids
+    )
 
+    return list(filtered)
 
-def _etf_decode_dict(data):
-    # NOTE: this is a very slow implementation to
-    # decode the dictionary.
 
-    if isinstance(data, bytes):
-        return data.decode()
+async def subscribe_state(dispatcher, user_storage, state: GatewayState):
+    """Subscribe a state to all its guilds, DM channels, and friends.
 
-    if not isinstance(data, dict):
-        return data
+    Note: subscribing to channels is already handled
+        by GuildDispatcher.sub
+    """
+    user_id = state.user_id
 
-    _copy = dict(data)
-    result = {}
+    guild_ids = await state_guild_ids(user_storage, state)
+    log.info('subscribing to {} guilds', len(guild_ids))
+    await dispatcher.sub_many('guild', user_id, guild_ids)
 
-    for key in _copy.keys():
-        # assuming key is bytes rn.
-        new_k = key.decode()
+    # subscribe the user to all dms they have OPENED.
+    dms = await user_storage.get_dms(user_id)
+    dm_ids = [int(dm['id']) for dm in dms]
 
-        # maybe nested dicts, so...
-        result[new_k] = _etf_decode_dict(data[key])
+    log.info('subscribing to {} dms', len(dm_ids))
+    await dispatcher.sub_many('channel', user_id, dm_ids)
 
-    return result
-
-def decode_etf(data: bytes):
-    res = earl.unpack(data)
-
-    if isinstance(res, bytes):
-        return data.decode()
-
-    if isinstance(res, dict):
-        return _etf_decode_dict(res)
-
-    return res
+    if not state.bot:
+        # subscribe to all friends
+        # (their friends will also subscribe back
+        #  when they come online)
+        friend_ids = await user_storage.get_friend_ids(user_id)
+        log.info('subscribing to {} friends', len(friend_ids))
+        await dispatcher.sub_many('friend', user_id, friend_ids)
 
 
 class GatewayWebsocket:
@@ -92,7 +97,7 @@ class GatewayWebsocket:
         self.ext = WebsocketObjects(
             app.db, app.state_manager, app.storage, app.loop,
             app.dispatcher, app.presence, app.ratelimiter,
-            app.user_storage
+            app.user_storage, app.heartbeats, app.admission
         )
 
         self.storage = self.ext.storage
@@ -100,31 +105,51 @@ class GatewayWebsocket:
         self.presence = self.ext.presence
         self.ws = ws
 
+        compress = kwargs.get('compress', None)
+
         self.wsp = WebsocketProperties(kwargs.get('v'),
                                        kwargs.get('encoding', 'json'),
-                                       kwargs.get('compress', None),
-                                       zlib.compressobj(),
+                                       compress,
+                                       make_stream(compress, app.config),
                                        {})
 
         self.state = None
 
+        #: payloads waiting to be written by the writer task
+        self.outbound = OutboundQueue(
+            app.config.get('GATEWAY_QUEUE_HIGH_WATER', 1000),
+            app.config.get('GATEWAY_QUEUE_MAX', 5000),
+            app.config.get('GATEWAY_QUEUE_TIMEOUT', 30))
+
+        #: set once the connection is going away,
+        #  nothing is queued after that.
+        self._closing = False
+
+        #: bounds the parts of READY being fetched,
+        #  across all connections
+        self._ready_semaphore = app.ready_semaphore
+
+        #: drained sessions are only kept when they're saved
+        self._saving_sessions = app.session_store is not None
+
+        #: limits of the resume buffer of new sessions
+        self._store_limits = {
+            'store_max_events': app.config.get(
+                'GATEWAY_RESUME_MAX_EVENTS', 250),
+            'store_max_bytes': app.config.get(
+                'GATEWAY_RESUME_MAX_BYTES', 1024 * 1024),
+        }
+
         self._set_encoders()
 
     def _set_encoders(self):
-        encoding = self.wsp.encoding
-
-        encodings = {
-            'json': (encode_json, decode_json),
-            'etf': (encode_etf, decode_etf),
-        }
-
-        self.encoder, self.decoder = encodings[encoding]
+        self.encoder, self.decoder = ENCODINGS[self.wsp.encoding]
 
     async def send(self, payload: Dict[str, Any]):
-        """Send a payload to the websocket.
+        """Queue a payload to be sent to the websocket.
 
         This function accounts for the zlib-stream
-        transport method used by Discord.
+        transport method used by Discord, and zstd-stream.
         """
         encoded = self.encoder(payload)
 
@@ -140,12 +165,84 @@ class GatewayWebsocket:
         if not isinstance(encoded, bytes):
             encoded = encoded.encode()
 
-        # handle zlib-stream, pure zlib or plain
-        if self.wsp.compress == 'zlib-stream':
-            data1 = self.wsp.zctx.compress(encoded)
-            data2 = self.wsp.zctx.flush(zlib.Z_FULL_FLUSH)
+        self._enqueue(encoded)
+
+    def _enqueue(self, item, key=None):
+        if self._closing:
+            # keep dispatches around for a possible resume
+            if isinstance(item, DispatchFrames):
+                self._store_frames(item)
+
+            return
+
+        self.outbound.put(item, key)
+
+        if self.outbound.overflowing():
+            log.warning('closing slow connection, sid={} queue={}',
+                        self.state.session_id if self.state else None,
+                        self.outbound.stats)
+
+            self._closing = True
+            self.ext.loop.create_task(task_wrapper(
+                'slow consumer close',
+                self.ws.close(4000, 'Outbound queue overflow')))
 
-            await self.ws.send(data1 + data2)
+    def _store_frames(self, frames: DispatchFrames) -> bytes:
+        """Give a dispatch its sequence number, storing
+        its encoded form for resuming."""
+        self.state.seq += 1
+        seq = self.state.seq
+
+        frame = frames.frame(self.wsp.encoding, seq)
+        self.state.store.append(seq, frames.event, self.wsp.encoding, frame)
+
+        log.debug('sending payload {!r} sid {} s={}',
+                  frames.event, self.state.session_id, seq)
+
+        return frame
+
+    async def _writer(self):
+        """Write queued payloads to the websocket, in order."""
+        while True:
+            item = await self.outbound.get()
+
+            if isinstance(item, DispatchFrames):
+                if self.state is None:
+                    self.outbound.task_done()
+                    continue
+
+                item = self._store_frames(item)
+
+            try:
+                await self._send_encoded(item)
+            except websockets.exceptions.ConnectionClosed:
+                # the listener will notice and clean up, anything
+                # queued from now on is only kept for resuming.
+                self._closing = True
+                return
+            finally:
+                self.outbound.task_done()
+
+    async def flush(self, timeout: float = 5):
+        """Wait for all queued payloads to be written."""
+        try:
+            await asyncio.wait_for(self.outbound.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning('timed out flushing {} payloads',
+                        len(self.outbound))
+
+    async def close(self, code: int, reason: str):
+        """Close the websocket after writing all queued payloads."""
+        await self.flush()
+        self._closing = True
+        await self.ws.close(code=code, reason=reason)
+
+    async def _send_encoded(self, encoded: bytes):
+        """Send an already encoded payload to the websocket,
+        compressing it if needed."""
+        # handle zlib-stream/zstd-stream, pure zlib or plain
+        if self.wsp.zctx is not None:
+            await self.ws.send(self.wsp.zctx.compress(encoded))
         elif self.state and self.state.compress and len(encoded) > 1024:
             await self.ws.send(zlib.compress(encoded))
         else:
@@ -166,25 +263,16 @@ class GatewayWebsocket:
         bucket = ratelimit.get_bucket(ratelimit_key)
         return bucket.update_rate_limit()
 
-    async def _hb_wait(self, interval: int):
-        """Wait heartbeat"""
-        # if the client heartbeats in time,
-        # this task will be cancelled.
-        await asyncio.sleep(interval / 1000)
-        await self.ws.close(4000, 'Heartbeat expired')
+    async def heartbeat_expired(self):
+        """Called by the heartbeat supervisor when the client
+        didn't heartbeat in time."""
+        await self.close(4000, 'Heartbeat expired')
 
         self._cleanup()
 
     def _hb_start(self, interval: int):
-        # always refresh the heartbeat task
-        # when possible
-        task = self.wsp.tasks.get('heartbeat')
-        if task:
-            task.cancel()
-
-        self.wsp.tasks['heartbeat'] = self.ext.loop.create_task(
-            task_wrapper('hb wait', self._hb_wait(interval))
-        )
+        # move the heartbeat deadline
+        self.ext.heartbeats.beat(self, interval / 1000)
 
     async def send_hello(self):
         """Send the OP 10 Hello packet over the websocket."""
@@ -202,41 +290,32 @@ class GatewayWebsocket:
 
     async def dispatch(self, event: str, data: Any):
         """Dispatch an event to the websocket."""
-        self.state.seq += 1
-
-        payload = {
-            'op': OP.DISPATCH,
-            't': event.upper(),
-            's': self.state.seq,
-            'd': data,
-        }
-
-        self.state.store[self.state.seq] = payload
+        await self.dispatch_frames(DispatchFrames(event, data))
 
-        log.debug('sending payload {!r} sid {}',
-                  event.upper(), self.state.session_id)
+    async def dispatch_frames(self, frames: DispatchFrames):
+        """Dispatch an event that might be going to many
+        websockets, reusing its encoded form.
 
-        await self.send(payload)
+        The event only gets its sequence number when written,
+        so superseded events can be coalesced while queued.
+        """
+        self._enqueue(frames, coalesce_key(frames))
 
-    async def _make_guild_list(self) -> List[int]:
+    async def _make_guild_list(self, guild_ids: List[int]) -> List[int]:
         user_id = self.state.user_id
 
-        guild_ids = await self._guild_ids()
-
         if self.state.bot:
             return [{
                 'id': row,
                 'unavailable': True,
             } for row in guild_ids]
 
-        return [
-            {
-                **await self.storage.get_guild(guild_id, user_id),
-                **await self.storage.get_guild_extra(guild_id, user_id,
-                                                     self.state.large)
-            }
+        guilds = await bounded_gather(self._ready_semaphore, (
+            self.storage.get_guild_full(guild_id, user_id, self.state.large)
             for guild_id in guild_ids
-        ]
+        ))
+
+        return [guild for guild in guilds if guild is not None]
 
     async def _guild_dispatch(self, unavailable_guilds: List[Dict[str, Any]]):
         """Dispatch GUILD_CREATE information."""
@@ -245,18 +324,24 @@ class GatewayWebsocket:
         if not self.state.bot:
             return
 
-        for guild_obj in unavailable_guilds:
+        async def _guild_create(guild_id: int):
             # fetch full guild object including the 'large' field
             guild = await self.storage.get_guild_full(
-                int(guild_obj['id']), self.state.user_id, self.state.large
+                guild_id, self.state.user_id, self.state.large
             )
 
-            if guild is None:
-                continue
+            if guild is None or self.state is None:
+                return
 
             await self.dispatch('GUILD_CREATE', guild)
 
-    async def _user_ready(self) -> dict:
+        # guilds are dispatched as soon as they are ready
+        await bounded_gather(self._ready_semaphore, (
+            _guild_create(int(guild_obj['id']))
+            for guild_obj in unavailable_guilds
+        ))
+
+    async def _user_ready(self, timings: ReadyTimings) -> dict:
         """Fetch information about users in the READY packet.
 
         This part of the API is completly undocumented.
@@ -264,23 +349,44 @@ class GatewayWebsocket:
         """
 
         user_id = self.state.user_id
+        user_storage = self.user_storage
+
+        semaphore = self._ready_semaphore
+
+        def _section(name: str, coro):
+            return timings.section(name, limited(semaphore, coro))
+
+        async def _relationships():
+            relationships = await _section(
+                'relationships', user_storage.get_relationships(user_id))
 
-        relationships = await self.user_storage.get_relationships(user_id)
+            friend_ids = [int(r['user']['id']) for r in relationships
+                          if r['type'] == RelationshipType.FRIEND.value]
 
-        friend_ids = [int(r['user']['id']) for r in relationships
-                      if r['type'] == RelationshipType.FRIEND.value]
+            friend_presences = await _section(
+                'friend_presences',
+                self.ext.presence.friend_presences(friend_ids))
 
-        friend_presences = await self.ext.presence.friend_presences(friend_ids)
-        settings = await self.user_storage.get_user_settings(user_id)
+            return relationships, friend_presences
+
+        (relationships, friend_presences), settings, notes, \
+            read_state, guild_settings = await asyncio.gather(
+                _relationships(),
+                _section('user_settings',
+                         user_storage.get_user_settings(user_id)),
+                _section('notes', user_storage.fetch_notes(user_id)),
+                _section('read_state', user_storage.get_read_state(user_id)),
+                _section('user_guild_settings',
+                         user_storage.get_guild_settings(user_id)),
+            )
 
         return {
             'user_settings': settings,
-            'notes': await self.user_storage.fetch_notes(user_id),
+            'notes': notes,
             'relationships': relationships,
             'presences': friend_presences,
-            'read_state': await self.user_storage.get_read_state(user_id),
-            'user_guild_settings': await self.user_storage.get_guild_settings(
-                user_id),
+            'read_state': read_state,
+            'user_guild_settings': guild_settings,
 
             'friend_suggestion_count': 0,
 
@@ -291,29 +397,49 @@ class GatewayWebsocket:
             'analytics_token': 'transbian',
         }
 
+    async def _no_user_ready(self) -> dict:
+        return {}
+
     async def dispatch_ready(self):
-        """Dispatch the READY packet for a connecting account."""
-        guilds = await self._make_guild_list()
+        """Dispatch the READY packet for a connecting account.
 
+        Independent parts of READY are fetched concurrently,
+        and the time each one took is logged.
+        """
+        timings = ReadyTimings()
         user_id = self.state.user_id
-        user = await self.storage.get_user(user_id, True)
-
-        uready = {}
-        if not self.state.bot:
-            # user, fetch info
-            uready = await self._user_ready()
+        semaphore = self._ready_semaphore
+
+        guild_ids = await timings.section(
+            'guild_ids', limited(semaphore, self._guild_ids()))
+
+        # the guild list and user information
+        # take the semaphore for each of their parts
+        guilds, user, private_channels, uready = await asyncio.gather(
+            timings.section('guilds', self._make_guild_list(guild_ids)),
+            timings.section('user', limited(
+                semaphore, self.storage.get_user(user_id, True))),
+            timings.section('private_channels', limited(
+                semaphore, self.user_storage.get_dms(user_id))),
+
+            # bots don't get user information
+            self._no_user_ready() if self.state.bot
+            else self._user_ready(timings),
+        )
 
         await self.dispatch('READY', {**{
             'v': 6,
             'user': user,
 
-            'private_channels': await self.user_storage.get_dms(user_id),
+            'private_channels': private_channels,
 
             'guilds': guilds,
             'session_id': self.state.session_id,
             '_trace': ['transbian']
         }, **uready})
 
+        timings.report(self.state.session_id)
+
         # async dispatch of guilds
         self.ext.loop.create_task(self._guild_dispatch(guilds))
 
@@ -340,53 +466,13 @@ class GatewayWebsocket:
             raise InvalidShard('Shard count > Total shards')
 
     async def _guild_ids(self) -> list:
-        """Get a list of Guild IDs that are tied to this connection.
-
-        The implementation is shard-aware.
-        """
-        guild_ids = await self.user_storage.get_user_guilds(
-            self.state.user_id
-        )
-
-        shard_id = self.state.current_shard
-        shard_count = self.state.shard_count
-
-        def _get_shard(guild_id):
-            return (guild_id >> 22) % shard_count
-
-        filtered = filter(
-            lambda guild_id: _get_shard(guild_id) == shard_id,
-            guild_ids
-        )
-
-        return list(filtered)
+        """Get a list of Guild IDs that are tied to this connection."""
+        return await state_guild_ids(self.user_storage, self.state)
 
     async def subscribe_all(self):
-        """Subscribe to all guilds, DM channels, and friends.
-
-        Note: subscribing to channels is already handled
-            by GuildDispatcher.sub
-        """
-        user_id = self.state.user_id
-
-        guild_ids = await self._guild_ids()
-        log.info('subscribing to {} guilds', len(guild_ids))
-        await self.ext.dispatcher.sub_many('guild', user_id, guild_ids)
-
-        # subscribe the user to all dms they have OPENED.
-        dms = await self.user_storage.get_dms(user_id)
-        dm_ids = [int(dm['id']) for dm in dms]
-
-        log.info('subscribing to {} dms', len(dm_ids))
-        await self.ext.dispatcher.sub_many('channel', user_id, dm_ids)
-
-        if not self.state.bot:
-            # subscribe to all friends
-            # (their friends will also subscribe back
-            #  when they come online)
-            friend_ids = await self.user_storage.get_friend_ids(user_id)
-            log.info('subscribing to {} friends', len(friend_ids))
-            await self.ext.dispatcher.sub_many('friend', user_id, friend_ids)
+        """Subscribe to all guilds, DM channels, and friends."""
+        await subscribe_state(
+            self.ext.dispatcher, self.user_storage, self.state)
 
     async def update_status(self, status: dict):
         """Update the status of the current websocket connection."""
@@ -446,7 +532,11 @@ class GatewayWebsocket:
         # close the websocket
         self._hb_start((46 + 3) * 1000)
         cliseq = payload.get('d')
-        self.state.last_seq = cliseq
+
+        # connections waiting for admission don't have a state yet
+        if self.state:
+            self.state.last_seq = cliseq
+
         await self.send_op(OP.HEARTBEAT_ACK, None)
 
     async def _connect_ratelimit(self, user_id: int):
@@ -495,7 +585,9 @@ class GatewayWebsocket:
             shard=shard,
             current_shard=shard[0],
             shard_count=shard[1],
-            ws=self
+            encoding=self.wsp.encoding,
+            ws=self,
+            **self._store_limits
         )
 
         # link the state to the user
@@ -549,31 +641,55 @@ class GatewayWebsocket:
             # when trying to resume.
             self.ext.state_manager.remove(self.state)
 
-    async def _resume(self, replay_seqs: iter):
-        presences = []
+    def _replay_frame(self, encoding: str, frame: bytes) -> bytes:
+        """Get a stored frame in this connection's encoding."""
+        if encoding == self.wsp.encoding:
+            return frame
 
-        try:
-            for seq in replay_seqs:
-                try:
-                    payload = self.state.store[seq]
-                except KeyError:
-                    # ignore unknown seqs
-                    continue
+        # the session was resumed with another encoding
+        _, decoder = ENCODINGS[encoding]
+        encoded = self.encoder(decoder(frame))
+
+        if not isinstance(encoded, bytes):
+            encoded = encoded.encode()
+
+        return encoded
+
+    async def _resume(self, start: int, end: int):
+        """Replay the stored dispatches from ``start`` to ``end``."""
+        store = self.state.store
+        missing = store.first_missing(start, end)
 
-                payload_t = payload.get('t')
+        # replaying around a missing dispatch would
+        # leave the client in a wrong state
+        if missing is not None:
+            log.info('Resuming failed, seq {} not stored '
+                     '(oldest {})', missing, store.first)
+            return await self.invalidate_session(False)
+
+        presences = []
+        frames = []
 
+        try:
+            for _seq, event, encoding, frame in store.replay(start, end):
                 # presence resumption happens
                 # on a separate event, PRESENCE_REPLACE.
-                if payload_t == 'PRESENCE_UPDATE':
-                    presences.append(payload.get('d'))
+                if event == 'PRESENCE_UPDATE':
+                    _, decoder = ENCODINGS[encoding]
+                    presences.append(decoder(frame)['d'])
                     continue
 
-                await self.send(payload)
+                frames.append(self._replay_frame(encoding, frame))
         except Exception:
             log.exception('error while resuming')
             await self.invalidate_session(False)
             return
 
+        # queue the whole replay at once, the writer
+        # sends it back to back.
+        for frame in frames:
+            self.outbound.put(frame)
+
         if presences:
             await self.dispatch('PRESENCE_REPLACE', presences)
 
@@ -602,16 +718,21 @@ class GatewayWebsocket:
         if seq > state.seq:
             raise WebsocketClose(4007, 'Invalid seq')
 
-        # check if a websocket isnt on that state already
-        if state.ws is not None:
+        # check if a websocket isnt on that state already,
+        # restored sessions only have their dispatches stored.
+        if state.ws is not None and not isinstance(
+                state.ws, ParkedConnection):
             log.info('Resuming failed, websocket already connected')
             return await self.invalidate_session(False)
 
         # relink this connection
         self.state = state
         state.ws = self
+        state.encoding = self.wsp.encoding
+        state.restored = False
 
-        await self._resume(range(seq, state.seq))
+        # the client already got everything up to seq
+        await self._resume(seq + 1, state.seq)
 
     async def _req_guild_members(self, guild_id: str, user_ids: List[int],
                                  query: str, limit: int):
@@ -620,12 +741,19 @@ class GatewayWebsocket:
         except (TypeError, ValueError):
             return
 
-        limit = limit or 1000
         exists = await self.storage.get_guild(guild_id)
 
         if not exists:
             return
 
+        # an empty query without a limit is asking for every member,
+        # which is how clients fill in large guilds.
+        if not user_ids and not query and not limit:
+            await self._guild_members_chunks(guild_id)
+            return
+
+        limit = limit or 1000
+
         # limit user_ids to 1000 possible members
         user_ids = user_ids[:1000]
 
@@ -651,6 +779,18 @@ class GatewayWebsocket:
             'members': result
         })
 
+    async def _guild_members_chunks(self, guild_id: int,
+                                    chunk_size: int = 1000):
+        """Dispatch all the members of a guild,
+        chunk_size members per GUILD_MEMBERS_CHUNK."""
+        members = await self.storage.get_member_data(guild_id)
+
+        for index in range(0, len(members), chunk_size):
+            await self.dispatch('GUILD_MEMBERS_CHUNK', {
+                'guild_id': str(guild_id),
+                'members': members[index:index + chunk_size],
+            })
+
     async def handle_8(self, payload: Dict):
         """Handle OP 8 Request Guild Members."""
         data = payload['d']
@@ -824,7 +964,44 @@ class GatewayWebsocket:
             log.warning('Payload with bad op: {}', pprint.pformat(payload))
             raise UnknownOPCode(f'Bad OP code: {op_code}')
 
-        await handler(payload)
+        # lookups are memoized for the duration of the op
+        request_cache.start()
+
+        try:
+            await handler(payload)
+        finally:
+            request_cache.finish(f'op {op_code}')
+
+    async def _admit(self, payload):
+        """Process an IDENTIFY or RESUME once the
+        admission controller lets it in."""
+        kind = 'resume' if payload['op'] == OP.RESUME else 'identify'
+
+        try:
+            async with self.ext.admission.slot(kind):
+                await self.process_message(payload)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except WebsocketClose as err:
+            log.warning('ws close on {}, err={}', kind, err)
+            await self.close(err.code, err.reason)
+        except Exception as err:
+            log.exception('error while processing {}', kind)
+            await self.close(4000, repr(err))
+
+    def _start_admission(self, payload):
+        """Queue an IDENTIFY or RESUME for admission.
+
+        It runs as a separate task, so that heartbeats keep
+        being answered while the connection waits.
+        """
+        task = self.wsp.tasks.get('admission')
+
+        if self.state or (task and not task.done()):
+            raise WebsocketClose(4005, 'Already authenticated')
+
+        self.wsp.tasks['admission'] = self.ext.loop.create_task(
+            self._admit(payload))
 
     async def _msg_ratelimit(self):
         if self._check_ratelimit('messages', self.state.session_id):
@@ -850,16 +1027,38 @@ class GatewayWebsocket:
                 await self._msg_ratelimit()
 
             payload = self.decoder(message)
+
+            if payload.get('op') in (OP.IDENTIFY, OP.RESUME):
+                self._start_admission(payload)
+                continue
+
             await self.process_message(payload)
 
     def _cleanup(self):
+        self._closing = True
+        self.ext.heartbeats.forget(self)
+
         for task in self.wsp.tasks.values():
             task.cancel()
 
-        if self.state:
+        # dispatches that weren't written can still be resumed
+        for item in self.outbound.drain():
+            if self.state and isinstance(item, DispatchFrames):
+                self._store_frames(item)
+
+        if not self.state:
+            return
+
+        if self._saving_sessions and not self.ext.state_manager.accept_new:
+            # the server is draining, and the session is saved
+            # for resuming once it's done. until then, it keeps
+            # getting dispatches.
+            self.state.ws = ParkedConnection(self.state, self.wsp.encoding)
+        else:
             self.ext.state_manager.remove(self.state)
             self.state.ws = None
-            self.state = None
+
+        self.state = None
 
     async def _check_conns(self, user_id):
         """Check if there are any existing connections.
@@ -892,6 +1091,10 @@ class GatewayWebsocket:
     async def run(self):
         """Wrap listen_messages inside
         a try/except block for WebsocketClose handling."""
+        self.wsp.tasks['writer'] = self.ext.loop.create_task(
+            task_wrapper('ws writer', self._writer())
+        )
+
         try:
             await self.send_hello()
             await self.listen_messages()
@@ -899,10 +1102,10 @@ class GatewayWebsocket:
             log.warning('conn close, state={}, err={}', self.state, err)
         except WebsocketClose as err:
             log.warning('ws close, state={} err={}', self.state, err)
-            await self.ws.close(code=err.code, reason=err.reason)
+            await self.close(err.code, err.reason)
         except Exception as err:
             log.exception('An exception has occoured. state={}', self.state)
-            await self.ws.close(code=4000, reason=repr(err))
+            await self.close(4000, repr(err))
         finally:
             user_id = self.state.user_id if self.state else None
             self._cleanup()
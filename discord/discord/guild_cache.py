@@ -0,0 +1,217 @@
+"""
+discord.guild_cache: in-process cache of guild snapshots.
+
+A snapshot holds the parts of a guild payload that are the
+same for every user: the guild's own fields, roles, channels,
+emojis and member count. Per-user fields (owner, joined_at),
+members and presences are overlaid by Storage when building
+the final payload.
+"""
+import json
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Tuple, Optional, List
+
+from logbook import Logger
+
+from discord.shared_cache import shared
+
+log = Logger(__name__)
+
+#: the parts of a snapshot that can be invalidated
+#  separately from each other.
+PARTS = ('guild', 'roles', 'channels', 'emojis', 'member_count')
+
+
+@dataclass(frozen=True)
+class GuildSnapshot:
+    """An immutable view over a guild's shared information.
+
+    Parts that were invalidated are set to None, and must be
+    reloaded before the snapshot is used.
+
+    The nested objects must not be modified in-place, as
+    they are shared between all payloads built off the snapshot.
+    """
+    guild_id: int
+    version: int
+    guild: Optional[Dict[str, Any]] = None
+    roles: Optional[Tuple[Dict[str, Any], ...]] = None
+    channels: Optional[Tuple[Dict[str, Any], ...]] = None
+    emojis: Optional[Tuple[Dict[str, Any], ...]] = None
+    member_count: Optional[int] = None
+
+    #: approximate size of the snapshot, in bytes
+    size: int = 0
+
+    @property
+    def missing(self) -> List[str]:
+        """Get the parts that need to be reloaded."""
+        return [part for part in PARTS if getattr(self, part) is None]
+
+    def calc_size(self) -> int:
+        """Estimate the memory used by the snapshot
+        via the size of its JSON representation."""
+        return len(json.dumps(
+            [self.guild, self.roles, self.channels, self.emojis],
+            default=str))
+
+
+class GuildCache:
+    """LRU cache of :class:`GuildSnapshot`, capped by memory usage.
+
+    Code that changes a guild's roles, channels, emojis, member
+    count or the guild itself must call :meth:`invalidate`
+    (or :meth:`patch_member_count`) *before* fetching the updated
+    data to dispatch, so that it doesn't see a stale snapshot.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+        #: {guild_id: GuildSnapshot}, least recently used first
+        self._snapshots = OrderedDict()
+        self._total_bytes = 0
+
+        #: last snapshot version given to a guild
+        self._versions = defaultdict(int)
+
+        #: bumped on every change, so that snapshots
+        #  built concurrently with a change are not stored.
+        self._generation = defaultdict(int)
+
+        self.hits = 0
+        self.misses = 0
+        self.partial_hits = 0
+        self.evictions = 0
+
+        #: set by the app to share changes with other nodes,
+        #  see :mod:`discord.shared_cache`
+        self.publish = None
+
+    @property
+    def stats(self) -> dict:
+        """Get counters about the cache."""
+        return {
+            'hits': self.hits,
+            'partial_hits': self.partial_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'guilds': len(self._snapshots),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def generation(self, guild_id: int) -> int:
+        """Get the current generation for a guild.
+
+        Pass it back to :meth:`put` so that snapshots
+        built from data read before a change are dropped.
+        """
+        return self._generation[guild_id]
+
+    def get(self, guild_id: int) -> Optional[GuildSnapshot]:
+        """Get a snapshot, marking it as recently used.
+
+        The snapshot might have missing parts.
+        """
+        try:
+            snapshot = self._snapshots[guild_id]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._snapshots.move_to_end(guild_id)
+
+        if snapshot.missing:
+            self.partial_hits += 1
+        else:
+            self.hits += 1
+
+        return snapshot
+
+    def _drop(self, guild_id: int) -> Optional[GuildSnapshot]:
+        snapshot = self._snapshots.pop(guild_id, None)
+
+        if snapshot is not None:
+            self._total_bytes -= snapshot.size
+
+        return snapshot
+
+    def _store(self, snapshot: GuildSnapshot):
+        self._drop(snapshot.guild_id)
+
+        self._snapshots[snapshot.guild_id] = snapshot
+        self._total_bytes += snapshot.size
+
+        while self._total_bytes > self.max_bytes and self._snapshots:
+            guild_id, evicted = self._snapshots.popitem(last=False)
+            self._total_bytes -= evicted.size
+            self.evictions += 1
+
+            log.debug('evicted guild snapshot gid={} size={}',
+                      guild_id, evicted.size)
+
+    def _new_version(self, snapshot: GuildSnapshot,
+                     **changes) -> GuildSnapshot:
+        self._versions[snapshot.guild_id] += 1
+
+        snapshot = replace(
+            snapshot, version=self._versions[snapshot.guild_id],
+            **changes)
+
+        return replace(snapshot, size=snapshot.calc_size())
+
+    def put(self, guild_id: int, generation: int,
+            **parts) -> GuildSnapshot:
+        """Create and store a new snapshot for a guild.
+
+        The snapshot is not stored if the guild changed
+        after ``generation`` was acquired. It is still returned,
+        so the caller can use it for the current request.
+        """
+        snapshot = self._new_version(
+            GuildSnapshot(guild_id, 0), **parts)
+
+        if generation == self._generation[guild_id]:
+            self._store(snapshot)
+
+        return snapshot
+
+    @shared
+    def invalidate(self, guild_id: int, *parts: str):
+        """Invalidate parts of a guild's snapshot.
+
+        Invalidating no parts means the whole snapshot.
+        """
+        self._generation[guild_id] += 1
+
+        if not parts:
+            self._drop(guild_id)
+            return
+
+        snapshot = self._snapshots.get(guild_id)
+
+        if snapshot is None:
+            return
+
+        self._store(self._new_version(
+            snapshot, **{part: None for part in parts}))
+
+    @shared
+    def patch_member_count(self, guild_id: int, delta: int):
+        """Change the member count of a guild's snapshot, if any."""
+        self._generation[guild_id] += 1
+        snapshot = self._snapshots.get(guild_id)
+
+        if snapshot is None or snapshot.member_count is None:
+            return
+
+        self._store(self._new_version(
+            snapshot, member_count=snapshot.member_count + delta))
+
+    @shared
+    def remove(self, guild_id: int):
+        """Remove a guild from the cache entirely."""
+        self._drop(guild_id)
+        self._versions.pop(guild_id, None)
+        self._generation[guild_id] += 1
@@ -0,0 +1,414 @@
+"""
+discord.message_buffer: in-memory buffer of recent messages.
+
+Each buffered channel keeps its newest messages, already hydrated,
+so that the common "give me the latest messages" request
+does not need to touch the database.
+
+Reactions are stored as rows instead of rendered lists,
+since the rendered list depends on who is asking for it
+(the "me" field of each reaction).
+
+Payloads embed their author and mentioned users (with their
+members), so changing a user or member must drop the channels
+whose buffers embed them, see :meth:`MessageBuffer.invalidate_user`.
+"""
+import json
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from logbook import Logger
+
+from discord.shared_cache import shared
+
+log = Logger(__name__)
+
+#: extra bytes accounted for each reaction row
+REACTION_ROW_SIZE = 64
+
+
+class ChannelBuffer:
+    """The buffered messages of a single channel.
+
+    All messages in the channel that have an ID
+    greater or equal to ``floor`` are in the buffer.
+    A floor of 0 means the buffer holds every message
+    in the channel.
+    """
+    __slots__ = ('messages', 'floor', 'size', 'user_ids')
+
+    def __init__(self, floor: int = 0):
+        #: {message_id: [payload, reaction rows, size]},
+        #  ordered by message ID, oldest first.
+        self.messages = OrderedDict()
+        self.floor = floor
+        self.size = 0
+
+        #: users embedded in the payloads
+        self.user_ids = set()
+
+
+def _entry_size(payload: dict, reactions: list) -> int:
+    return (len(json.dumps(payload, default=str))
+            + REACTION_ROW_SIZE * len(reactions))
+
+
+def _embedded_users(payload: dict) -> List[int]:
+    """Get the IDs of the users embedded in a message payload."""
+    users = list(payload.get('mentions', ()))
+
+    if payload.get('author'):
+        users.append(payload['author'])
+
+    return [int(user['id']) for user in users]
+
+
+class MessageBuffer:
+    """Per-channel buffers of recent message payloads,
+    capped by a depth per channel and a global memory budget.
+
+    Channels that weren't used recently are evicted first.
+
+    Every change to a channel's messages must be reported
+    to the buffer *after* it is written to the database.
+    """
+    def __init__(self, depth: int = 100,
+                 max_bytes: int = 32 * 1024 * 1024):
+        self.depth = depth
+        self.max_bytes = max_bytes
+
+        #: {channel_id: ChannelBuffer}, least recently used first
+        self._channels = OrderedDict()
+        self._total_bytes = 0
+
+        #: {channel_id: [seeds in flight, generation]}, only kept
+        #  while a seed of the channel is in flight. the generation
+        #  is bumped on every change to the channel, so that buffers
+        #  seeded concurrently with a change are not stored.
+        self._seeds = {}
+
+        #: {user_id: ids of the buffered channels embedding the user}
+        self._user_channels = defaultdict(set)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        #: set by the app to share changes with other nodes,
+        #  see :mod:`discord.shared_cache`
+        self.publish = None
+
+    @property
+    def stats(self) -> dict:
+        """Get counters about the buffer."""
+        total = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'channels': len(self._channels),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def generation(self, channel_id: int) -> int:
+        """Start seeding a channel, getting its current generation.
+
+        Pass it back to :meth:`seed`, or call :meth:`abort_seed`
+        if the seed is given up.
+        """
+        seed = self._seeds.setdefault(channel_id, [0, 0])
+        seed[0] += 1
+        return seed[1]
+
+    def abort_seed(self, channel_id: int):
+        """Give up a seed started by :meth:`generation`."""
+        self._end_seed(channel_id)
+
+    def _end_seed(self, channel_id: int) -> int:
+        """Finish a seed of a channel, returning its generation."""
+        seed = self._seeds[channel_id]
+        seed[0] -= 1
+
+        if not seed[0]:
+            self._seeds.pop(channel_id)
+
+        return seed[1]
+
+    def _bump(self, channel_id: int):
+        seed = self._seeds.get(channel_id)
+
+        if seed is not None:
+            seed[1] += 1
+
+    def has(self, channel_id: int, message_id: int) -> bool:
+        """Return if a message is currently buffered."""
+        buf = self._channels.get(channel_id)
+        return buf is not None and message_id in buf.messages
+
+    def query(self, channel_id: int, limit: int,
+              before: Optional[int] = None,
+              after: Optional[int] = None
+              ) -> Optional[List[Tuple[Dict[str, Any], list]]]:
+        """Get messages out of a channel's buffer, newest first.
+
+        This follows the same semantics as the message history
+        query: messages with ``after < id < before``, up to ``limit``.
+
+        Returns a list of (payload, reaction rows) tuples,
+        or None when the buffer can't answer the query
+        without possibly missing messages.
+        """
+        buf = self._channels.get(channel_id)
+
+        if buf is None:
+            self.misses += 1
+            return None
+
+        res = []
+
+        for message_id in reversed(buf.messages):
+            if len(res) >= limit:
+                break
+
+            if before and message_id >= before:
+                continue
+
+            if after and message_id <= after:
+                break
+
+            payload, reactions, _size = buf.messages[message_id]
+            res.append((payload, reactions))
+
+        # a full page is always correct, since the buffer has
+        # all messages newer than the oldest one in the page.
+        # otherwise, older messages outside the buffer
+        # could be part of the page.
+        complete = (len(res) == limit
+                    or buf.floor == 0
+                    or (after and after + 1 >= buf.floor))
+
+        if not complete:
+            self.misses += 1
+            return None
+
+        self._channels.move_to_end(channel_id)
+        self.hits += 1
+        return res
+
+    def _account(self, buf: ChannelBuffer, delta: int):
+        buf.size += delta
+        self._total_bytes += delta
+
+    def _trim(self, channel_id: int, buf: ChannelBuffer):
+        while len(buf.messages) > self.depth:
+            message_id, (_, _, size) = buf.messages.popitem(last=False)
+            self._account(buf, -size)
+            buf.floor = message_id + 1
+
+        while self._total_bytes > self.max_bytes and self._channels:
+            evicted_id, evicted = self._channels.popitem(last=False)
+            self._total_bytes -= evicted.size
+            self._unindex(evicted_id, evicted)
+            self.evictions += 1
+
+            log.debug('evicted message buffer cid={} size={}',
+                      evicted_id, evicted.size)
+
+    def _unindex(self, channel_id: int, buf: ChannelBuffer):
+        for user_id in buf.user_ids:
+            channel_ids = self._user_channels[user_id]
+            channel_ids.discard(channel_id)
+
+            if not channel_ids:
+                self._user_channels.pop(user_id)
+
+    def _set(self, channel_id: int, buf: ChannelBuffer, message_id: int,
+             payload: dict, reactions: list):
+        old = buf.messages.get(message_id)
+        size = _entry_size(payload, reactions)
+
+        buf.messages[message_id] = [payload, reactions, size]
+        self._account(buf, size - (old[2] if old else 0))
+
+        # users of removed messages are kept
+        # until the whole channel goes away.
+        for user_id in _embedded_users(payload):
+            buf.user_ids.add(user_id)
+            self._user_channels[user_id].add(channel_id)
+
+    def seed(self, channel_id: int, generation: int,
+             messages: List[Dict[str, Any]],
+             reactions: Dict[int, list], exhaustive: bool):
+        """Fill a channel's buffer with its newest messages.
+
+        ``messages`` must be the newest messages of the channel,
+        in any order. ``exhaustive`` tells if those are all
+        the messages in the channel.
+
+        Nothing is stored if the channel changed
+        after ``generation`` was acquired.
+        """
+        if generation != self._end_seed(channel_id):
+            return
+
+        self._drop(channel_id)
+
+        ordered = sorted(messages, key=lambda message: int(message['id']))
+        floor = 0 if exhaustive or not ordered else int(ordered[0]['id'])
+
+        buf = ChannelBuffer(floor)
+        self._channels[channel_id] = buf
+
+        for message in ordered:
+            message_id = int(message['id'])
+            payload = {key: val for key, val in message.items()
+                       if key != 'reactions'}
+
+            self._set(channel_id, buf, message_id, payload,
+                      list(reactions.get(message_id, ())))
+
+        self._trim(channel_id, buf)
+
+    @shared
+    def append(self, channel_id: int, message: Dict[str, Any]):
+        """Add a newly created message to a channel's buffer."""
+        self._bump(channel_id)
+        buf = self._channels.get(channel_id)
+
+        if buf is None:
+            return
+
+        message_id = int(message['id'])
+
+        if message_id < buf.floor:
+            return
+
+        payload = {key: val for key, val in message.items()
+                   if key != 'reactions'}
+
+        out_of_order = buf.messages and message_id < next(
+            reversed(buf.messages))
+
+        self._set(channel_id, buf, message_id, payload, [])
+
+        if out_of_order:
+            buf.messages = OrderedDict(sorted(buf.messages.items()))
+
+        self._trim(channel_id, buf)
+
+    def _get(self, channel_id: int, message_id: int) -> Optional[list]:
+        self._bump(channel_id)
+        buf = self._channels.get(channel_id)
+
+        if buf is None:
+            return None
+
+        return buf.messages.get(message_id)
+
+    @shared
+    def update(self, channel_id: int, message: Dict[str, Any]):
+        """Replace the payload of an edited message."""
+        message_id = int(message['id'])
+        entry = self._get(channel_id, message_id)
+
+        if entry is None:
+            return
+
+        payload = {key: val for key, val in message.items()
+                   if key != 'reactions'}
+
+        self._set(channel_id, self._channels[channel_id], message_id,
+                  payload, entry[1])
+
+    @shared
+    def set_pinned(self, channel_id: int, message_id: int, pinned: bool):
+        """Change the pinned flag of a message."""
+        entry = self._get(channel_id, message_id)
+
+        if entry is None:
+            return
+
+        entry[0] = {**entry[0], **{'pinned': pinned}}
+
+    @shared
+    def add_reaction(self, channel_id: int, message_id: int,
+                     row: Dict[str, Any]):
+        """Add a reaction row to a message.
+
+        The row must have the same fields as the
+        message_reactions table (user_id, emoji_type,
+        emoji_id, emoji_text).
+        """
+        entry = self._get(channel_id, message_id)
+
+        if entry is None:
+            return
+
+        self._set(channel_id, self._channels[channel_id], message_id,
+                  entry[0], entry[1] + [row])
+
+    @shared
+    def remove_reaction(self, channel_id: int, message_id: int,
+                        user_id: int, emoji_type: int, column: str,
+                        value):
+        """Remove the reaction rows of a user that have
+        the given emoji type and value on the given column,
+        matching what was deleted from message_reactions."""
+        entry = self._get(channel_id, message_id)
+
+        if entry is None:
+            return
+
+        reactions = [row for row in entry[1]
+                     if not (row['user_id'] == user_id
+                             and row['emoji_type'] == emoji_type
+                             and row[column] == value)]
+
+        self._set(channel_id, self._channels[channel_id], message_id,
+                  entry[0], reactions)
+
+    @shared
+    def clear_reactions(self, channel_id: int, message_id: int):
+        """Remove all reactions of a message."""
+        entry = self._get(channel_id, message_id)
+
+        if entry is None:
+            return
+
+        self._set(channel_id, self._channels[channel_id], message_id,
+                  entry[0], [])
+
+    @shared
+    def remove(self, channel_id: int, message_id: int):
+        """Remove a deleted message from a channel's buffer."""
+        entry = self._get(channel_id, message_id)
+
+        if entry is None:
+            return
+
+        buf = self._channels[channel_id]
+        buf.messages.pop(message_id)
+        self._account(buf, -entry[2])
+
+    @shared
+    def drop(self, channel_id: int):
+        """Remove a channel's buffer entirely."""
+        self._drop(channel_id)
+
+    @shared
+    def invalidate_user(self, user_id: int):
+        """Drop the buffers embedding a user, used when the
+        user or any of their members changes."""
+        for channel_id in list(self._user_channels.get(user_id, ())):
+            self._drop(channel_id)
+
+    def _drop(self, channel_id: int):
+        self._bump(channel_id)
+        buf = self._channels.pop(channel_id, None)
+
+        if buf is not None:
+            self._total_bytes -= buf.size
+            self._unindex(channel_id, buf)
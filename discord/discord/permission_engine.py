@@ -0,0 +1,516 @@
+"""
+discord.permission_engine: in-memory permission calculation.
+
+The engine keeps, for each guild that had its permissions
+calculated, the guild owner, the permissions of every role,
+the roles of every member and the overwrites of every channel.
+
+Permission calculation then doesn't touch the database at all.
+Endpoints that change any of that state must call the
+matching invalidate_* method *after* writing to the database.
+"""
+import itertools
+from collections import defaultdict
+from typing import Dict, Tuple, Optional
+
+from logbook import Logger
+
+from discord import request_cache
+from discord.permissions import Permissions, ALL_PERMISSIONS
+from discord import permission_matrix
+from discord.permission_matrix import PermissionMatrix
+from discord.shared_cache import shared
+
+log = Logger(__name__)
+
+#: bit of the administrator permission
+ADMINISTRATOR = 1 << 3
+
+#: {target_id: (allow, deny)}, target ids
+#  being both role ids and user ids.
+Overwrites = Dict[int, Tuple[int, int]]
+
+
+def _mix(perms: int, overwrite: Optional[Tuple[int, int]]) -> int:
+    if not overwrite:
+        return perms
+
+    allow, deny = overwrite
+    return (perms & ~deny) | allow
+
+
+class GuildPermissions:
+    """Permission state of a single guild.
+
+    Stale parts are tracked with the engine tick they were
+    invalidated at, so that a refresh that raced with another
+    invalidation doesn't clear it.
+    """
+    def __init__(self, guild_id: int, owner_id: int,
+                 roles: Dict[int, int], members: Dict[int, Tuple[int, ...]],
+                 overwrites: Dict[int, Overwrites]):
+        self.guild_id = guild_id
+        self.owner_id = owner_id
+
+        #: {role_id: permissions}
+        self.roles = roles
+
+        #: {user_id: (role_id, ...)}, including @everyone if
+        #  it is on member_roles
+        self.members = members
+
+        #: {channel_id: overwrites}, for all channels in the guild
+        self.overwrites = overwrites
+
+        self.stale_roles = 0
+        self.stale_members = {}
+        self.stale_channels = {}
+
+        #: PermissionMatrix, built on demand for large guilds
+        self.matrix = None
+
+    @property
+    def stale(self) -> bool:
+        """If any part of the state must be refreshed."""
+        return bool(self.stale_roles or self.stale_members
+                    or self.stale_channels)
+
+    def base(self, member_id: int) -> int:
+        """Compute the base permissions of a member.
+
+        Follows :func:`discord.permissions.base_permissions`.
+        """
+        if member_id == self.owner_id:
+            return ALL_PERMISSIONS.binary
+
+        perms = self.roles.get(self.guild_id, 0)
+
+        for role_id in self.members.get(member_id, ()):
+            perms |= self.roles.get(role_id, 0)
+
+        if perms & ADMINISTRATOR:
+            return ALL_PERMISSIONS.binary
+
+        return perms
+
+    def channel(self, base: int, member_id: int, channel_id: int) -> int:
+        """Compute the permissions of a member in a channel,
+        given its base permissions.
+
+        Follows :func:`discord.permissions.compute_overwrites`.
+        """
+        if base & ADMINISTRATOR:
+            return ALL_PERMISSIONS.binary
+
+        overwrites = self.overwrites.get(channel_id, {})
+        perms = _mix(base, overwrites.get(self.guild_id))
+
+        allow, deny = 0, 0
+
+        for role_id in self.members.get(member_id, ()):
+            if role_id == self.guild_id:
+                continue
+
+            overwrite = overwrites.get(role_id)
+            if overwrite:
+                allow |= overwrite[0]
+                deny |= overwrite[1]
+
+        perms = (perms & ~deny) | allow
+        return _mix(perms, overwrites.get(member_id))
+
+    def role(self, role_id: int, channel_id: int) -> int:
+        """Compute the permissions of a role in a channel.
+
+        Follows :func:`discord.permissions.role_permissions`.
+        """
+        perms = self.roles.get(role_id, 0)
+        return _mix(perms, self.overwrites.get(channel_id, {}).get(role_id))
+
+
+class PermissionEngine:
+    """Keep :class:`GuildPermissions` for guilds and
+    calculate permissions out of them.
+
+    Guilds with at least ``matrix_min_members`` members get
+    a :class:`PermissionMatrix` for batch queries, when
+    NumPy is installed.
+    """
+    def __init__(self, storage, matrix_min_members: int = 1000):
+        self.storage = storage
+        self.matrix_min_members = matrix_min_members
+
+        #: {guild_id: GuildPermissions}
+        self._guilds = {}
+
+        #: {channel_id: guild_id}, for guild channels only
+        self._channel_guild = {}
+
+        #: bumped on every invalidation, so that guilds
+        #  loaded concurrently with a change are not stored.
+        self._generation = defaultdict(int)
+        self._tick = itertools.count(1)
+
+        self.loads = 0
+        self.refreshes = 0
+
+        #: set by the app to share changes with other nodes,
+        #  see :mod:`discord.shared_cache`
+        self.publish = None
+
+    @property
+    def db(self):
+        return self.storage.db
+
+    @property
+    def stats(self) -> dict:
+        """Get counters about the engine."""
+        matrices = [guild.matrix for guild in self._guilds.values()
+                    if guild.matrix is not None]
+
+        return {
+            'guilds': len(self._guilds),
+            'members': sum(len(guild.members)
+                           for guild in self._guilds.values()),
+            'loads': self.loads,
+            'refreshes': self.refreshes,
+            'matrices': len(matrices),
+            'matrix_bytes': sum(matrix.nbytes for matrix in matrices),
+        }
+
+    async def _fetch_members(self, guild_id: int,
+                             user_ids=None) -> Dict[int, Tuple[int, ...]]:
+        user_clause = ('AND user_id = ANY($2::bigint[])'
+                       if user_ids is not None else '')
+
+        args = [guild_id]
+        if user_ids is not None:
+            args.append(list(user_ids))
+
+        rows = await self.db.fetch(f"""
+        SELECT user_id, array_agg(role_id) AS roles
+        FROM member_roles
+        WHERE guild_id = $1 {user_clause}
+        GROUP BY user_id
+        """, *args)
+
+        return {row['user_id']: tuple(row['roles']) for row in rows}
+
+    async def _fetch_overwrites(self, guild_id: int,
+                                channel_ids=None) -> Dict[int, Overwrites]:
+        chan_clause = ('AND guild_channels.id = ANY($2::bigint[])'
+                       if channel_ids is not None else '')
+
+        args = [guild_id]
+        if channel_ids is not None:
+            args.append(list(channel_ids))
+
+        rows = await self.db.fetch(f"""
+        SELECT guild_channels.id AS channel_id,
+               channel_overwrites.target_type,
+               channel_overwrites.target_role,
+               channel_overwrites.target_user,
+               channel_overwrites.allow, channel_overwrites.deny
+        FROM guild_channels
+        LEFT JOIN channel_overwrites
+          ON channel_overwrites.channel_id = guild_channels.id
+        WHERE guild_channels.guild_id = $1 {chan_clause}
+        """, *args)
+
+        overwrites = {}
+
+        for row in rows:
+            chan_overwrites = overwrites.setdefault(row['channel_id'], {})
+
+            if row['target_type'] is None:
+                continue
+
+            # if type is 0, the overwrite is for a user
+            # if type is 1, the overwrite is for a role
+            target_id = (row['target_user'] if row['target_type'] == 0
+                         else row['target_role'])
+
+            chan_overwrites[target_id] = (row['allow'], row['deny'])
+
+        return overwrites
+
+    async def _fetch_roles(self, guild_id: int) -> Dict[int, int]:
+        rows = await self.db.fetch("""
+        SELECT id, permissions
+        FROM roles
+        WHERE guild_id = $1
+        """, guild_id)
+
+        return {row['id']: row['permissions'] for row in rows}
+
+    async def _load(self, guild_id: int) -> Optional[GuildPermissions]:
+        # the generation must be acquired before
+        # reading anything from the database
+        generation = self._generation[guild_id]
+
+        owner_id = await self.db.fetchval("""
+        SELECT owner_id
+        FROM guilds
+        WHERE id = $1
+        """, guild_id)
+
+        if owner_id is None:
+            return None
+
+        state = GuildPermissions(
+            guild_id, owner_id,
+            await self._fetch_roles(guild_id),
+            await self._fetch_members(guild_id),
+            await self._fetch_overwrites(guild_id))
+
+        self.loads += 1
+
+        for channel_id in state.overwrites:
+            self._channel_guild[channel_id] = guild_id
+
+        if generation == self._generation[guild_id]:
+            self._guilds[guild_id] = state
+
+        log.debug('loaded permissions gid={} members={} channels={}',
+                  guild_id, len(state.members), len(state.overwrites))
+
+        return state
+
+    async def _refresh(self, state: GuildPermissions):
+        """Reload the stale parts of a guild's state."""
+        guild_id = state.guild_id
+        self.refreshes += 1
+
+        # role changes affect every bitset, so the matrix
+        # gets rebuilt on its next use.
+        if state.stale_roles:
+            tick = state.stale_roles
+            state.roles = await self._fetch_roles(guild_id)
+            state.matrix = None
+
+            if state.stale_roles == tick:
+                state.stale_roles = 0
+
+        if state.stale_members:
+            pending = dict(state.stale_members)
+            members = await self._fetch_members(guild_id, pending)
+
+            for user_id, tick in pending.items():
+                if user_id in members:
+                    state.members[user_id] = members[user_id]
+                else:
+                    state.members.pop(user_id, None)
+
+                if state.matrix is not None:
+                    state.matrix.update_member(state, user_id)
+
+                if state.stale_members.get(user_id) == tick:
+                    state.stale_members.pop(user_id)
+
+        if state.stale_channels:
+            pending = dict(state.stale_channels)
+            overwrites = await self._fetch_overwrites(guild_id, pending)
+
+            for channel_id, tick in pending.items():
+                if channel_id in overwrites:
+                    state.overwrites[channel_id] = overwrites[channel_id]
+                    self._channel_guild[channel_id] = guild_id
+                else:
+                    state.overwrites.pop(channel_id, None)
+                    self._channel_guild.pop(channel_id, None)
+
+                if state.matrix is not None:
+                    state.matrix.update_channel(state, channel_id)
+
+                if state.stale_channels.get(channel_id) == tick:
+                    state.stale_channels.pop(channel_id)
+
+    async def guild(self, guild_id: int) -> Optional[GuildPermissions]:
+        """Get the up-to-date permission state of a guild.
+
+        Returns None if the guild doesn't exist.
+        """
+        state = self._guilds.get(guild_id)
+
+        if state is None:
+            return await self._load(guild_id)
+
+        if state.stale:
+            await self._refresh(state)
+
+        return state
+
+    async def guild_from_channel(self, channel_id: int) -> Optional[int]:
+        """Get the guild ID of a channel, None for non-guild channels."""
+        try:
+            return self._channel_guild[channel_id]
+        except KeyError:
+            pass
+
+        guild_id = await self.storage.guild_from_channel(channel_id)
+
+        if guild_id is not None:
+            self._channel_guild[channel_id] = guild_id
+
+        return guild_id
+
+    async def base_permissions(self, member_id: int,
+                               guild_id: int) -> Permissions:
+        """Get the base permissions of a member in a guild."""
+        state = await self.guild(guild_id)
+
+        if state is None:
+            return Permissions(0)
+
+        return Permissions(state.base(int(member_id)))
+
+    async def get_permissions(self, member_id: int,
+                              channel_id: int) -> Permissions:
+        """Get the permissions of a member in a channel."""
+        guild_id = await self.guild_from_channel(channel_id)
+
+        # for non guild channels
+        if not guild_id:
+            return ALL_PERMISSIONS
+
+        state = await self.guild(guild_id)
+
+        if state is None:
+            return Permissions(0)
+
+        member_id = int(member_id)
+        return Permissions(state.channel(
+            state.base(member_id), member_id, channel_id))
+
+    async def role_permissions(self, guild_id: int, role_id: int,
+                               channel_id: int) -> Permissions:
+        """Get the permissions of a role in a channel."""
+        state = await self.guild(guild_id)
+
+        if state is None:
+            return Permissions(0)
+
+        return Permissions(state.role(role_id, channel_id))
+
+    def _matrix(self, state: GuildPermissions) -> Optional[PermissionMatrix]:
+        """Get the permission matrix of a guild, building it if needed."""
+        if state.matrix is not None:
+            return state.matrix
+
+        if (not permission_matrix.AVAILABLE
+                or len(state.members) < self.matrix_min_members):
+            return None
+
+        state.matrix = PermissionMatrix(state)
+        return state.matrix
+
+    async def member_channel_perms(self, guild_id: int, member_id: int
+                                   ) -> Dict[int, Permissions]:
+        """Get the permissions of a member in all channels of a guild."""
+        state = await self.guild(guild_id)
+
+        if state is None:
+            return {}
+
+        member_id = int(member_id)
+        matrix = self._matrix(state)
+
+        if matrix is not None:
+            return {channel_id: Permissions(perms) for channel_id, perms
+                    in matrix.row(state, member_id).items()}
+
+        base = state.base(member_id)
+        res = {}
+
+        for channel_id in state.overwrites:
+            res[channel_id] = Permissions(
+                state.channel(base, member_id, channel_id))
+
+        return res
+
+    async def channel_member_perms(self, channel_id: int, member_ids
+                                   ) -> Dict[int, Permissions]:
+        """Get the permissions of many members in a channel."""
+        member_ids = [int(member_id) for member_id in member_ids]
+        guild_id = await self.guild_from_channel(channel_id)
+
+        # for non guild channels
+        if not guild_id:
+            return {member_id: ALL_PERMISSIONS for member_id in member_ids}
+
+        state = await self.guild(guild_id)
+
+        if state is None:
+            return {member_id: Permissions(0) for member_id in member_ids}
+
+        matrix = self._matrix(state)
+
+        if matrix is not None and channel_id in matrix.channel_index:
+            column = matrix.column(state, channel_id, member_ids)
+            return {member_id: Permissions(perms)
+                    for member_id, perms in column.items()}
+
+        res = {}
+
+        for member_id in member_ids:
+            base = state.base(member_id)
+            res[member_id] = Permissions(
+                state.channel(base, member_id, channel_id))
+
+        return res
+
+    def _invalidate(self, guild_id: int) -> Optional[GuildPermissions]:
+        # permissions memoized by the current request
+        # are now possibly wrong too.
+        request_cache.clear()
+
+        self._generation[guild_id] += 1
+        return self._guilds.get(guild_id)
+
+    @shared
+    def invalidate(self, guild_id: int):
+        """Drop all state of a guild. Used on owner changes,
+        role deletions and guild deletions."""
+        self._invalidate(guild_id)
+        self._guilds.pop(guild_id, None)
+
+        self._channel_guild = {
+            channel_id: channel_guild_id
+            for channel_id, channel_guild_id in self._channel_guild.items()
+            if channel_guild_id != guild_id}
+
+    @shared
+    def invalidate_roles(self, guild_id: int):
+        """Mark the permissions of a guild's roles as stale."""
+        state = self._invalidate(guild_id)
+
+        if state is not None:
+            state.stale_roles = next(self._tick)
+
+    @shared
+    def invalidate_member(self, guild_id: int, user_id: int):
+        """Mark the roles of a member as stale, used when
+        they join, leave or have their roles changed."""
+        self._stale_member(guild_id, user_id)
+
+    @shared
+    def invalidate_user(self, user_id: int):
+        """Mark a user as stale in all guilds they're in."""
+        for guild_id, state in list(self._guilds.items()):
+            if user_id in state.members:
+                self._stale_member(guild_id, user_id)
+
+    def _stale_member(self, guild_id: int, user_id: int):
+        state = self._invalidate(guild_id)
+
+        if state is not None:
+            state.stale_members[user_id] = next(self._tick)
+
+    @shared
+    def invalidate_channel(self, guild_id: int, channel_id: int):
+        """Mark the overwrites of a channel as stale, used when
+        the channel is created, deleted or has its overwrites changed."""
+        state = self._invalidate(guild_id)
+
+        if state is not None:
+            state.stale_channels[channel_id] = next(self._tick)
@@ -0,0 +1,300 @@
+"""
+discord.permission_matrix: members x channels permission bitsets.
+
+A :class:`PermissionMatrix` holds the channel permissions of
+every member of a guild, for every channel of the guild, as a
+NumPy uint64 array, computed out of a guild's
+:class:`discord.permission_engine.GuildPermissions`.
+
+NumPy is an optional dependency. When it isn't installed,
+:data:`AVAILABLE` is False and the permission engine keeps
+calculating permissions one member and channel at a time.
+"""
+from typing import Dict, List
+
+from logbook import Logger
+
+from discord.permissions import ALL_PERMISSIONS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = Logger(__name__)
+
+#: if numpy is installed
+AVAILABLE = np is not None
+
+#: bit of the administrator permission
+ADMINISTRATOR = 1 << 3
+
+_MASK = (1 << 64) - 1
+
+
+def _u64(val: int):
+    """Convert a python integer (which might be negative,
+    from bit negation) to a numpy uint64."""
+    return np.uint64(val & _MASK)
+
+
+class PermissionMatrix:
+    """Permission bitsets for all members x all channels of a guild.
+
+    The computation follows
+    :meth:`discord.permission_engine.GuildPermissions.channel`,
+    vectorized: role permissions are OR-reduced per member,
+    then each channel's @everyone, role and member overwrites
+    are applied as deny/allow masks.
+    """
+    def __init__(self, state):
+        self.guild_id = state.guild_id
+
+        #: {user_id: row}
+        self.member_index = {}
+
+        #: {channel_id: column}
+        self.channel_index = {}
+
+        #: members that joined after the matrix was built,
+        #  {user_id: row array}
+        self.extra = {}
+
+        self.matrix = None
+
+        # role information used when computing, cached since
+        # roles only change with a full rebuild.
+        self._role_index = {}
+        self._role_perms = None
+
+        # (row, role) pairs for all member roles
+        self._pair_rows = None
+        self._pair_roles = None
+
+        self.build(state)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the permission bitsets."""
+        extra = sum(row.nbytes for row in self.extra.values())
+        return self.matrix.nbytes + extra
+
+    def _pairs(self, state, member_ids: List[int]):
+        rows, roles = [], []
+
+        for row, member_id in enumerate(member_ids):
+            for role_id in state.members.get(member_id, ()):
+                role_idx = self._role_index.get(role_id)
+
+                if role_idx is not None:
+                    rows.append(row)
+                    roles.append(role_idx)
+
+        return (np.array(rows, dtype=np.intp),
+                np.array(roles, dtype=np.intp))
+
+    def _compute(self, state, member_ids: List[int],
+                 channel_ids: List[int], pairs=None):
+        """Compute the permission bitsets of the given members
+        in the given channels, as a members x channels array."""
+        guild_id = state.guild_id
+        pair_rows, pair_roles = pairs or self._pairs(state, member_ids)
+
+        # base permissions: @everyone, then OR of all roles
+        base = np.full(len(member_ids), _u64(state.roles.get(guild_id, 0)),
+                       dtype=np.uint64)
+        np.bitwise_or.at(base, pair_rows, self._role_perms[pair_roles])
+
+        admin = (base & _u64(ADMINISTRATOR)) != 0
+        member_rows = {member_id: row
+                       for row, member_id in enumerate(member_ids)}
+
+        owner_row = member_rows.get(state.owner_id)
+        if owner_row is not None:
+            admin[owner_row] = True
+
+        # @everyone overwrites
+        overwrites = [state.overwrites.get(channel_id, {})
+                      for channel_id in channel_ids]
+
+        everyone = [chan_ovs.get(guild_id, (0, 0))
+                    for chan_ovs in overwrites]
+        allow = np.array([_u64(ov[0]) for ov in everyone], dtype=np.uint64)
+        deny = np.array([_u64(ov[1]) for ov in everyone], dtype=np.uint64)
+
+        perms = (base[:, None] & ~deny[None, :]) | allow[None, :]
+
+        # role overwrites, only for roles that have any
+        ov_roles = sorted({
+            target for chan_ovs in overwrites for target in chan_ovs
+            if target in self._role_index and target != guild_id})
+
+        if ov_roles:
+            ov_index = {self._role_index[role_id]: idx
+                        for idx, role_id in enumerate(ov_roles)}
+
+            role_allow = np.zeros((len(ov_roles), len(channel_ids)),
+                                  dtype=np.uint64)
+            role_deny = np.zeros_like(role_allow)
+
+            for col, chan_ovs in enumerate(overwrites):
+                for idx, role_id in enumerate(ov_roles):
+                    ov_allow, ov_deny = chan_ovs.get(role_id, (0, 0))
+                    role_allow[idx, col] = _u64(ov_allow)
+                    role_deny[idx, col] = _u64(ov_deny)
+
+            # only the pairs for roles with overwrites
+            # (which never includes @everyone)
+            selected = np.isin(pair_roles, list(ov_index.keys()))
+            sel_rows = pair_rows[selected]
+            sel_roles = np.array(
+                [ov_index[role_idx] for role_idx in pair_roles[selected]],
+                dtype=np.intp)
+
+            member_allow = np.zeros_like(perms)
+            member_deny = np.zeros_like(perms)
+            np.bitwise_or.at(member_allow, sel_rows, role_allow[sel_roles])
+            np.bitwise_or.at(member_deny, sel_rows, role_deny[sel_roles])
+
+            perms = (perms & ~member_deny) | member_allow
+
+        # member overwrites, usually few
+        for col, chan_ovs in enumerate(overwrites):
+            for target_id, (ov_allow, ov_deny) in chan_ovs.items():
+                row = member_rows.get(target_id)
+
+                if row is None or target_id in self._role_index:
+                    continue
+
+                perms[row, col] = ((perms[row, col] & _u64(~ov_deny))
+                                   | _u64(ov_allow))
+
+        perms[admin, :] = _u64(ALL_PERMISSIONS.binary)
+        return perms
+
+    def build(self, state):
+        """(Re)build the whole matrix out of a guild's state."""
+        member_ids = list(state.members)
+        channel_ids = list(state.overwrites)
+
+        role_ids = list(state.roles)
+        self._role_index = {role_id: idx
+                            for idx, role_id in enumerate(role_ids)}
+        self._role_perms = np.array(
+            [_u64(state.roles[role_id]) for role_id in role_ids],
+            dtype=np.uint64)
+
+        self.member_index = {member_id: row
+                             for row, member_id in enumerate(member_ids)}
+        self.channel_index = {channel_id: col
+                              for col, channel_id in enumerate(channel_ids)}
+        self.extra = {}
+
+        self._pair_rows, self._pair_roles = self._pairs(state, member_ids)
+        self.matrix = self._compute(
+            state, member_ids, channel_ids,
+            (self._pair_rows, self._pair_roles))
+
+        log.debug('built permission matrix gid={} shape={} bytes={}',
+                  self.guild_id, self.matrix.shape, self.nbytes)
+
+    def update_member(self, state, member_id: int):
+        """Recompute the row of a member whose roles changed."""
+        channel_ids = list(self.channel_index)
+        row = self._compute(state, [member_id], channel_ids)[0]
+
+        # the row is indexed by the columns, which can have
+        # gaps if channels were deleted.
+        full_row = np.zeros(self.matrix.shape[1], dtype=np.uint64)
+        full_row[list(self.channel_index.values())] = row
+
+        try:
+            row_idx = self.member_index[member_id]
+        except KeyError:
+            self.extra[member_id] = full_row
+            return
+
+        self.matrix[row_idx] = full_row
+
+        # keep the cached role pairs in sync
+        new_rows, new_roles = self._pairs(state, [member_id])
+        keep = self._pair_rows != row_idx
+
+        self._pair_rows = np.concatenate(
+            [self._pair_rows[keep], new_rows + row_idx])
+        self._pair_roles = np.concatenate(
+            [self._pair_roles[keep], new_roles])
+
+    def update_channel(self, state, channel_id: int):
+        """Recompute the column of a channel whose overwrites changed,
+        adding or removing the channel if needed."""
+        if channel_id not in state.overwrites:
+            self.channel_index.pop(channel_id, None)
+            return
+
+        member_ids = list(self.member_index)
+        column = self._compute(state, member_ids, [channel_id],
+                               (self._pair_rows, self._pair_roles))
+
+        col_idx = self.channel_index.get(channel_id)
+
+        if col_idx is None:
+            col_idx = self.matrix.shape[1]
+            self.matrix = np.hstack([self.matrix, column])
+            self.channel_index[channel_id] = col_idx
+
+            self.extra = {member_id: np.append(row, 0)
+                          for member_id, row in self.extra.items()}
+        else:
+            self.matrix[:, col_idx] = column[:, 0]
+
+        if self.extra:
+            extra_ids = list(self.extra)
+            extra_col = self._compute(state, extra_ids, [channel_id])
+
+            for idx, member_id in enumerate(extra_ids):
+                self.extra[member_id][col_idx] = extra_col[idx, 0]
+
+    def _row(self, member_id: int):
+        row_idx = self.member_index.get(member_id)
+
+        if row_idx is not None:
+            return self.matrix[row_idx]
+
+        return self.extra.get(member_id)
+
+    def row(self, state, member_id: int) -> Dict[int, int]:
+        """Get the permissions of a member in all channels."""
+        row = self._row(member_id)
+
+        if row is None:
+            # not a member, so not worth keeping around
+            channel_ids = list(self.channel_index)
+            computed = self._compute(state, [member_id], channel_ids)[0]
+            return {channel_id: int(perms) for channel_id, perms
+                    in zip(channel_ids, computed)}
+
+        return {channel_id: int(row[col])
+                for channel_id, col in self.channel_index.items()}
+
+    def column(self, state, channel_id: int,
+               member_ids: List[int]) -> Dict[int, int]:
+        """Get the permissions of many members in a channel."""
+        col_idx = self.channel_index[channel_id]
+        res = {}
+        missing = []
+
+        for member_id in member_ids:
+            row = self._row(member_id)
+
+            if row is None:
+                missing.append(member_id)
+            else:
+                res[member_id] = int(row[col_idx])
+
+        if missing:
+            computed = self._compute(state, missing, [channel_id])
+            res.update({member_id: int(computed[idx, 0])
+                        for idx, member_id in enumerate(missing)})
+
+        return res
@@ -1,7 +1,10 @@
 import ctypes
+from typing import Dict
 
 from quart import current_app as app
 
+from discord import request_cache
+
 # so we don't keep repeating the same
 # type for all the fields
 _i = ctypes.c_uint8
@@ -64,6 +67,11 @@ class Permissions(ctypes.Union):
 
 ALL_PERMISSIONS = Permissions(0b01111111111101111111110111111111)
 
+# database queries usually made when calculating permissions
+# without the permission engine, for the request cache counters.
+_BASE_QUERIES = 4
+_CHANNEL_QUERIES = _BASE_QUERIES + 3
+
 
 async def get_role_perms(guild_id, role_id, storage=None) -> Permissions:
     """Get the raw :class:`Permissions` object for a role."""
@@ -88,11 +96,27 @@ async def base_permissions(member_id, guild_id, storage=None) -> Permissions:
 
     This will give ALL_PERMISSIONS if base permissions
     has the Administrator bit set.
+
+    When the storage has a permission engine, the
+    calculation is done by it, in memory.
+
+    The result is memoized for the rest of the request.
     """
 
     if not storage:
         storage = app.storage
 
+    return await request_cache.memoize(
+        ('base_perms', id(storage), int(member_id), int(guild_id)),
+        lambda: _base_permissions(member_id, guild_id, storage),
+        0 if storage.perm_engine is not None else _BASE_QUERIES)
+
+
+async def _base_permissions(member_id, guild_id, storage) -> Permissions:
+    if storage.perm_engine is not None:
+        return await storage.perm_engine.base_permissions(
+            member_id, guild_id)
+
     owner_id = await storage.db.fetchval("""
     SELECT owner_id
     FROM guilds
@@ -163,6 +187,10 @@ async def role_permissions(guild_id: int, role_id: int,
     if not storage:
         storage = app.storage
 
+    if storage.perm_engine is not None:
+        return await storage.perm_engine.role_permissions(
+            guild_id, role_id, channel_id)
+
     perms = await get_role_perms(guild_id, role_id, storage)
 
     overwrite = await storage.db.fetchrow("""
@@ -227,10 +255,24 @@ async def compute_overwrites(base_perms: Permissions,
 
 
 async def get_permissions(member_id, channel_id, *, storage=None):
-    """Get all the permissions for a user in a channel."""
+    """Get all the permissions for a user in a channel.
+
+    The result is memoized for the rest of the request.
+    """
     if not storage:
         storage = app.storage
 
+    return await request_cache.memoize(
+        ('perms', id(storage), int(member_id), int(channel_id)),
+        lambda: _get_permissions(member_id, channel_id, storage),
+        0 if storage.perm_engine is not None else _CHANNEL_QUERIES)
+
+
+async def _get_permissions(member_id, channel_id, storage):
+    if storage.perm_engine is not None:
+        return await storage.perm_engine.get_permissions(
+            member_id, channel_id)
+
     guild_id = await storage.guild_from_channel(channel_id)
 
     # for non guild channels
@@ -241,3 +283,44 @@ async def get_permissions(member_id, channel_id, *, storage=None):
 
     return await compute_overwrites(base_perms, member_id,
                                     channel_id, guild_id, storage)
+
+
+async def member_channel_perms(member_id, guild_id, *,
+                               storage=None) -> Dict[int, Permissions]:
+    """Get the permissions of a user in all
+    channels of a guild, keyed by channel ID."""
+    if not storage:
+        storage = app.storage
+
+    if storage.perm_engine is not None:
+        return await storage.perm_engine.member_channel_perms(
+            guild_id, member_id)
+
+    channel_ids = await storage.get_channel_ids(guild_id)
+    res = {}
+
+    for channel_id in channel_ids:
+        res[channel_id] = await get_permissions(
+            member_id, channel_id, storage=storage)
+
+    return res
+
+
+async def channel_member_perms(channel_id, member_ids, *,
+                               storage=None) -> Dict[int, Permissions]:
+    """Get the permissions of many users in a channel,
+    keyed by user ID."""
+    if not storage:
+        storage = app.storage
+
+    if storage.perm_engine is not None:
+        return await storage.perm_engine.channel_member_perms(
+            channel_id, member_ids)
+
+    res = {}
+
+    for member_id in member_ids:
+        res[member_id] = await get_permissions(
+            member_id, channel_id, storage=storage)
+
+    return res
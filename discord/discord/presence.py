@@ -66,15 +66,31 @@ class PresenceManager:
         self.dispatcher = dispatcher
 
     async def guild_presences(self, member_ids: List[int],
-                              guild_id: int) -> List[Dict[Any, str]]:
-        """Fetch all presences in a guild."""
-        states = self.state_manager.guild_states(member_ids, guild_id)
+                              guild_id: int,
+                              limit: int = None) -> List[Dict[Any, str]]:
+        """Fetch all presences in a guild.
+
+        When limit is given, only online members
+        are included, up to limit of them.
+        """
+        if limit is None:
+            states = self.state_manager.guild_states(member_ids, guild_id)
+        else:
+            states = self.state_manager.online_states(
+                member_ids, guild_id, limit)
+
+        # fetch all members at once instead of
+        # querying them one by one per state
+        members = await self.storage.get_members_bulk(
+            guild_id, list({state.user_id for state in states}))
 
         presences = []
 
         for state in states:
-            member = await self.storage.get_member_data_one(
-                guild_id, state.user_id)
+            member = members.get(state.user_id)
+
+            if member is None:
+                continue
 
             game = state.presence.get('game', None)
 
@@ -96,11 +112,19 @@ class PresenceManager:
 
     async def dispatch_guild_pres(self, guild_id: int,
                                   user_id: int, new_state: dict):
-        """Dispatch a Presence update to an entire guild."""
+        """Dispatch a Presence update to an entire guild, on all nodes."""
         state = dict(new_state)
-
         member = await self.storage.get_member_data_one(guild_id, user_id)
 
+        # member lists and sessions of other nodes are
+        # only known to them, so they make their own dispatch.
+        self.dispatcher.publish('guild_presence', guild_id, member, state)
+        return await self.dispatch_guild_pres_local(guild_id, member, state)
+
+    async def dispatch_guild_pres_local(self, guild_id: int,
+                                        member: dict, state: dict):
+        """Dispatch a Presence update to the member lists
+        and sessions of this node."""
         game = state['game']
 
         lazy_guild_store = self.dispatcher.backends['lazy_guild']
@@ -202,7 +226,10 @@ class PresenceManager:
         res = []
 
         for friend_id in friend_ids:
-            friend_states = self.state_manager.user_states(friend_id)
+            # restored sessions aren't online until resumed
+            friend_states = [
+                state for state in self.state_manager.user_states(friend_id)
+                if not state.restored]
 
             if not friend_states:
                 # append offline
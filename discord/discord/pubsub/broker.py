@@ -0,0 +1,362 @@
+"""
+discord.pubsub.broker: sharing dispatches between server nodes.
+
+Backends of :class:`discord.dispatcher.EventDispatcher` only know
+about the subscribers of their own node. With a broker, each
+dispatch is published along with its routing key (backend and key),
+and every node fans it out to its own subscribers.
+
+Nodes connect to a :class:`BrokerServer`, which relays frames from
+each node to all the others. It can run as its own process
+('manage.py broker'), nodes then use :class:`TcpBroker`.
+
+Workers of a single host can use :class:`BusClient` instead, over
+a Unix socket. The server then lives inside one of the workers:
+whichever one holds the lock file next to the socket. When it
+goes away, another worker takes the lock and the server over.
+
+Frames written in the same loop iteration are sent in a single
+write, and publishing never waits for the other nodes.
+
+Messages are JSON, with tuples, sets and dicts with non-string keys
+tagged so that they come out of :func:`unpack_message` as they went
+into :func:`pack_message`.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import struct
+from typing import Any, Awaitable, Callable
+
+from logbook import Logger
+
+from discord.utils import DiscordJSONEncoder
+
+log = Logger(__name__)
+
+#: length prefix of frames
+_HEADER = struct.Struct('>I')
+
+#: write buffer size after which relaying waits for a node
+_HIGH_WATER = 4 * 1024 * 1024
+
+
+#: keys of the objects standing for values JSON can't keep
+_TAGS = ('__tuple__', '__set__', '__items__')
+
+
+def _tag(value: Any) -> Any:
+    if isinstance(value, dict):
+        if all(isinstance(key, str) and key not in _TAGS for key in value):
+            return {key: _tag(val) for key, val in value.items()}
+
+        return {'__items__': [[_tag(key), _tag(val)]
+                              for key, val in value.items()]}
+
+    if isinstance(value, list):
+        return [_tag(val) for val in value]
+
+    if isinstance(value, tuple):
+        return {'__tuple__': [_tag(val) for val in value]}
+
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': [_tag(val) for val in value]}
+
+    return value
+
+
+def _untag(obj: dict) -> Any:
+    if len(obj) != 1:
+        return obj
+
+    tag, value = next(iter(obj.items()))
+
+    if tag == '__tuple__':
+        return tuple(value)
+
+    if tag == '__set__':
+        return set(value)
+
+    if tag == '__items__':
+        return {key: val for key, val in value}
+
+    return obj
+
+
+def pack_message(message: Any) -> bytes:
+    """Encode a message to be published."""
+    return json.dumps(_tag(message), separators=(',', ':'),
+                      cls=DiscordJSONEncoder).encode()
+
+
+def unpack_message(data: bytes) -> Any:
+    """Decode a message published by another node."""
+    return json.loads(data, object_hook=_untag)
+
+
+def pack_frame(data: bytes) -> bytes:
+    """Add the length prefix to a frame."""
+    return _HEADER.pack(len(data)) + data
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    """Read a single length-prefixed frame."""
+    header = await reader.readexactly(_HEADER.size)
+    length, = _HEADER.unpack(header)
+    return await reader.readexactly(length)
+
+
+class FrameWriter:
+    """Batch the frames written during a loop
+    iteration into a single write."""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self._pending = []
+        self._scheduled = False
+
+        self.frames = 0
+        self.writes = 0
+
+    def write(self, data: bytes):
+        """Queue a frame to be written."""
+        self._pending.append(pack_frame(data))
+        self.frames += 1
+
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_event_loop().call_soon(self.flush)
+
+    def flush(self):
+        """Write the queued frames right away."""
+        self._scheduled = False
+
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        self.writer.write(b''.join(pending))
+        self.writes += 1
+
+    @property
+    def buffered(self) -> int:
+        return self.writer.transport.get_write_buffer_size()
+
+    async def drain(self):
+        """Wait for the queued frames to be sent."""
+        self.flush()
+        await self.writer.drain()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class BrokerServer:
+    """Relay every frame a node sends to all other nodes."""
+    def __init__(self):
+        self._server = None
+        self._nodes = set()
+
+        self.relayed = 0
+
+    async def start_tcp(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def start_unix(self, path: str):
+        self._server = await asyncio.start_unix_server(
+            self._handle, path=path)
+
+    @property
+    def sockets(self):
+        return self._server.sockets
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        node = FrameWriter(writer)
+        self._nodes.add(node)
+
+        try:
+            while True:
+                data = await read_frame(reader)
+                targets = [target for target in self._nodes
+                           if target is not node]
+
+                for target in targets:
+                    target.write(data)
+
+                self.relayed += 1
+
+                # only wait on nodes that can't keep up
+                slow = [target for target in targets
+                        if target.buffered > _HIGH_WATER]
+
+                if slow:
+                    await asyncio.gather(
+                        *(target.drain() for target in slow),
+                        return_exceptions=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._nodes.discard(node)
+            node.close()
+
+    def close(self):
+        self._server.close()
+
+        for node in self._nodes:
+            node.close()
+
+
+class Broker:
+    """Connection of a node to the other nodes.
+
+    ``handler`` is called with every frame
+    published by the other nodes, in order.
+    Subclasses give :meth:`_connect`.
+    """
+    def __init__(self, handler: Callable[[bytes], Awaitable[None]]):
+        self.handler = handler
+
+        self._writer = None
+        self.connected = asyncio.Event()
+
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def stats(self) -> dict:
+        """Get counters about the broker."""
+        return {
+            'published': self.published,
+            'received': self.received,
+            'dropped': self.dropped,
+            'writes': self._writer.writes if self._writer else 0,
+        }
+
+    async def _connect(self):
+        """Get a (reader, writer) pair to the broker server."""
+        raise NotImplementedError
+
+    async def run(self):
+        """Receive frames from the other nodes, forever."""
+        while True:
+            reader, writer = await self._connect()
+            self._writer = FrameWriter(writer)
+            self.connected.set()
+
+            try:
+                while True:
+                    frame = await read_frame(reader)
+                    self.received += 1
+
+                    try:
+                        await self.handler(frame)
+                    except Exception:
+                        log.exception('error while handling a broker frame')
+            except (asyncio.IncompleteReadError, ConnectionError):
+                log.warning('lost connection to the broker')
+            finally:
+                self.connected.clear()
+                self._writer.close()
+                self._writer = None
+
+    def publish(self, data: bytes):
+        """Send a frame to all the other nodes."""
+        if self._writer is None:
+            self.dropped += 1
+            return
+
+        self._writer.write(data)
+        self.published += 1
+
+    async def drain(self):
+        """Wait for published frames to be sent."""
+        if self._writer is not None:
+            await self._writer.drain()
+
+
+class TcpBroker(Broker):
+    """Connect to a broker server over TCP."""
+    def __init__(self, host: str, port: int, handler):
+        super().__init__(handler)
+        self.host = host
+        self.port = port
+
+    async def _connect(self):
+        delay = 0.1
+
+        while True:
+            try:
+                return await asyncio.open_connection(self.host, self.port)
+            except OSError as err:
+                log.warning('failed to connect to the broker: {!r}', err)
+
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5)
+
+
+class BusClient(Broker):
+    """Connect to the bus between workers of a host,
+    hosting it when no other worker does."""
+    def __init__(self, path: str, handler):
+        super().__init__(handler)
+        self.path = path
+
+        #: set when this worker hosts the bus
+        self.hub = None
+        self._lock_file = None
+
+    @property
+    def stats(self) -> dict:
+        return {**super().stats, **{'hub': self.hub is not None}}
+
+    def _try_lock(self) -> bool:
+        lock_file = open(f'{self.path}.lock', 'w')
+
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        # the lock is held as long as the file is open
+        self._lock_file = lock_file
+        return True
+
+    async def _connect(self):
+        while True:
+            if self.hub is None and self._try_lock():
+                # only the lock holder gets here, so
+                # the socket is from a dead hub.
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+
+                self.hub = BrokerServer()
+                await self.hub.start_unix(self.path)
+                log.info('hosting the worker bus at {}', self.path)
+
+            try:
+                return await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # the hub is starting up or just went away
+                await asyncio.sleep(0.1)
+
+
+def make_broker(config, handler):
+    """Create the broker set in the config, if any."""
+    address = config.get('PUBSUB_BROKER')
+
+    if address:
+        host, _, port = address.rpartition(':')
+        return TcpBroker(host, int(port), handler)
+
+    bus_path = config.get('GATEWAY_BUS')
+
+    if bus_path:
+        return BusClient(bus_path, handler)
+
+    return None
@@ -3,6 +3,7 @@ from typing import Any
 from logbook import Logger
 
 from .dispatcher import DispatcherWithState
+from discord.gateway.encoding import DispatchFrames
 
 log = Logger(__name__)
 
@@ -16,39 +17,35 @@ class ChannelDispatcher(DispatcherWithState):
                        event: str, data: Any):
         """Dispatch an event to a channel."""
         # get everyone who is subscribed
-        # and store the number of states we dispatched the event to
         user_ids = self.state[channel_id]
-        dispatched = 0
-        sessions = []
+        states = []
+
+        guild_id = await self.app.storage.guild_from_channel(channel_id)
 
         # making a copy of user_ids since
         # we'll modify it later on.
         for user_id in set(user_ids):
-            guild_id = await self.app.storage.guild_from_channel(channel_id)
-
             # if we are dispatching to a guild channel,
             # we should only dispatch to the states / shards
-            # that are connected to the guild (via their shard id).
-            
+            # that are connected to the guild (the guild index).
+
             # if we aren't, we just get all states tied to the user.
-            # TODO: make a fetch_states that fetches shards
-            #        - with id 0 (count any) OR
-            #        - single shards (id=0, count=1)
-            states = (self.sm.fetch_states(user_id, guild_id)
-                      if guild_id else
-                      self.sm.user_states(user_id))
+            user_states = (self.sm.guild_user_states(guild_id, user_id)
+                           if guild_id else
+                           self.sm.user_states(user_id))
 
             # unsub people who don't have any states tied to the channel.
-            if not states:
+            if not user_states:
                 await self.unsub(channel_id, user_id)
                 continue
 
-            cur_sess = await self._dispatch_states(states, event, data)
+            states.extend(user_states)
 
-            sessions.extend(cur_sess)
-            dispatched += len(cur_sess)
+        # encode the event only once for everyone
+        frames = DispatchFrames(event, data)
+        sessions = await self._dispatch_frames(states, frames)
 
         log.info('Dispatched chan={} {!r} to {} states',
-                 channel_id, event, dispatched)
+                 channel_id, event, len(sessions))
 
         return sessions
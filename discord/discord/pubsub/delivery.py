@@ -0,0 +1,91 @@
+"""
+discord.pubsub.delivery: sending a dispatch to many sessions.
+
+Delivering to a session only puts the dispatch on the outbound
+queue of its connection (see :mod:`discord.gateway.outbound`),
+which is written by the connection's own task. A slow client
+only fills its own queue, so :class:`Delivery` goes through the
+sessions in order, without waiting on any of them.
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Dict, List
+
+from logbook import Logger
+
+from discord.gateway.encoding import DispatchFrames
+from discord.stats import percentile
+
+log = Logger(__name__)
+
+
+class Delivery:
+    """Deliver dispatches to sessions.
+
+    The time until the first and the last session got each
+    dispatch is kept per event type, in milliseconds.
+    """
+    def __init__(self, samples: int = 1000):
+        #: {event: recent (first, last) delivery times}
+        self._latency = defaultdict(lambda: deque(maxlen=samples))
+
+        #: {event: deliveries that raised}
+        self.failed = defaultdict(int)
+
+        self.delivered = 0
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        """Get fan-out latencies and counters, by event type."""
+        stats = {}
+
+        for event, samples in self._latency.items():
+            firsts = [first for first, _ in samples]
+            lasts = [last for _, last in samples]
+
+            stats[event] = {
+                'dispatches': len(samples),
+                'failed': self.failed[event],
+                'first_p50': percentile(firsts, 50),
+                'last_p50': percentile(lasts, 50),
+                'last_p99': percentile(lasts, 99),
+            }
+
+        return stats
+
+    async def deliver(self, states: list,
+                      frames: DispatchFrames) -> List[str]:
+        """Send a dispatch to a list of states.
+
+        Returns the session IDs that got the dispatch,
+        in the same order as ``states``.
+        """
+        start = time.perf_counter()
+        first = None
+        sessions = []
+
+        for state in states:
+            try:
+                await state.ws.dispatch_frames(frames)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('error while dispatching {!r} to {}',
+                              frames.event, state)
+                self.failed[frames.event] += 1
+                continue
+
+            if first is None:
+                first = time.perf_counter()
+
+            sessions.append(state.session_id)
+
+        self.delivered += len(sessions)
+
+        if first is not None:
+            self._latency[frames.event].append((
+                (first - start) * 1000,
+                (time.perf_counter() - start) * 1000))
+
+        return sessions
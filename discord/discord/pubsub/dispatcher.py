@@ -2,9 +2,12 @@
 discord.pubsub.dispatcher: main dispatcher class
 """
 from collections import defaultdict
+from typing import List
 
 from logbook import Logger
 
+from discord.gateway.encoding import DispatchFrames
+
 log = Logger(__name__)
 
 
@@ -63,18 +66,22 @@ class Dispatcher:
         """
         raise NotImplementedError
 
-    async def _dispatch_states(self, states: list, event: str, data) -> int:
+    async def _dispatch_states(self, states: list,
+                               event: str, data) -> List[str]:
         """Dispatch an event to a list of states."""
-        res = []
+        return await self._dispatch_frames(
+            states, DispatchFrames(event, data))
 
-        for state in states:
-            try:
-                await state.ws.dispatch(event, data)
-                res.append(state.session_id)
-            except:
-                log.exception('error while dispatching')
+    async def _dispatch_frames(self, states: list,
+                               frames: DispatchFrames) -> List[str]:
+        """Dispatch an already wrapped event to a list of states,
+        returning the session IDs that got it, in order.
 
-        return res
+        Backends should gather all the states an event goes to
+        and make a single call, so that the event is only
+        encoded once and its fan-out is timed as a whole.
+        """
+        return await self.main_dispatcher.delivery.deliver(states, frames)
 
 
 class DispatcherWithState(Dispatcher):
@@ -3,7 +3,8 @@ from typing import Any
 from logbook import Logger
 
 from .dispatcher import DispatcherWithState
-from discord.permissions import get_permissions
+from discord.gateway.encoding import DispatchFrames
+from discord.permissions import member_channel_perms
 
 log = Logger(__name__)
 
@@ -16,16 +17,14 @@ class GuildDispatcher(DispatcherWithState):
     async def _chan_action(self, action: str,
                            guild_id: int, user_id: int):
         """Send an action to all channels of the guild."""
-        chan_ids = await self.app.storage.get_channel_ids(guild_id)
+        # permissions for all channels are calculated in one go
+        all_perms = await member_channel_perms(
+            user_id, guild_id, storage=self.main_dispatcher.app.storage)
 
-        for chan_id in chan_ids:
+        for chan_id, chan_perms in all_perms.items():
 
             # only do an action for users that can
             # actually read the channel to start with.
-            chan_perms = await get_permissions(
-                user_id, chan_id,
-                storage=self.main_dispatcher.app.storage)
-
             if not chan_perms.bits.read_messages:
                 log.debug('skipping cid={}, no read messages',
                           chan_id)
@@ -54,46 +53,43 @@ class GuildDispatcher(DispatcherWithState):
     async def sub(self, guild_id: int, user_id: int):
         """Subscribe a user to the guild."""
         await super().sub(guild_id, user_id)
+        self.sm.index_member(user_id, guild_id)
         await self._chan_action('sub', guild_id, user_id)
 
     async def unsub(self, guild_id: int, user_id: int):
         """Unsubscribe a user from the guild."""
         await super().unsub(guild_id, user_id)
+        self.sm.unindex_member(user_id, guild_id)
         await self._chan_action('unsub', guild_id, user_id)
 
+    async def reset(self, guild_id: int):
+        await super().reset(guild_id)
+        self.sm.unindex_guild(guild_id)
+
+    async def remove(self, guild_id: int):
+        await super().remove(guild_id)
+        self.sm.unindex_guild(guild_id)
+
     async def dispatch_filter(self, guild_id: int, func,
                               event: str, data: Any):
         """Selectively dispatch to session ids that have
         func(session_id) true."""
-        user_ids = self.state[guild_id]
-        dispatched = 0
-        sessions = []
-
-        # acquire a copy since we may be modifying
-        # the original user_ids
-        for user_id in set(user_ids):
-
-            # fetch all states / shards that are tied to the guild.
-            states = self.sm.fetch_states(user_id, guild_id)
-
-            if not states:
-                # user is actually disconnected,
-                # so we should just unsub them
-                await self.unsub(guild_id, user_id)
-                continue
+        # users that are actually disconnected
+        # since the last dispatch get unsubbed
+        for user_id in self.sm.pop_stale(guild_id):
+            await self.unsub(guild_id, user_id)
 
-            # filter the ones that matter
-            states = list(filter(
-                lambda state: func(state.session_id), states
-            ))
+        # the index only has the states / shards
+        # that are connected and tied to the guild.
+        states = [state for state in self.sm.guild_sessions(guild_id)
+                  if func(state.session_id)]
 
-            cur_sess = await self._dispatch_states(
-                states, event, data)
-            sessions.extend(cur_sess)
-            dispatched += len(cur_sess)
+        # encode the event only once for everyone
+        frames = DispatchFrames(event, data)
+        sessions = await self._dispatch_frames(states, frames)
 
         log.info('Dispatched {} {!r} to {} states',
-                 guild_id, event, dispatched)
+                 guild_id, event, len(sessions))
 
         return sessions
 
@@ -9,8 +9,10 @@ from typing import Any, List, Dict, Union
 from logbook import Logger
 
 from discord.pubsub.dispatcher import Dispatcher
+from discord.gateway.encoding import DispatchFrames
 from discord.permissions import (
-    Permissions, overwrite_find_mix, get_permissions, role_permissions
+    Permissions, overwrite_find_mix, get_permissions, role_permissions,
+    channel_member_perms
 )
 from discord.utils import index_by_func
 from discord.utils import mmh3
@@ -392,14 +394,21 @@ class GuildMemberList:
 
     async def get_group_for_member(self, member_id: int,
                                    roles: List[Union[str, int]],
-                                   status: str) -> GroupID:
-        """Return a fitting group ID for the member."""
+                                   status: str,
+                                   member_perms: Permissions = None
+                                   ) -> GroupID:
+        """Return a fitting group ID for the member.
+
+        The member's permissions in the channel can be given
+        when they were already calculated in bulk.
+        """
         member_roles = list(map(int, roles))
 
         # get the member's permissions relative to the channel
         # (accounting for channel overwrites)
-        member_perms = await get_permissions(
-            member_id, self.channel_id, storage=self.storage)
+        if member_perms is None:
+            member_perms = await get_permissions(
+                member_id, self.channel_id, storage=self.storage)
 
         if not member_perms.bits.read_messages:
             return None
@@ -413,11 +422,18 @@ class GuildMemberList:
 
     async def _list_fill_groups(self, member_ids: List[int]):
         """Fill in groups with the member ids."""
+        members = await self.storage.get_members_bulk(
+            self.guild_id, member_ids)
+
+        all_perms = await channel_member_perms(
+            self.channel_id, member_ids, storage=self.storage)
+
         for member_id in member_ids:
             presence = self.list.presences[member_id]
 
             group_id = await self.get_group_for_member(
-                member_id, presence['roles'], presence['status']
+                member_id, presence['roles'], presence['status'],
+                all_perms[member_id]
             )
 
             # skip members that don't have any group assigned.
@@ -425,11 +441,7 @@ class GuildMemberList:
             if group_id is None:
                 continue
 
-            member = await self.storage.get_member_data_one(
-                self.guild_id, member_id
-            )
-
-            self.list.members[member_id] = member
+            self.list.members[member_id] = members.get(member_id)
             self.list.data[group_id].append(member_id)
 
     async def get_member_nicks_dict(self) -> dict:
@@ -589,15 +601,8 @@ class GuildMemberList:
         states = map(self.get_state, session_ids)
         states = filter(lambda state: state is not None, states)
 
-        dispatched = []
-
-        for state in states:
-            await state.ws.dispatch(
-                'GUILD_MEMBER_LIST_UPDATE', payload)
-
-            dispatched.append(state.session_id)
-
-        return dispatched
+        frames = DispatchFrames('GUILD_MEMBER_LIST_UPDATE', payload)
+        return await self.main._dispatch_frames(list(states), frames)
 
     async def resync(self, session_ids: int, item_index: int) -> List[str]:
         """Send a SYNC event to all states that are subscribed to an item.
@@ -1396,6 +1401,9 @@ class LazyGuildDispatcher(Dispatcher):
         gml = await self.get_gml(chan_id)
         gml.unsub(session_id)
 
+    async def remove(self, chan_id):
+        self.remove_channel(chan_id)
+
     async def dispatch(self, guild_id, event: str, *args, **kwargs):
         """Call a function specialized in handling the given event"""
         try:
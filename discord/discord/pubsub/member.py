@@ -18,9 +18,11 @@ class MemberDispatcher(Dispatcher):
         states = self.sm.fetch_states(user_id, guild_id)
 
         # if no states were found, we should
-        # unsub the user from the GUILD channel
+        # unsub the user from the GUILD channel,
+        # only on this node.
         if not states:
-            await self.main_dispatcher.unsub('guild', guild_id, user_id)
+            await self.main_dispatcher.action(
+                'guild', 'unsub', guild_id, user_id)
             return
 
         return await self._dispatch_states(states, event, data)
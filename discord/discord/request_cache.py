@@ -0,0 +1,119 @@
+"""
+discord.request_cache: memoization scoped to a single request.
+
+While handling one HTTP request (or one gateway op), the same
+channel type, guild ID, membership and permission lookups
+happen many times over. A :class:`RequestCache` is bound to the
+current context with :func:`start` and keeps those values until
+the request is done.
+
+Since values are only kept for the duration of the request,
+there is no cross-request staleness. Changes made by the request
+itself are accounted for by :func:`clear`, which the permission
+engine calls on every invalidation.
+"""
+import contextvars
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from logbook import Logger
+
+log = Logger(__name__)
+
+_current = contextvars.ContextVar('request_cache', default=None)
+
+
+class RequestCache:
+    """Memoized values of a single request."""
+    def __init__(self):
+        self.values = {}
+
+        #: lookups answered out of the cache
+        self.hits = 0
+
+        #: lookups that were calculated
+        self.misses = 0
+
+        #: estimate of database queries not made
+        #  because of cache hits
+        self.queries_saved = 0
+
+        #: set when the request finishes. tasks spawned by the
+        #  request inherit its context, but must not keep
+        #  using its values after it is done.
+        self.done = False
+
+    async def get(self, key: Hashable, func: Callable[[], Awaitable[Any]],
+                  queries: int = 1) -> Any:
+        """Get a value, calling ``func`` when it isn't cached.
+
+        ``queries`` is how many database queries ``func`` usually
+        makes, used for the queries saved counter.
+        """
+        try:
+            value, cost = self.values[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self.queries_saved += cost
+            return value
+
+        self.misses += 1
+        value = await func()
+        self.values[key] = (value, queries)
+        return value
+
+
+def start() -> RequestCache:
+    """Bind a new cache to the current context."""
+    cache = RequestCache()
+    _current.set(cache)
+    return cache
+
+
+def current() -> Optional[RequestCache]:
+    """Get the cache bound to the current context, if any."""
+    return _current.get()
+
+
+def finish(name: str) -> Optional[RequestCache]:
+    """Unbind the current context's cache, logging its counters."""
+    cache = _current.get()
+
+    if cache is None:
+        return None
+
+    _current.set(None)
+    cache.done = True
+    cache.values.clear()
+
+    if cache.hits:
+        log.debug('{}: {} cached lookups, {} queries saved',
+                  name, cache.hits, cache.queries_saved)
+
+    return cache
+
+
+def clear():
+    """Drop all values of the current context's cache.
+
+    Called when a request changes any state that was memoized.
+    """
+    cache = _current.get()
+
+    if cache is not None:
+        cache.values.clear()
+
+
+async def memoize(key: Hashable, func: Callable[[], Awaitable[Any]],
+                  queries: int = 1) -> Any:
+    """Memoize a lookup in the current context's cache.
+
+    Outside of a request, ``func`` is always called.
+    """
+    cache = _current.get()
+
+    if cache is None or cache.done:
+        return await func()
+
+    return await cache.get(key, func, queries)
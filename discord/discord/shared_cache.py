@@ -0,0 +1,46 @@
+"""
+discord.shared_cache: keeping in-process caches the same on all nodes.
+
+Caches are written through by the REST code of the node that
+made a change. When running as many nodes or workers, the
+other nodes must apply the same change to their own caches,
+so the methods that change a cache are marked :func:`shared`.
+They are published on the broker as they are called, and
+:class:`discord.dispatcher.EventDispatcher` applies them
+to the same cache of the other nodes.
+"""
+import functools
+from typing import Any, Callable, Optional, Tuple
+
+#: called with (method name, arguments) by shared methods
+Publisher = Callable[[str, Tuple[Any, ...]], None]
+
+
+def shared(method):
+    """Mark a cache method as one that changes the cache,
+    and must run on the other nodes as well.
+
+    The method is published through the ``publish`` attribute
+    of the cache, when set. The other nodes call the
+    unwrapped method, in ``.local``.
+    """
+    @functools.wraps(method)
+    def _shared(self, *args):
+        if self.publish is not None:
+            self.publish(method.__name__, args)
+
+        return method(self, *args)
+
+    _shared.local = method
+    return _shared
+
+
+def apply_shared(cache, method: str, args: Tuple[Any, ...]) -> Any:
+    """Apply a shared method published by another node."""
+    local: Optional[Callable] = getattr(
+        getattr(type(cache), method), 'local', None)
+
+    if local is None:
+        raise ValueError(f'{method!r} is not shared')
+
+    return local(cache, *args)
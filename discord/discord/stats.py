@@ -0,0 +1,74 @@
+"""
+discord.stats: periodic report of the internal counters.
+
+The identify admission queue, dispatch delivery, outbound queues,
+resume buffers and in-process caches all keep counters. Every
+STATS_LOG_INTERVAL seconds, they are gathered by :func:`collect`
+and logged on a single line.
+"""
+import asyncio
+import json
+from typing import List
+
+from logbook import Logger
+
+log = Logger(__name__)
+
+#: in-process caches of the app that have stats
+CACHES = ('guild_cache', 'channel_cache', 'message_buffer', 'perm_engine')
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Get the given percentile out of a list of samples,
+    0 if there are none."""
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    return ordered[int(round((pct / 100) * (len(ordered) - 1)))]
+
+
+def _sum(per_session: dict, field: str) -> int:
+    return sum(stats[field] for stats in per_session.values())
+
+
+def collect(app) -> dict:
+    """Gather the counters of the app.
+
+    Per-session counters are summed up, along
+    with the deepest outbound queue.
+    """
+    queues = app.state_manager.queue_stats()
+    resumes = app.state_manager.resume_stats()
+
+    stats = {
+        'admission': app.admission.stats,
+        'delivery': app.dispatcher.delivery.stats,
+        'outbound': {
+            'connections': len(queues),
+            'depth': _sum(queues, 'depth'),
+            'deepest': max((queue['depth'] for queue in queues.values()),
+                           default=0),
+            'coalesced': _sum(queues, 'coalesced'),
+        },
+        'resume': {
+            'sessions': len(resumes),
+            'events': _sum(resumes, 'events'),
+            'bytes': _sum(resumes, 'bytes'),
+        },
+    }
+
+    for name in CACHES:
+        stats[name] = getattr(app, name).stats
+
+    if app.broker is not None:
+        stats['broker'] = app.broker.stats
+
+    return stats
+
+
+async def stats_job(app, interval: float):
+    """Log the counters of the app every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        log.info('stats: {}', json.dumps(collect(app)))
@@ -1,8 +1,11 @@
-from typing import List, Dict, Any
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
 
 from logbook import Logger
 
 from discord.enums import ChannelType
+from discord.channel_cache import ChannelMeta
+from discord.guild_cache import GuildSnapshot, PARTS
 from discord.schemas import USER_MENTION, ROLE_MENTION
 from discord.blueprints.channel.reactions import (
     EmojiType, emoji_sql, partial_emoji
@@ -43,12 +46,103 @@ def _filter_recipients(recipients: List[Dict[str, Any]], user_id: int):
         recipients))
 
 
+def _user_from_row(row) -> Dict[str, Any]:
+    """Make a (non-secure) user object out of a row
+    containing the user fields."""
+    return {
+        'id': row['id'],
+        'username': row['username'],
+        'discriminator': row['discriminator'],
+        'avatar': row['avatar'],
+        'flags': row['flags'],
+        'bot': row['bot'],
+        'premium': row['premium_since'] is not None,
+    }
+
+
+def _mention_ids(regex, content: str) -> List[int]:
+    """Extract the IDs matched by a mention regex, in order."""
+    res = []
+
+    for match in regex.finditer(content):
+        try:
+            res.append(int(match.group(1)))
+        except ValueError:
+            continue
+
+    return res
+
+
+def _reactions_from_rows(reactions, user_id=None) -> List[Dict[str, Any]]:
+    """Make the reaction list of a message
+    out of its reaction rows, ordered by react_ts."""
+    # ordered list of emoji
+    emoji = []
+
+    # the current state of emoji info
+    react_stats = {}
+
+    # to generate the list, we pass through all
+    # all reactions and insert them all.
+
+    # we can't use a set() because that
+    # doesn't guarantee any order.
+    for row in reactions:
+        etype = EmojiType(row['emoji_type'])
+        eid, etext = row['emoji_id'], row['emoji_text']
+
+        # get the main key to use, given
+        # the emoji information
+        _, main_emoji = emoji_sql(etype, eid, etext)
+
+        if main_emoji in emoji:
+            continue
+
+        # maintain order (first reacted comes first
+        # on the reaction list)
+        emoji.append(main_emoji)
+
+        react_stats[main_emoji] = {
+            'count': 0,
+            'me': False,
+            'emoji': partial_emoji(etype, eid, etext)
+        }
+
+    # then the 2nd pass, where we insert
+    # the info for each reaction in the react_stats
+    # dictionary
+    for row in reactions:
+        etype = EmojiType(row['emoji_type'])
+        eid, etext = row['emoji_id'], row['emoji_text']
+
+        # same thing as the last loop,
+        # extracting main key
+        _, main_emoji = emoji_sql(etype, eid, etext)
+
+        stats = react_stats[main_emoji]
+        stats['count'] += 1
+
+        if row['user_id'] == user_id:
+            stats['me'] = True
+
+    # after processing reaction counts,
+    # we get them in the same order
+    # they were defined in the first loop.
+    return list(map(react_stats.get, emoji))
+
+
 class Storage:
     """Class for common SQL statements."""
     def __init__(self, db):
         self.db = db
         self.presence = None
 
+        #: set by the app, caching is disabled when None
+        self.guild_cache = None
+        self.channel_cache = None
+        self.message_buffer = None
+        self.perm_engine = None
+
     async def fetchrow_with_json(self, query: str, *args):
         """Fetch a single row with JSON/JSONB support."""
         # the pool by itself doesn't have
@@ -138,13 +232,6 @@ class Storage:
 
         return drow
 
-    async def _member_basic(self, guild_id: int, member_id: int):
-        return await self.db.fetchrow("""
-        SELECT user_id, nickname, joined_at, deafened, muted
-        FROM members
-        WHERE guild_id = $1 and user_id = $2
-        """, guild_id, member_id)
-
     async def get_member_role_ids(self, guild_id: int,
                                   member_id: int) -> List[int]:
         """Get a list of role IDs that are on a member."""
@@ -169,61 +256,99 @@ class Storage:
 
         return list(map(str, roles))
 
-    async def _member_dict(self, row, guild_id, member_id) -> Dict[str, Any]:
-        roles = await self.get_member_role_ids(guild_id, member_id)
-        return {
-            'user': await self.get_user(member_id),
-            'nick': row['nickname'],
-
-            # we don't send the @everyone role's id to
-            # the user since it is known that everyone has
-            # that role.
-            'roles': roles,
-            'joined_at': timestamp_(row['joined_at']),
-            'deaf': row['deafened'],
-            'mute': row['muted'],
-        }
+    async def get_members_bulk(self, guild_id: int,
+                               user_ids: List[int] = None
+                               ) -> Dict[int, Dict[str, Any]]:
+        """Get member objects for a set of members in a guild.
 
-    async def get_member_data_one(self, guild_id: int,
-                                  member_id: int) -> Dict[str, Any]:
-        """Get data about one member in a guild."""
-        basic = await self._member_basic(guild_id, member_id)
+        Users, nicknames, joined_at and role IDs are fetched
+        in a single query, regardless of the amount of members
+        being requested. When user_ids is None, all members
+        of the guild are fetched.
 
-        if not basic:
-            return
+        Returns a dictionary mapping user IDs to member objects.
+        """
+        user_clause = ('AND members.user_id = ANY($2::bigint[])'
+                       if user_ids is not None else '')
+
+        args = [guild_id]
+        if user_ids is not None:
+            args.append([int(uid) for uid in user_ids])
+
+        rows = await self.db.fetch(f"""
+        SELECT members.user_id, members.nickname, members.joined_at,
+               members.deafened, members.muted,
+               users.id::text, users.username, users.discriminator,
+               users.avatar, users.flags, users.bot, users.premium_since,
+               ARRAY(
+                 SELECT member_roles.role_id
+                 FROM member_roles
+                 WHERE member_roles.guild_id = members.guild_id
+                   AND member_roles.user_id = members.user_id
+               ) AS roles
+        FROM members
+        JOIN users
+          ON users.id = members.user_id
+        WHERE members.guild_id = $1 {user_clause}
+        """, *args)
 
-        return await self._member_dict(basic, guild_id, member_id)
+        members = {}
 
-    async def get_member_multi(self, guild_id: int,
-                               user_ids: List[int]) -> List[Dict[str, Any]]:
-        """Get member information about multiple users in a guild."""
-        members = []
+        # members that don't have the @everyone role
+        # on member_roles, see get_member_role_ids
+        missing_everyone = []
 
-        for user_id in user_ids:
-            member = await self.get_member_data_one(guild_id, user_id)
+        for row in rows:
+            role_ids = row['roles']
 
-            if not member:
-                continue
+            if guild_id not in role_ids:
+                missing_everyone.append(row['user_id'])
 
-            members.append(member)
+            members[row['user_id']] = {
+                'user': _user_from_row(row),
+                'nick': row['nickname'],
+
+                # we don't send the @everyone role's id to
+                # the user since it is known that everyone has
+                # that role.
+                'roles': [str(role_id) for role_id in role_ids
+                          if role_id != guild_id],
+                'joined_at': timestamp_(row['joined_at']),
+                'deaf': row['deafened'],
+                'mute': row['muted'],
+            }
+
+        if missing_everyone:
+            await self.db.executemany("""
+            INSERT INTO member_roles (user_id, guild_id, role_id)
+            VALUES ($1, $2, $3)
+            """, [(member_id, guild_id, guild_id)
+                  for member_id in missing_everyone])
 
         return members
 
-    async def get_member_data(self, guild_id: int) -> List[Dict[str, Any]]:
-        """Get member information on a guild."""
-        members_basic = await self.db.fetch("""
-        SELECT user_id, nickname, joined_at, deafened, muted
-        FROM members
-        WHERE guild_id = $1
-        """, guild_id)
+    async def get_member_data_one(self, guild_id: int,
+                                  member_id: int) -> Dict[str, Any]:
+        """Get data about one member in a guild."""
+        members = await self.get_members_bulk(guild_id, [member_id])
+        return members.get(int(member_id))
 
-        members = []
+    async def get_member_multi(self, guild_id: int,
+                               user_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get member information about multiple users in a guild.
 
-        for row in members_basic:
-            member = await self._member_dict(row, guild_id, row['user_id'])
-            members.append(member)
+        The resulting list follows the order of user_ids,
+        skipping users that aren't members of the guild.
+        """
+        members = await self.get_members_bulk(guild_id, user_ids)
 
-        return members
+        return [members[int(user_id)] for user_id in user_ids
+                if int(user_id) in members]
+
+    async def get_member_data(self, guild_id: int) -> List[Dict[str, Any]]:
+        """Get member information on a guild."""
+        members = await self.get_members_bulk(guild_id)
+        return list(members.values())
 
     async def query_members(self, guild_id: int, query: str, limit: int):
         """Find members with usernames matching the given query."""
@@ -243,9 +368,9 @@ class Storage:
     async def chan_last_message(self, channel_id: int):
         """Get the last message ID in a channel."""
         return await self.db.fetchval("""
-        SELECT MAX(id)
-        FROM messages
-        WHERE channel_id = $1
+        SELECT last_message_id
+        FROM channels
+        WHERE id = $1
         """, channel_id)
 
     async def chan_last_message_str(self, channel_id: int) -> str:
@@ -257,100 +382,232 @@ class Storage:
         last_msg = await self.chan_last_message(channel_id)
         return str_(last_msg)
 
-    async def _channels_extra(self, row) -> Dict:
-        """Fill in more information about a channel."""
-        channel_type = row['type']
+    async def chan_last_messages(self,
+                                 channel_ids: List[int]) -> Dict[int, str]:
+        """Get the last message IDs of many channels, in strings.
 
-        chan_type = ChannelType(channel_type)
-
-        if chan_type == ChannelType.GUILD_TEXT:
-            ext_row = await self.db.fetchrow("""
-            SELECT topic, rate_limit_per_user
-            FROM guild_text_channels
-            WHERE id = $1
-            """, row['id'])
-
-            drow = dict(ext_row)
+        Channels without messages are not in the resulting dict.
+        """
+        if not channel_ids:
+            return {}
 
-            last_msg = await self.chan_last_message_str(row['id'])
+        rows = await self.db.fetch("""
+        SELECT id, last_message_id
+        FROM channels
+        WHERE id = ANY($1::bigint[])
+          AND last_message_id IS NOT NULL
+        """, channel_ids)
 
-            drow['last_message_id'] = last_msg
+        return {row['id']: str(row['last_message_id']) for row in rows}
 
-            return {**row, **drow}
+    async def chan_bump_last_message(self, conn, channel_id: int,
+                                     message_id: int):
+        """Set the last message ID of a channel after a message
+        was created in it.
 
-        if chan_type == ChannelType.GUILD_VOICE:
-            vrow = await self.db.fetchrow("""
-            SELECT bitrate, user_limit
-            FROM guild_voice_channels
-            WHERE id = $1
-            """, row['id'])
+        ``conn`` is the connection (or pool) that
+        inserted the message.
+        """
+        await conn.execute("""
+        UPDATE channels
+        SET last_message_id = $2
+        WHERE id = $1
+          AND (last_message_id IS NULL OR last_message_id < $2)
+        """, channel_id, message_id)
 
-            return {**row, **dict(vrow)}
+    async def chan_reset_last_message(self, channel_id: int,
+                                      message_id: int):
+        """Recalculate the last message ID of a channel after
+        a message was deleted from it.
 
-        log.warning('unknown channel type: {}', chan_type)
+        Only deleting the last message of the
+        channel needs to look at the messages table.
+        """
+        await self.db.execute("""
+        UPDATE channels
+        SET last_message_id = (
+            SELECT MAX(id)
+            FROM messages
+            WHERE channel_id = $1
+        )
+        WHERE id = $1 AND last_message_id = $2
+        """, channel_id, message_id)
 
     async def get_chan_type(self, channel_id: int) -> int:
         """Get the channel type integer, given channel ID."""
-        return await self.db.fetchval("""
-        SELECT channel_type
+        meta = await self.channel_meta(channel_id)
+        return meta.type if meta else None
+
+    async def channel_meta(self, channel_id: int) -> Optional[ChannelMeta]:
+        """Get the type, guild and category of a channel,
+        using the channel cache when possible.
+
+        On a cache miss for a guild channel, all
+        channels of its guild are loaded in the same query.
+        """
+        cache = self.channel_cache
+
+        if cache is None:
+            row = await self.db.fetchrow("""
+            SELECT channels.id, channels.channel_type,
+                   guild_channels.guild_id, guild_channels.parent_id
+            FROM channels
+            LEFT JOIN guild_channels
+              ON guild_channels.id = channels.id
+            WHERE channels.id = $1
+            """, channel_id)
+
+            return ChannelMeta(*row) if row else None
+
+        meta = cache.get(channel_id)
+
+        if meta is not None:
+            return meta
+
+        # must be acquired before reading from the database
+        generation = cache.generation
+
+        rows = await self.db.fetch("""
+        SELECT channels.id, channels.channel_type,
+               guild_channels.guild_id, guild_channels.parent_id
         FROM channels
+        LEFT JOIN guild_channels
+          ON guild_channels.id = channels.id
         WHERE channels.id = $1
+           OR guild_channels.guild_id = (
+             SELECT guild_id
+             FROM guild_channels
+             WHERE id = $1
+           )
         """, channel_id)
 
-    async def chan_overwrites(self, channel_id: int) -> List[Dict[str, Any]]:
+        metas = [ChannelMeta(*row) for row in rows]
+        cache.put_many(metas, generation)
+
+        return next((meta for meta in metas
+                     if meta.channel_id == channel_id), None)
+
+    async def chan_overwrites_bulk(
+            self, channel_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Get the permission overwrites of many channels,
+        keyed by channel ID."""
         overwrite_rows = await self.db.fetch("""
-        SELECT target_type, target_role, target_user, allow, deny
+        SELECT channel_id, target_type, target_role, target_user, allow, deny
         FROM channel_overwrites
-        WHERE channel_id = $1
-        """, channel_id)
-
-        def _overwrite_convert(row):
-            drow = dict(row)
+        WHERE channel_id = ANY($1::bigint[])
+        """, channel_ids)
 
-            target_type = drow['target_type']
-            drow['type'] = 'user' if target_type == 0 else 'role'
+        overwrites = {channel_id: [] for channel_id in channel_ids}
 
+        for row in overwrite_rows:
             # if type is 0, the overwrite is for a user
             # if type is 1, the overwrite is for a role
-            drow['id'] = {
-                0: drow['target_user'],
-                1: drow['target_role'],
+            target_type = row['target_type']
+            target = {
+                0: row['target_user'],
+                1: row['target_role'],
             }[target_type]
 
-            drow['id'] = str(drow['id'])
+            overwrites[row['channel_id']].append({
+                'type': 'user' if target_type == 0 else 'role',
+                'id': str(target),
+                'allow': row['allow'],
+                'deny': row['deny'],
+            })
 
-            drow.pop('target_type')
-            drow.pop('target_user')
-            drow.pop('target_role')
+        return overwrites
 
-            return drow
+    async def chan_overwrites(self, channel_id: int) -> List[Dict[str, Any]]:
+        """Get the permission overwrites of a single channel."""
+        overwrites = await self.chan_overwrites_bulk([channel_id])
+        return overwrites[channel_id]
+
+    async def get_channels_bulk(self, guild_id: int = None,
+                                channel_ids: List[int] = None) -> List[Dict]:
+        """Get fully formed guild channel objects, either for all
+        channels in a guild, or for a list of channel IDs.
+
+        This takes two queries, no matter the amount of channels:
+        the channel rows (with text and voice information
+        and last message IDs), and the overwrites.
+
+        Channel IDs that aren't guild channels are ignored.
+        """
+        if guild_id is not None:
+            where, arg = 'guild_channels.guild_id = $1', guild_id
+        else:
+            where, arg = 'guild_channels.id = ANY($1::bigint[])', channel_ids
+
+        rows = await self.db.fetch(f"""
+        SELECT guild_channels.id, guild_channels.guild_id::text,
+               guild_channels.parent_id::text, guild_channels.name,
+               guild_channels.position, guild_channels.nsfw,
+               channels.channel_type, channels.last_message_id,
+               guild_text_channels.topic,
+               guild_text_channels.rate_limit_per_user,
+               guild_voice_channels.bitrate,
+               guild_voice_channels.user_limit
+        FROM guild_channels
+        JOIN channels
+          ON channels.id = guild_channels.id
+        LEFT JOIN guild_text_channels
+          ON guild_text_channels.id = guild_channels.id
+        LEFT JOIN guild_voice_channels
+          ON guild_voice_channels.id = guild_channels.id
+        WHERE {where}
+        """, arg)
+
+        if not rows:
+            return []
+
+        ids = [row['id'] for row in rows]
+        overwrites = await self.chan_overwrites_bulk(ids)
+
+        channels = []
+
+        for row in rows:
+            chan_type = ChannelType(row['channel_type'])
+
+            channel = {
+                'id': str(row['id']),
+                'guild_id': row['guild_id'],
+                'parent_id': row['parent_id'],
+                'name': row['name'],
+                'position': row['position'],
+                'nsfw': row['nsfw'],
+                'type': chan_type.value,
+            }
+
+            if chan_type == ChannelType.GUILD_TEXT:
+                channel['topic'] = row['topic']
+                channel['rate_limit_per_user'] = row['rate_limit_per_user']
+                channel['last_message_id'] = str_(row['last_message_id'])
+            elif chan_type == ChannelType.GUILD_VOICE:
+                channel['bitrate'] = row['bitrate']
+                channel['user_limit'] = row['user_limit']
+            elif chan_type != ChannelType.GUILD_CATEGORY:
+                log.warning('unknown channel type: {}', chan_type)
+
+            channel['permission_overwrites'] = overwrites[row['id']]
+            channels.append(channel)
 
-        return list(map(_overwrite_convert, overwrite_rows))
+        return channels
 
     async def get_channel(self, channel_id: int) -> Dict[str, Any]:
         """Fetch a single channel's information."""
-        chan_type = await self.get_chan_type(channel_id)
-        ctype = ChannelType(chan_type)
+        guild_chans = await self.get_channels_bulk(channel_ids=[channel_id])
 
-        if ctype in (ChannelType.GUILD_TEXT,
-                     ChannelType.GUILD_VOICE,
-                     ChannelType.GUILD_CATEGORY):
-            base = await self.db.fetchrow("""
-            SELECT id, guild_id::text, parent_id, name, position, nsfw
-            FROM guild_channels
-            WHERE guild_channels.id = $1
-            """, channel_id)
+        if guild_chans:
+            return guild_chans[0]
 
-            dbase = dict(base)
-            dbase['type'] = chan_type
+        chan_type = await self.get_chan_type(channel_id)
 
-            res = await self._channels_extra(dbase)
-            res['permission_overwrites'] = await self.chan_overwrites(
-                channel_id)
+        if chan_type is None:
+            return None
 
-            res['id'] = str(res['id'])
-            return res
-        elif ctype == ChannelType.DM:
+        ctype = ChannelType(chan_type)
+
+        if ctype == ChannelType.DM:
             dm_row = await self.db.fetchrow("""
             SELECT id, party1_id, party2_id
             FROM dm_channels
@@ -392,33 +649,7 @@ class Storage:
 
     async def get_channel_data(self, guild_id) -> List[Dict]:
         """Get channel list information on a guild"""
-        channel_basics = await self.db.fetch("""
-        SELECT id, guild_id::text, parent_id::text, name, position, nsfw
-        FROM guild_channels
-        WHERE guild_id = $1
-        """, guild_id)
-
-        channels = []
-
-        for row in channel_basics:
-            ctype = await self.db.fetchval("""
-            SELECT channel_type FROM channels
-            WHERE id = $1
-            """, row['id'])
-
-            drow = dict(row)
-            drow['type'] = ctype
-
-            res = await self._channels_extra(drow)
-
-            res['permission_overwrites'] = await self.chan_overwrites(
-                row['id'])
-
-            # Making sure.
-            res['id'] = str(res['id'])
-            channels.append(res)
-
-        return channels
+        return await self.get_channels_bulk(guild_id)
 
     async def get_role(self, role_id: int,
                        guild_id: int = None) -> Dict[str, Any]:
@@ -455,59 +686,158 @@ class Storage:
 
         return list(map(dict, roledata))
 
-    async def get_guild_extra(self, guild_id: int,
-                              user_id=None, large=None) -> Dict:
-        """Get extra information about a guild."""
-        res = {}
+    async def _load_guild_part(self, guild_id: int, part: str):
+        """Load a single part of a guild snapshot."""
+        if part == 'guild':
+            return await self.get_guild(guild_id)
 
-        member_count = await self.db.fetchval("""
-        SELECT COUNT(*)
-        FROM members
-        WHERE guild_id = $1
-        """, guild_id)
+        if part == 'roles':
+            return tuple(await self.get_role_data(guild_id))
 
-        if large:
-            res['large'] = member_count > large
+        if part == 'channels':
+            return tuple(await self.get_channel_data(guild_id))
 
-        if user_id:
-            joined_at = await self.db.fetchval("""
-            SELECT joined_at
+        if part == 'emojis':
+            return tuple(await self.get_guild_emojis(guild_id))
+
+        if part == 'member_count':
+            return await self.db.fetchval("""
+            SELECT COUNT(*)
             FROM members
-            WHERE guild_id = $1 AND user_id = $2
-            """, guild_id, user_id)
+            WHERE guild_id = $1
+            """, guild_id)
+
+        raise ValueError(f'unknown snapshot part {part!r}')
 
-            res['joined_at'] = timestamp_(joined_at)
+    async def guild_snapshot(self, guild_id: int) -> GuildSnapshot:
+        """Get the shared information about a guild,
+        using the guild cache when possible.
 
-        members = await self.get_member_data(guild_id)
-        channels = await self.get_channel_data(guild_id)
-        roles = await self.get_role_data(guild_id)
+        The snapshot's guild field is None when
+        the guild doesn't exist.
+        """
+        cache = self.guild_cache
 
-        mids = [int(m['user']['id']) for m in members]
+        if cache is None:
+            parts = {part: await self._load_guild_part(guild_id, part)
+                     for part in PARTS}
+            return GuildSnapshot(guild_id, 0, **parts)
 
-        return {**res, **{
-            'member_count': member_count,
-            'members': members,
-            'channels': channels,
-            'roles': roles,
+        # the generation must be acquired before
+        # reading anything from the database
+        generation = cache.generation(guild_id)
+        snapshot = cache.get(guild_id)
+
+        if snapshot is not None and not snapshot.missing:
+            return snapshot
+
+        if snapshot is None:
+            snapshot = GuildSnapshot(guild_id, 0)
+
+        parts = {part: getattr(snapshot, part) for part in PARTS}
+
+        for part in snapshot.missing:
+            parts[part] = await self._load_guild_part(guild_id, part)
 
-            'presences': await self.presence.guild_presences(
-                mids, guild_id
-            ),
+        if parts['guild'] is None:
+            return GuildSnapshot(guild_id, 0, **parts)
 
-            'emojis': await self.get_guild_emojis(guild_id),
+        return cache.put(guild_id, generation, **parts)
+
+    async def _overlay_last_messages(self, channels) -> List[Dict]:
+        """Give fresh last_message_id fields to text channels
+        coming from a guild snapshot."""
+        text_ids = [int(chan['id']) for chan in channels
+                    if chan['type'] == ChannelType.GUILD_TEXT.value]
+
+        if not text_ids:
+            return list(channels)
+
+        last_ids = await self.chan_last_messages(text_ids)
+
+        return [
+            {**chan, **{'last_message_id': last_ids.get(int(chan['id']))}}
+            if chan['type'] == ChannelType.GUILD_TEXT.value else chan
+            for chan in channels
+        ]
+
+    async def _guild_members(self, snapshot: GuildSnapshot,
+                             user_id=None, large=None):
+        """Get the members and presences that go in a guild payload.
+
+        Large guilds only have the member of the user the payload
+        is for and up to large online presences, clients get the
+        rest through Request Guild Members or lazy guilds.
+        """
+        guild_id = snapshot.guild_id
+
+        if not large or snapshot.member_count <= large:
+            members = await self.get_members_bulk(guild_id)
+            presences = await self.presence.guild_presences(
+                list(members.keys()), guild_id)
+
+            return members, presences
+
+        members = await self.get_members_bulk(
+            guild_id, [user_id] if user_id else [])
+
+        presences = await self.presence.guild_presences(
+            await self.get_member_ids(guild_id), guild_id, large)
+
+        return members, presences
+
+    async def _guild_extra(self, snapshot: GuildSnapshot,
+                           user_id=None, large=None) -> Dict:
+        res = {}
+
+        if large:
+            res['large'] = snapshot.member_count > large
+
+        members, presences = await self._guild_members(
+            snapshot, user_id, large)
+
+        if user_id:
+            member = members.get(int(user_id))
+            res['joined_at'] = member['joined_at'] if member else None
+
+        return {**res, **{
+            'member_count': snapshot.member_count,
+            'members': list(members.values()),
+            'channels': await self._overlay_last_messages(
+                snapshot.channels),
+            'roles': list(snapshot.roles),
+            'presences': presences,
+
+            'emojis': list(snapshot.emojis),
 
             # TODO: voice state management
             'voice_states': [],
         }}
 
+    async def get_guild_extra(self, guild_id: int,
+                              user_id=None, large=None) -> Dict:
+        """Get extra information about a guild."""
+        snapshot = await self.guild_snapshot(guild_id)
+        return await self._guild_extra(snapshot, user_id, large)
+
     async def get_guild_full(self, guild_id: int,
                              user_id: int, large_count: int = 250) -> Dict:
         """Get full information on a guild.
 
-        This is a very expensive operation.
+        This is a very expensive operation. The shared
+        parts of the guild come from the guild cache.
         """
-        guild = await self.get_guild(guild_id, user_id)
-        extra = await self.get_guild_extra(guild_id, user_id, large_count)
+        snapshot = await self.guild_snapshot(guild_id)
+
+        if snapshot.guild is None:
+            return None
+
+        guild = dict(snapshot.guild)
+
+        if user_id:
+            guild['owner'] = guild['owner_id'] == str(user_id)
+
+        extra = await self._guild_extra(snapshot, user_id, large_count)
 
         return {**guild, **extra}
 
@@ -531,174 +861,289 @@ class Storage:
 
         return [r[0] for r in rows]
 
-    async def _msg_regex(self, regex, func, content) -> List[Dict]:
-        res = []
-
-        for match in regex.finditer(content):
-            found_id = match.group(1)
+    async def get_users_bulk(self,
+                             user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Get (non-secure) user objects for many users in a single query.
 
-            try:
-                found_id = int(found_id)
-            except ValueError:
-                continue
-
-            obj = await func(found_id)
-            if obj is not None:
-                res.append(obj)
+        Returns a dictionary mapping user IDs to user objects.
+        Unknown users are not in the resulting dict.
+        """
+        rows = await self.db.fetch("""
+        SELECT id::text, username, discriminator, avatar,
+               flags, bot, premium_since
+        FROM users
+        WHERE id = ANY($1::bigint[])
+        """, [int(uid) for uid in set(user_ids)])
 
-        return res
+        return {int(row['id']): _user_from_row(row) for row in rows}
 
-    async def get_reactions(self, message_id: int, user_id=None) -> List:
-        """Get all reactions in a message."""
-        reactions = await self.db.fetch("""
-        SELECT user_id, emoji_type, emoji_id, emoji_text
+    async def get_reaction_rows_bulk(self, message_ids: List[int]
+                                     ) -> Dict[int, List]:
+        """Get the reaction rows of many messages, keyed by message ID,
+        ordered by reaction time."""
+        rows = await self.db.fetch("""
+        SELECT message_id, user_id, emoji_type, emoji_id, emoji_text
         FROM message_reactions
-        WHERE message_id = $1
+        WHERE message_id = ANY($1::bigint[])
         ORDER BY react_ts
-        """, message_id)
+        """, message_ids)
 
-        # ordered list of emoji
-        emoji = []
+        by_message = {message_id: [] for message_id in message_ids}
 
-        # the current state of emoji info
-        react_stats = {}
+        for row in rows:
+            by_message[row['message_id']].append(row)
 
-        # to generate the list, we pass through all
-        # all reactions and insert them all.
+        return by_message
 
-        # we can't use a set() because that
-        # doesn't guarantee any order.
-        for row in reactions:
-            etype = EmojiType(row['emoji_type'])
-            eid, etext = row['emoji_id'], row['emoji_text']
+    async def get_reactions_bulk(self, message_ids: List[int],
+                                 user_id=None) -> Dict[int, List]:
+        """Get all reactions for many messages, keyed by message ID."""
+        by_message = await self.get_reaction_rows_bulk(message_ids)
 
-            # get the main key to use, given
-            # the emoji information
-            _, main_emoji = emoji_sql(etype, eid, etext)
+        return {message_id: _reactions_from_rows(reactions, user_id)
+                for message_id, reactions in by_message.items()}
 
-            if main_emoji in emoji:
-                continue
+    async def get_reactions(self, message_id: int, user_id=None) -> List:
+        """Get all reactions in a message."""
+        reactions = await self.get_reactions_bulk([message_id], user_id)
+        return reactions[message_id]
 
-            # maintain order (first reacted comes first
-            # on the reaction list)
-            emoji.append(main_emoji)
+    async def _mentionable_roles(self, role_ids: List[int]) -> Dict[int, int]:
+        """Get the guild IDs of the mentionable roles out of a list."""
+        if not role_ids:
+            return {}
 
-            react_stats[main_emoji] = {
-                'count': 0,
-                'me': False,
-                'emoji': partial_emoji(etype, eid, etext)
-            }
+        rows = await self.db.fetch("""
+        SELECT id, guild_id
+        FROM roles
+        WHERE id = ANY($1::bigint[]) AND mentionable = true
+        """, list(set(role_ids)))
 
-        # then the 2nd pass, where we insert
-        # the info for each reaction in the react_stats
-        # dictionary
-        for row in reactions:
-            etype = EmojiType(row['emoji_type'])
-            eid, etext = row['emoji_id'], row['emoji_text']
+        return {row['id']: row['guild_id'] for row in rows}
 
-            # same thing as the last loop,
-            # extracting main key
-            _, main_emoji = emoji_sql(etype, eid, etext)
+    async def _pinned_set(self, message_ids: List[int]) -> set:
+        """Get which messages out of a list are pinned."""
+        rows = await self.db.fetch("""
+        SELECT channel_pins.message_id
+        FROM channel_pins
+        JOIN messages
+          ON messages.id = channel_pins.message_id
+         AND messages.channel_id = channel_pins.channel_id
+        WHERE channel_pins.message_id = ANY($1::bigint[])
+        """, message_ids)
 
-            stats = react_stats[main_emoji]
-            stats['count'] += 1
+        return {row['message_id'] for row in rows}
 
-            if row['user_id'] == user_id:
-                stats['me'] = True
+    async def get_messages_bulk(self, message_ids: List[int],
+                                user_id=None) -> List[Dict]:
+        """Get the payloads of many messages.
 
-        # after processing reaction counts,
-        # we get them in the same order
-        # they were defined in the first loop.
-        return list(map(react_stats.get, emoji))
+        Authors, mentions (with their member objects on guild
+        channels), role mentions, reactions and pins are
+        resolved for all messages at once, so the amount of queries
+        does not depend on the amount of messages.
 
-    async def get_message(self, message_id: int, user_id=None) -> Dict:
-        """Get a single message's payload."""
-        row = await self.fetchrow_with_json("""
-        SELECT id::text, channel_id::text, author_id, content,
+        Messages are returned in the same order as the given IDs.
+        Unknown messages are skipped.
+        """
+        message_ids = [int(message_id) for message_id in message_ids]
+
+        if not message_ids:
+            return []
+
+        rows = await self.fetch_with_json("""
+        SELECT messages.id, messages.channel_id, author_id, content,
             created_at AS timestamp, edited_at AS edited_timestamp,
-            tts, mention_everyone, nonce, message_type, embeds
+            tts, mention_everyone, nonce, message_type, embeds,
+            guild_channels.guild_id AS chan_guild_id
         FROM messages
-        WHERE id = $1
-        """, message_id)
+        LEFT JOIN guild_channels
+          ON guild_channels.id = messages.channel_id
+        WHERE messages.id = ANY($1::bigint[])
+        """, message_ids)
 
-        if not row:
-            return
+        rows = {row['id']: row for row in rows}
+        found = [message_id for message_id in message_ids
+                 if message_id in rows]
 
-        res = dict(row)
-        res['nonce'] = str(res['nonce'])
-        res['timestamp'] = timestamp_(res['timestamp'])
-        res['edited_timestamp'] = timestamp_(res['edited_timestamp'])
+        # mention extraction happens before any other query
+        # so that all users and roles can be fetched together.
+        mentions = {message_id: _mention_ids(USER_MENTION,
+                                             rows[message_id]['content'])
+                    for message_id in found}
 
-        res['type'] = res['message_type']
-        res.pop('message_type')
+        role_mentions = {message_id: _mention_ids(ROLE_MENTION,
+                                                  rows[message_id]['content'])
+                         for message_id in found}
 
-        channel_id = int(row['channel_id'])
-        content = row['content']
-        guild_id = await self.guild_from_channel(channel_id)
+        user_ids = {rows[message_id]['author_id'] for message_id in found}
+        for mention_ids in mentions.values():
+            user_ids.update(mention_ids)
 
-        # calculate user mentions and role mentions by regex
-        async def _get_member(user_id):
-            user = await self.get_user(user_id)
-            member = None
+        users = await self.get_users_bulk(list(user_ids))
+
+        # mentioned users on guild channels get their member objects
+        guild_mentions = defaultdict(set)
+        for message_id in found:
+            guild_id = rows[message_id]['chan_guild_id']
 
             if guild_id:
-                # TODO: maybe make this partial?
-                member = await self.get_member_data_one(guild_id, user_id)
+                guild_mentions[guild_id].update(mentions[message_id])
 
-            return {**user, **{'member': member}} if member else user
+        # {guild_id: {user_id: member}}
+        members = {}
+        for guild_id, mention_ids in guild_mentions.items():
+            members[guild_id] = (
+                await self.get_members_bulk(guild_id, list(mention_ids))
+                if mention_ids else {})
 
-        res['mentions'] = await self._msg_regex(USER_MENTION, _get_member,
-                                                row['content'])
+        roles = await self._mentionable_roles([
+            role_id for role_ids in role_mentions.values()
+            for role_id in role_ids])
 
-        # _dummy just returns the string of the id, since we don't
-        # actually use the role objects in mention_roles, just their ids.
-        async def _get_role_mention(role_id: int):
-            if not guild_id:
-                return str(role_id)
+        reactions = await self.get_reactions_bulk(found, user_id)
+        pinned = await self._pinned_set(found)
 
-            if role_id == guild_id:
-                return str(role_id)
+        res = []
 
-            role = await self.get_role(role_id, guild_id)
-            if not role:
-                return
+        for message_id in found:
+            row = rows[message_id]
+            guild_id = row['chan_guild_id']
+
+            message = {
+                'id': str(message_id),
+                'channel_id': str(row['channel_id']),
+                'content': row['content'],
+                'timestamp': timestamp_(row['timestamp']),
+                'edited_timestamp': timestamp_(row['edited_timestamp']),
+                'tts': row['tts'],
+                'mention_everyone': row['mention_everyone'],
+                'nonce': str(row['nonce']),
+                'type': row['message_type'],
+                'embeds': row['embeds'],
+            }
 
-            if not role['mentionable']:
-                return
+            guild_members = members.get(guild_id, {})
+            message['mentions'] = []
 
-            return str(role_id)
+            for mention_id in mentions[message_id]:
+                user = users.get(mention_id)
 
-        res['mention_roles'] = await self._msg_regex(
-            ROLE_MENTION, _get_role_mention, content)
+                if user is None:
+                    continue
 
-        res['reactions'] = await self.get_reactions(message_id, user_id)
+                # TODO: maybe make this partial?
+                member = guild_members.get(mention_id)
+                message['mentions'].append(
+                    {**user, **{'member': member}} if member else user)
+
+            # we don't actually use the role objects in
+            # mention_roles, just their ids.
+            message['mention_roles'] = [
+                str(role_id) for role_id in role_mentions[message_id]
+                if not guild_id
+                or role_id == guild_id
+                or roles.get(role_id) == guild_id
+            ]
 
-        # TODO: handle webhook authors
-        res['author'] = await self.get_user(res['author_id'])
-        res.pop('author_id')
+            message['reactions'] = reactions[message_id]
 
-        # TODO: res['attachments']
-        res['attachments'] = []
+            # TODO: handle webhook authors
+            message['author'] = users.get(row['author_id'])
 
-        # TODO: res['member'] for partial member data
-        #  of the author
+            # TODO: res['attachments']
+            message['attachments'] = []
 
-        pin_id = await self.db.fetchval("""
-        SELECT message_id
-        FROM channel_pins
-        WHERE channel_id = $1 AND message_id = $2
-        """, channel_id, message_id)
+            # TODO: res['member'] for partial member data
+            #  of the author
 
-        res['pinned'] = pin_id is not None
+            message['pinned'] = message_id in pinned
 
-        # this is specifically for lazy guilds:
-        # only insert when the channel
-        # is actually from a guild.
-        if guild_id:
-            res['guild_id'] = str(guild_id)
+            # this is specifically for lazy guilds:
+            # only insert when the channel
+            # is actually from a guild.
+            if guild_id:
+                message['guild_id'] = str(guild_id)
+
+            res.append(message)
 
         return res
 
+    async def _fetch_channel_messages(self, channel_id: int, user_id: int,
+                                      limit: int, before, after) -> List:
+        """Fetch a page of messages from the database.
+
+        Pages of the newest messages also fill the channel's
+        message buffer, up to its depth.
+        """
+        buffer = self.message_buffer
+        seeding = buffer is not None and not before and not after
+        fetch_limit = max(limit, buffer.depth) if seeding else limit
+
+        # the generation must be acquired before
+        # reading anything from the database
+        generation = buffer.generation(channel_id) if seeding else None
+
+        where_clause = ''
+
+        if before:
+            where_clause += f'AND id < {before}'
+
+        if after:
+            where_clause += f'AND id > {after}'
+
+        try:
+            rows = await self.db.fetch(f"""
+            SELECT id
+            FROM messages
+            WHERE channel_id = $1 {where_clause}
+            ORDER BY id DESC
+            LIMIT {fetch_limit}
+            """, channel_id)
+
+            message_ids = [row['id'] for row in rows]
+            messages = await self.get_messages_bulk(message_ids, user_id)
+            reactions = (await self.get_reaction_rows_bulk(message_ids)
+                         if seeding else None)
+        except BaseException:
+            if seeding:
+                buffer.abort_seed(channel_id)
+            raise
+
+        if seeding:
+            buffer.seed(channel_id, generation, messages, reactions,
+                        len(message_ids) < fetch_limit)
+
+        return messages[:limit]
+
+    async def get_channel_messages(self, channel_id: int, user_id: int,
+                                   limit: int, before=None,
+                                   after=None) -> List[Dict]:
+        """Get a page of a channel's message history, newest first,
+        using the message buffer when possible."""
+        buffered = None
+
+        if self.message_buffer is not None:
+            buffered = self.message_buffer.query(
+                channel_id, limit, before, after)
+
+        if buffered is None:
+            return await self._fetch_channel_messages(
+                channel_id, user_id, limit, before, after)
+
+        return [{**payload, **{
+            'reactions': _reactions_from_rows(reactions, user_id)
+        }} for payload, reactions in buffered]
+
+    async def get_message(self, message_id: int, user_id=None) -> Dict:
+        """Get a single message's payload."""
+        messages = await self.get_messages_bulk([message_id], user_id)
+
+        if not messages:
+            return
+
+        return messages[0]
+
     async def get_invite(self, invite_code: str) -> dict:
         """Fetch invite information given its code."""
         invite = await self.db.fetchrow("""
@@ -787,11 +1232,8 @@ class Storage:
 
     async def guild_from_channel(self, channel_id: int):
         """Get the guild id coming from a channel id."""
-        return await self.db.fetchval("""
-        SELECT guild_id
-        FROM guild_channels
-        WHERE id = $1
-        """, channel_id)
+        meta = await self.channel_meta(channel_id)
+        return meta.guild_id if meta else None
 
     async def get_dm_peer(self, channel_id: int, user_id: int) -> int:
         """Get the peer id on a dm"""
@@ -19,6 +19,8 @@ async def _handle_pin_msg(app, channel_id, pinned_id, author_id):
         MessageType.CHANNEL_PINNED_MESSAGE.value
     )
 
+    await app.storage.chan_bump_last_message(app.db, channel_id, new_id)
+
     return new_id
 
 
@@ -32,6 +34,7 @@ async def send_sys_message(app, channel_id: int, m_type: MessageType,
     message_id = await handler(app, channel_id, *args, **kwargs)
 
     message = await app.storage.get_message(message_id)
+    app.message_buffer.append(channel_id, message)
 
     await app.dispatcher.dispatch(
         'channel', channel_id, 'MESSAGE_CREATE', message
@@ -0,0 +1,1078 @@
+"""
+Benchmarks for the hot paths of the server.
+
+Those run against the database configured in config.py,
+so make sure to point them to a database with realistic data.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import List
+
+import earl
+
+from discord.storage import Storage
+from discord.channel_cache import ChannelCache
+from discord.guild_cache import GuildSnapshot
+from discord.presence import PresenceManager
+from discord.permissions import get_permissions
+from discord.permission_engine import PermissionEngine, GuildPermissions
+from discord.permission_matrix import PermissionMatrix
+from discord import permission_matrix
+from discord.gateway.encoding import (
+    DispatchFrames, encode_json, encode_etf, decode_json, decode_etf
+)
+from discord.gateway.opcodes import OP
+from discord.gateway import compression
+from discord.gateway.heartbeat import HeartbeatSupervisor
+from discord.gateway.state import GatewayState
+from discord.gateway.state_manager import StateManager
+from discord.pubsub.broker import BrokerServer, BusClient, TcpBroker
+from discord.pubsub.channel import ChannelDispatcher
+from discord.pubsub.delivery import Delivery
+from discord.stats import percentile
+
+
+class QueryCounter:
+    """Wrap an asyncpg pool, counting how many
+    queries were made through it."""
+    COUNTED = ('fetch', 'fetchrow', 'fetchval', 'execute', 'executemany')
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.count = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.pool, name)
+
+        if name not in self.COUNTED:
+            return attr
+
+        async def _counted(*args, **kwargs):
+            self.count += 1
+            return await attr(*args, **kwargs)
+
+        return _counted
+
+
+async def measure(func, runs: int) -> dict:
+    """Run a coroutine function a number of times,
+    returning latency information in milliseconds."""
+    samples = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'p50': percentile(samples, 50),
+        'p99': percentile(samples, 99),
+    }
+
+
+def report(name: str, **fields):
+    """Print a single line of benchmark results."""
+    formatted = ' '.join(
+        f'{key}={val:.3f}' if isinstance(val, float) else f'{key}={val}'
+        for key, val in fields.items())
+
+    print(f'{name:<24} {formatted}')
+
+
+async def _members_legacy(storage, guild_id: int, user_ids: List[int]):
+    """Member loading as it was done before get_members_bulk:
+    two queries per member."""
+    members = []
+
+    for user_id in user_ids:
+        members.append({
+            'user': await storage.get_user(user_id),
+            'roles': await storage.get_member_role_ids(guild_id, user_id),
+        })
+
+    return members
+
+
+async def bench_members(app, args):
+    """Compare per-member loading with get_members_bulk
+    for increasing slices of a guild's member list."""
+    counter = QueryCounter(app.db)
+    storage = Storage(counter)
+
+    member_ids = await storage.get_member_ids(args.guild_id)
+    print(f'guild {args.guild_id} has {len(member_ids)} members')
+
+    for size in args.sizes:
+        user_ids = member_ids[:size]
+
+        for name, func in (
+                ('legacy', lambda: _members_legacy(
+                    storage, args.guild_id, user_ids)),
+                ('bulk', lambda: storage.get_member_multi(
+                    args.guild_id, user_ids))):
+            counter.count = 0
+            await func()
+            queries = counter.count
+
+            lat = await measure(func, args.runs)
+            report(f'{name} n={len(user_ids)}', queries=queries, **lat)
+
+
+async def bench_channels(app, args):
+    """Measure the channel list builder for a guild."""
+    counter = QueryCounter(app.db)
+    storage = Storage(counter)
+
+    channels = await storage.get_channel_data(args.guild_id)
+    queries = counter.count
+
+    lat = await measure(
+        lambda: storage.get_channel_data(args.guild_id), args.runs)
+    report(f'channels n={len(channels)}', queries=queries, **lat)
+
+
+async def bench_messages(app, args):
+    """Compare hydrating a page of messages one by one
+    with get_messages_bulk."""
+    counter = QueryCounter(app.db)
+    storage = Storage(counter)
+
+    rows = await app.db.fetch(f"""
+    SELECT id
+    FROM messages
+    WHERE channel_id = $1
+    ORDER BY id DESC
+    LIMIT {args.limit}
+    """, args.channel_id)
+
+    message_ids = [r['id'] for r in rows]
+
+    async def _single():
+        for message_id in message_ids:
+            await storage.get_message(message_id)
+
+    for name, func in (
+            ('single', _single),
+            ('bulk', lambda: storage.get_messages_bulk(message_ids))):
+        counter.count = 0
+        await func()
+        queries = counter.count
+
+        lat = await measure(func, args.runs)
+        report(f'{name} n={len(message_ids)}', queries=queries, **lat)
+
+
+async def bench_permissions(app, args):
+    """Compare channel permission calculation through the
+    database with the in-memory permission engine."""
+    counter = QueryCounter(app.db)
+
+    legacy = Storage(counter)
+
+    storage = Storage(counter)
+    storage.perm_engine = PermissionEngine(storage)
+
+    member_ids = await legacy.get_member_ids(args.guild_id)
+    channel_ids = await legacy.get_channel_ids(args.guild_id)
+
+    pairs = [(member_id, channel_id)
+             for member_id in member_ids
+             for channel_id in channel_ids][:args.pairs]
+
+    print(f'guild {args.guild_id}: {len(member_ids)} members, '
+          f'{len(channel_ids)} channels, {len(pairs)} pairs')
+
+    # load the guild into the engine before measuring
+    await storage.perm_engine.guild(args.guild_id)
+
+    for name, bench_storage in (('legacy', legacy), ('engine', storage)):
+        async def _all_pairs():
+            for member_id, channel_id in pairs:
+                await get_permissions(
+                    member_id, channel_id, storage=bench_storage)
+
+        counter.count = 0
+        await _all_pairs()
+        queries = counter.count
+
+        lat = await measure(_all_pairs, args.runs)
+        per_pair = {f'{key}_per_pair_us': val * 1000 / max(len(pairs), 1)
+                    for key, val in lat.items()}
+
+        report(f'{name} n={len(pairs)}', queries=queries, **lat, **per_pair)
+
+
+def _synthetic_guild(members: int, channels: int,
+                     roles: int) -> GuildPermissions:
+    guild_id = 1
+    role_ids = [guild_id] + list(range(2, roles + 2))
+    channel_ids = range(1_000_000, 1_000_000 + channels)
+
+    role_perms = {role_id: random.getrandbits(30) & ~(1 << 3)
+                  for role_id in role_ids}
+
+    member_roles = {
+        member_id: (guild_id,) + tuple(random.sample(
+            role_ids[1:], min(3, roles)))
+        for member_id in range(10_000_000, 10_000_000 + members)}
+
+    overwrites = {}
+    for channel_id in channel_ids:
+        targets = random.sample(role_ids, min(4, len(role_ids)))
+        overwrites[channel_id] = {
+            target: (random.getrandbits(30), random.getrandbits(30))
+            for target in targets}
+
+    return GuildPermissions(guild_id, 10_000_000, role_perms,
+                            member_roles, overwrites)
+
+
+async def bench_matrix(app, args):
+    """Measure building and updating the members x channels
+    permission matrix over a synthetic guild."""
+    if not permission_matrix.AVAILABLE:
+        print('numpy is not installed')
+        return
+
+    state = _synthetic_guild(args.members, args.channels, args.roles)
+    member_ids = list(state.members)
+    channel_ids = list(state.overwrites)
+
+    print(f'synthetic guild: {args.members} members, '
+          f'{args.channels} channels, {args.roles} roles')
+
+    matrix = PermissionMatrix(state)
+    report('memory', bytes=matrix.nbytes)
+
+    async def _build():
+        PermissionMatrix(state)
+
+    async def _update_member():
+        matrix.update_member(state, random.choice(member_ids))
+
+    async def _update_channel():
+        matrix.update_channel(state, random.choice(channel_ids))
+
+    async def _row():
+        matrix.row(state, random.choice(member_ids))
+
+    async def _python_row():
+        member_id = random.choice(member_ids)
+        base = state.base(member_id)
+        for channel_id in channel_ids:
+            state.channel(base, member_id, channel_id)
+
+    report('build', **await measure(_build, args.runs))
+    report('update_member', **await measure(_update_member, args.runs))
+    report('update_channel', **await measure(_update_channel, args.runs))
+    report('row', **await measure(_row, args.runs))
+    report('python row', **await measure(_python_row, args.runs))
+
+
+def _synthetic_message() -> dict:
+    author = {
+        'id': '162819866682851329',
+        'username': 'someone',
+        'discriminator': '1234',
+        'avatar': None,
+    }
+
+    return {
+        'id': '522548226441969664',
+        'channel_id': '522546927323418625',
+        'guild_id': '522546927323418624',
+        'author': author,
+        'member': {'roles': ['522546927323418630'], 'nick': None,
+                   'joined_at': '2018-12-12T00:00:00+00:00',
+                   'deaf': False, 'mute': False},
+        'content': 'hello world ' * 10,
+        'timestamp': '2018-12-12T00:00:00+00:00',
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'nonce': '522548225628274688',
+        'embeds': [],
+        'attachments': [],
+        'mentions': [author],
+        'mention_roles': [],
+        'reactions': [],
+        'pinned': False,
+        'type': 0,
+    }
+
+
+async def bench_dispatch(app, args):
+    """Compare encoding a dispatch once per recipient
+    with encoding it once per event."""
+    data = _synthetic_message()
+    encoders = {'json': encode_json, 'etf': encode_etf}
+
+    for encoding in args.encodings:
+        encoder = encoders[encoding]
+
+        for recipients in args.recipients:
+            async def _per_recipient():
+                for seq in range(recipients):
+                    encoded = encoder({
+                        'op': OP.DISPATCH,
+                        't': 'MESSAGE_CREATE',
+                        's': seq,
+                        'd': data,
+                    })
+
+                    if not isinstance(encoded, bytes):
+                        encoded.encode()
+
+            async def _once():
+                frames = DispatchFrames('MESSAGE_CREATE', data)
+
+                for seq in range(recipients):
+                    frames.frame(encoding, seq)
+
+            for name, func in (('per-recipient', _per_recipient),
+                               ('encode-once', _once)):
+                lat = await measure(func, args.runs)
+                per_recipient = lat['p50'] * 1000 / recipients
+
+                report(f'{encoding} {name} n={recipients}',
+                       **lat, p50_per_recipient_us=per_recipient)
+
+
+class _EncodingWebsocket:
+    """Stands in for a gateway connection,
+    only encoding the dispatches it gets."""
+    def __init__(self):
+        self.seq = 0
+
+    async def dispatch_frames(self, frames: DispatchFrames):
+        self.seq += 1
+        frames.frame('json', self.seq)
+
+
+async def bench_channel_dispatch(app, args):
+    """Measure dispatch latency to a channel against its
+    subscriber count, with and without the channel cache."""
+    counter = QueryCounter(app.db)
+    guild_id = await Storage(app.db).guild_from_channel(args.channel_id)
+
+    data = {'channel_id': str(args.channel_id), 'user_id': '1',
+            'timestamp': 1544572800}
+
+    for subscribers in args.subscribers:
+        state_manager = StateManager()
+        main = SimpleNamespace(state_manager=state_manager,
+                               app=SimpleNamespace(storage=None),
+                               delivery=Delivery())
+        dispatcher = ChannelDispatcher(main)
+
+        for user_id in range(1, subscribers + 1):
+            state = GatewayState(user_id=user_id, current_shard=0,
+                                 shard_count=1)
+            state.ws = _EncodingWebsocket()
+            state_manager.insert(state)
+
+            if guild_id:
+                state_manager.index_member(user_id, guild_id)
+
+            dispatcher.state[args.channel_id].add(user_id)
+
+        for name, cache in (('uncached', None), ('cached', ChannelCache())):
+            storage = Storage(counter)
+            storage.channel_cache = cache
+            main.app.storage = storage
+
+            async def _dispatch():
+                await dispatcher.dispatch(
+                    args.channel_id, 'TYPING_START', data)
+
+            # fills the cache, if any
+            await _dispatch()
+
+            counter.count = 0
+            await _dispatch()
+            queries = counter.count
+
+            lat = await measure(_dispatch, args.runs)
+            per_sub = lat['p50'] * 1000 / subscribers
+
+            report(f'{name} n={subscribers}', queries=queries, **lat,
+                   p50_per_subscriber_us=per_sub)
+
+
+async def bench_fanout(app, args):
+    """Measure the time until the first and the last
+    session get a dispatch, against the session count."""
+    data = _synthetic_message()
+
+    for sessions in args.sessions:
+        states = []
+
+        for user_id in range(1, sessions + 1):
+            state = GatewayState(user_id=user_id)
+            state.ws = _EncodingWebsocket()
+            states.append(state)
+
+        delivery = Delivery()
+
+        async def _deliver():
+            await delivery.deliver(
+                states, DispatchFrames('MESSAGE_CREATE', data))
+
+        lat = await measure(_deliver, args.runs)
+        fanout = delivery.stats['MESSAGE_CREATE']
+
+        report(f'fanout n={sessions}', **lat,
+               first_p50=fanout['first_p50'],
+               last_p99=fanout['last_p99'])
+
+
+def _etf_decode_legacy(data):
+    """ETF decoding as it was done before decode_etf
+    had earl decode binaries: unpack, then copy every dict."""
+    if isinstance(data, bytes):
+        return data.decode()
+
+    if not isinstance(data, dict):
+        return data
+
+    return {key.decode(): _etf_decode_legacy(val)
+            for key, val in data.items()}
+
+
+def _codec_payloads() -> dict:
+    return {
+        'identify': {
+            'op': 2,
+            'd': {
+                'token': 'MTYyODE5ODY2NjgyODUxMzI5.DnDJ5g.' + 'x' * 27,
+                'properties': {
+                    '$os': 'linux',
+                    '$browser': 'Discord Client',
+                    '$device': '',
+                    '$referrer': '',
+                    '$referring_domain': '',
+                },
+                'compress': False,
+                'large_threshold': 250,
+                'shard': [0, 1],
+                'presence': {'status': 'online', 'since': 0,
+                             'afk': False, 'game': None},
+            },
+        },
+        'op14': {
+            'op': 14,
+            'd': {
+                'guild_id': '522546927323418624',
+                'typing': True,
+                'activities': True,
+                'channels': {
+                    '522546927323418625': [[0, 99], [100, 199]],
+                },
+            },
+        },
+        'presence': {
+            'op': 0,
+            't': 'PRESENCE_UPDATE',
+            's': 42,
+            'd': {
+                'user': {'id': '162819866682851329'},
+                'roles': ['522546927323418630'],
+                'game': {'name': 'something', 'type': 0},
+                'guild_id': '522546927323418624',
+                'status': 'online',
+                'activities': [{'name': 'something', 'type': 0}],
+            },
+        },
+    }
+
+
+async def bench_codec(app, args):
+    """Measure encoding and decoding of common
+    gateway payloads, as JSON and as ETF."""
+    for name, payload in _codec_payloads().items():
+        as_json = encode_json(payload)
+        as_etf = encode_etf(payload)
+
+        funcs = {
+            'json encode': lambda: encode_json(payload),
+            'json decode': lambda: decode_json(as_json),
+            'etf encode': lambda: encode_etf(payload),
+            'etf decode legacy': lambda: _etf_decode_legacy(
+                earl.unpack(as_etf)),
+            'etf decode': lambda: decode_etf(as_etf),
+        }
+
+        for func_name, func in funcs.items():
+            async def _run():
+                for _ in range(args.iterations):
+                    func()
+
+            lat = await measure(_run, args.runs)
+            per_op = lat['p50'] * 1000 / args.iterations
+
+            report(f'{name} {func_name}', p50_per_op_us=per_op)
+
+
+def _synthetic_corpus(count: int) -> List[dict]:
+    """Generate MESSAGE_CREATE, PRESENCE_UPDATE and
+    GUILD_MEMBER_LIST_UPDATE dispatches."""
+    corpus = []
+    message = _synthetic_message()
+    presence = _codec_payloads()['presence']
+
+    for seq in range(1, count + 1):
+        user_id = str(random.randint(10 ** 17, 10 ** 18))
+        kind = seq % 3
+
+        if kind == 0:
+            data = {**message, 'id': str(random.getrandbits(63)),
+                    'content': ' '.join(random.sample(
+                        message['content'].split(), 5))}
+            event = 'MESSAGE_CREATE'
+        elif kind == 1:
+            data = {**presence['d'], 'user': {'id': user_id},
+                    'status': random.choice(['online', 'idle', 'dnd'])}
+            event = 'PRESENCE_UPDATE'
+        else:
+            data = {
+                'id': 'everyone',
+                'guild_id': message['guild_id'],
+                'groups': [{'id': 'online', 'count': seq}],
+                'ops': [{'op': 'INSERT', 'index': seq % 100, 'item': {
+                    'member': {'user': {'id': user_id}, 'roles': [],
+                               'presence': {'status': 'online'}}}}],
+            }
+            event = 'GUILD_MEMBER_LIST_UPDATE'
+
+        corpus.append({'op': OP.DISPATCH, 't': event, 's': seq, 'd': data})
+
+    return corpus
+
+
+async def bench_compression(app, args):
+    """Compare compression ratio and throughput of the
+    streaming transports over an event corpus.
+
+    The corpus is a file with one gateway payload, as JSON,
+    per line. Without one, a synthetic corpus is used."""
+    if args.corpus:
+        with open(args.corpus) as corpus_file:
+            corpus = [json.loads(line) for line in corpus_file if line]
+    else:
+        corpus = _synthetic_corpus(args.events)
+
+    encoder = encode_etf if args.encoding == 'etf' else encode_json
+    frames = []
+
+    for payload in corpus:
+        encoded = encoder(payload)
+        frames.append(encoded if isinstance(encoded, bytes)
+                      else encoded.encode())
+
+    raw = sum(len(frame) for frame in frames)
+    print(f'{len(frames)} {args.encoding} frames, {raw} bytes')
+
+    streams = {'zlib-stream': compression.ZlibStream}
+
+    if compression.zstd is None:
+        print('zstandard is not installed, skipping zstd-stream')
+    else:
+        zstd = compression.zstd
+
+        streams['zstd-stream'] = lambda: compression.ZstdStream(
+            args.level, args.window_log)
+
+        if args.train_dict:
+            dict_data = zstd.train_dictionary(args.dict_size, frames)
+
+            with open(args.train_dict, 'wb') as dict_file:
+                dict_file.write(dict_data.as_bytes())
+
+            print(f'wrote dictionary to {args.train_dict}')
+            args.dict = args.train_dict
+
+        if args.dict:
+            dict_data = compression.load_dict(args.dict)
+            streams['zstd-stream dict'] = lambda: compression.ZstdStream(
+                args.level, args.window_log, dict_data)
+
+    for name, factory in streams.items():
+        compressed = 0
+
+        async def _compress_all():
+            nonlocal compressed
+            stream = factory()
+            compressed = sum(len(stream.compress(frame))
+                             for frame in frames)
+
+        lat = await measure(_compress_all, args.runs)
+        throughput = raw / (lat['p50'] / 1000) / 1024 / 1024
+
+        report(name, ratio=raw / compressed, bytes=compressed,
+               mb_per_sec=throughput, **lat)
+
+
+async def _loop_lag(samples: int = 100) -> dict:
+    """Measure how long a loop iteration takes."""
+    async def _iteration():
+        await asyncio.sleep(0)
+
+    return await measure(_iteration, samples)
+
+
+async def bench_heartbeat(app, args):
+    """Compare a sleeping task per connection (recreated
+    on every heartbeat) with the heartbeat supervisor."""
+    for sessions in args.sessions:
+        conns = [object() for _ in range(sessions)]
+
+        # one task per connection, as before the supervisor
+        tasks = {}
+
+        async def _beat_tasks():
+            for conn in conns:
+                task = tasks.get(conn)
+                if task:
+                    task.cancel()
+
+                tasks[conn] = asyncio.ensure_future(asyncio.sleep(45))
+
+        beat_lat = await measure(_beat_tasks, args.runs)
+        lag = await _loop_lag()
+        report(f'tasks n={sessions}', beat_all_p50=beat_lat['p50'],
+               loop_lag_p50=lag['p50'], loop_lag_p99=lag['p99'])
+
+        for task in tasks.values():
+            task.cancel()
+
+        await asyncio.sleep(0)
+
+        supervisor = HeartbeatSupervisor()
+
+        async def _beat_wheel():
+            for conn in conns:
+                supervisor.beat(conn, 45)
+
+        async def _tick():
+            supervisor.advance()
+
+        beat_lat = await measure(_beat_wheel, args.runs)
+        tick_lat = await measure(_tick, args.runs)
+        lag = await _loop_lag()
+        report(f'supervisor n={sessions}', beat_all_p50=beat_lat['p50'],
+               tick_p50=tick_lat['p50'], loop_lag_p50=lag['p50'],
+               loop_lag_p99=lag['p99'])
+
+
+class _SyntheticGuildStorage(Storage):
+    """Storage serving the members of a synthetic guild from
+    memory, so only building the guild payload is measured."""
+    def __init__(self, members: int):
+        super().__init__(None)
+
+        self.members = {
+            user_id: {
+                'user': {
+                    'id': str(user_id),
+                    'username': f'member{user_id}',
+                    'discriminator': '0001',
+                    'avatar': None,
+                },
+                'nick': None,
+                'roles': ['2'],
+                'joined_at': '2018-12-12T00:00:00+00:00',
+                'deaf': False,
+                'mute': False,
+            } for user_id in range(10_000_000, 10_000_000 + members)}
+
+    async def get_members_bulk(self, guild_id, user_ids=None):
+        if user_ids is None:
+            return dict(self.members)
+
+        return {int(uid): self.members[int(uid)] for uid in user_ids
+                if int(uid) in self.members}
+
+    async def get_member_ids(self, guild_id):
+        return list(self.members)
+
+    async def chan_last_messages(self, channel_ids):
+        return {}
+
+
+async def bench_guild_payload(app, args):
+    """Compare GUILD_CREATE payloads with every member against
+    large_threshold payloads, over synthetic guilds."""
+    for members in args.members:
+        storage = _SyntheticGuildStorage(members)
+        state_manager = StateManager()
+        storage.presence = PresenceManager(
+            storage, None, state_manager, None)
+
+        member_ids = list(storage.members)
+        for user_id in random.sample(
+                member_ids, int(members * args.online)):
+            state = GatewayState(user_id=user_id, current_shard=0,
+                                 shard_count=1)
+            state.presence = {'status': 'online', 'game': None}
+            state_manager.insert(state)
+
+        snapshot = GuildSnapshot(
+            1, 0, guild={'id': '1', 'name': 'bench'}, roles=(),
+            channels=(), emojis=(), member_count=members)
+
+        for name, large in (('full', None),
+                            (f'large={args.large}', args.large)):
+            async def _build():
+                return await storage._guild_extra(
+                    snapshot, member_ids[0], large)
+
+            payload = await _build()
+            size = len(encode_json(payload))
+
+            lat = await measure(_build, args.runs)
+            report(f'{name} n={members}', bytes=size,
+                   members=len(payload['members']),
+                   presences=len(payload['presences']), **lat)
+
+
+async def _bus_deliver(path: str, sessions: int, events: int,
+                       ready, done):
+    received = 0
+    finished = asyncio.Event()
+
+    async def _handler(frame):
+        nonlocal received
+        _backend, _key, (event, data), _kwargs = decode_json(frame)
+
+        # what delivering to each local session costs,
+        # without the sockets.
+        frames = DispatchFrames(event, data)
+        for seq in range(sessions):
+            frames.frame('json', seq)
+
+        received += 1
+        if received == events:
+            finished.set()
+
+    client = BusClient(path, _handler)
+    task = asyncio.ensure_future(client.run())
+
+    await client.connected.wait()
+    ready.put(os.getpid())
+
+    await finished.wait()
+    done.put(time.monotonic())
+    task.cancel()
+
+
+def _bus_worker(path: str, sessions: int, events: int, ready, done):
+    """Entry point of the worker processes of bench_workers."""
+    asyncio.run(_bus_deliver(path, sessions, events, ready, done))
+
+
+async def bench_workers(app, args):
+    """Measure dispatch throughput over the worker bus, with
+    the same amount of sessions spread over 1 to N workers."""
+    loop = asyncio.get_event_loop()
+    mp_context = multiprocessing.get_context('spawn')
+
+    frame = encode_json(
+        ['channel', 1, ['MESSAGE_CREATE', _synthetic_message()], {}]
+    ).encode()
+
+    async def _ignore(_frame):
+        pass
+
+    for workers in args.workers:
+        path = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+
+        # connecting first makes the publisher host the hub
+        publisher = BusClient(path, _ignore)
+        bus_task = asyncio.ensure_future(publisher.run())
+        await publisher.connected.wait()
+
+        ready, done = mp_context.Queue(), mp_context.Queue()
+        procs = [mp_context.Process(
+            target=_bus_worker,
+            args=(path, args.sessions // workers, args.events, ready, done))
+            for _ in range(workers)]
+
+        for proc in procs:
+            proc.start()
+
+        for _ in procs:
+            await loop.run_in_executor(None, ready.get)
+
+        # let the hub register the last connections
+        await asyncio.sleep(0.1)
+
+        start = time.monotonic()
+
+        for _ in range(args.events):
+            publisher.publish(frame)
+
+        await publisher.drain()
+
+        ends = [await loop.run_in_executor(None, done.get) for _ in procs]
+        elapsed = max(ends) - start
+
+        report(f'workers={workers}', elapsed=elapsed,
+               events_per_sec=args.events / elapsed,
+               deliveries_per_sec=args.events * args.sessions / elapsed)
+
+        for proc in procs:
+            proc.join()
+
+        bus_task.cancel()
+        publisher.hub.close()
+
+        # let the hub connections wind down
+        await asyncio.sleep(0.1)
+
+
+async def bench_broker(app, args):
+    """Measure publishing dispatches through a TCP broker
+    to a number of subscribing nodes."""
+    server = BrokerServer()
+    await server.start_tcp('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    frame = encode_json(
+        ['channel', 1, ['MESSAGE_CREATE', _synthetic_message()], {}]
+    ).encode()
+
+    for nodes in args.nodes:
+        received = 0
+        finished = asyncio.Event()
+
+        async def _count(_frame):
+            nonlocal received
+            received += 1
+
+            if received == args.events * nodes:
+                finished.set()
+
+        async def _ignore(_frame):
+            pass
+
+        publisher = TcpBroker('127.0.0.1', port, _ignore)
+        subscribers = [TcpBroker('127.0.0.1', port, _count)
+                       for _ in range(nodes)]
+
+        brokers = [publisher] + subscribers
+        tasks = [asyncio.ensure_future(broker.run()) for broker in brokers]
+
+        for broker in brokers:
+            await broker.connected.wait()
+
+        # let the server register the last connections
+        await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+
+        for _ in range(args.events):
+            publisher.publish(frame)
+
+        await publisher.drain()
+        await finished.wait()
+
+        elapsed = time.perf_counter() - start
+        writes = publisher.stats['writes']
+
+        report(f'nodes={nodes}', events_per_sec=args.events / elapsed,
+               us_per_event=elapsed * 1_000_000 / args.events,
+               frames_per_write=args.events / max(writes, 1))
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.sleep(0.1)
+
+    server.close()
+
+
+def setup(subparser):
+    bench_parser = subparser.add_parser(
+        'bench',
+        help='Run benchmarks against the database',
+    )
+
+    bench_sub = bench_parser.add_subparsers(help='benchmarks')
+
+    members_parser = bench_sub.add_parser(
+        'members',
+        help='Member loading (query count and latency vs guild size)',
+        description=bench_members.__doc__
+    )
+
+    members_parser.add_argument('guild_id', type=int)
+    members_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    members_parser.add_argument('--runs', type=int, default=10)
+    members_parser.set_defaults(func=bench_members)
+
+    channels_parser = bench_sub.add_parser(
+        'channels',
+        help='Channel list loading (query count and latency)',
+        description=bench_channels.__doc__
+    )
+
+    channels_parser.add_argument('guild_id', type=int)
+    channels_parser.add_argument('--runs', type=int, default=10)
+    channels_parser.set_defaults(func=bench_channels)
+
+    messages_parser = bench_sub.add_parser(
+        'messages',
+        help='Message page hydration (query count and latency)',
+        description=bench_messages.__doc__
+    )
+
+    messages_parser.add_argument('channel_id', type=int)
+    messages_parser.add_argument('--limit', type=int, default=100)
+    messages_parser.add_argument('--runs', type=int, default=10)
+    messages_parser.set_defaults(func=bench_messages)
+
+    perms_parser = bench_sub.add_parser(
+        'permissions',
+        help='Channel permission calculation (database vs in-memory)',
+        description=bench_permissions.__doc__
+    )
+
+    perms_parser.add_argument('guild_id', type=int)
+    perms_parser.add_argument('--pairs', type=int, default=1000)
+    perms_parser.add_argument('--runs', type=int, default=10)
+    perms_parser.set_defaults(func=bench_permissions)
+
+    matrix_parser = bench_sub.add_parser(
+        'matrix',
+        help='Permission matrix build and update times (needs numpy)',
+        description=bench_matrix.__doc__
+    )
+
+    matrix_parser.add_argument('--members', type=int, default=50000)
+    matrix_parser.add_argument('--channels', type=int, default=200)
+    matrix_parser.add_argument('--roles', type=int, default=50)
+    matrix_parser.add_argument('--runs', type=int, default=10)
+    matrix_parser.set_defaults(func=bench_matrix)
+
+    dispatch_parser = bench_sub.add_parser(
+        'dispatch',
+        help='Dispatch fan-out encoding cost per event',
+        description=bench_dispatch.__doc__
+    )
+
+    dispatch_parser.add_argument(
+        '--recipients', type=int, nargs='+', default=[100, 1000, 10000])
+    dispatch_parser.add_argument(
+        '--encodings', nargs='+', default=['json', 'etf'],
+        choices=['json', 'etf'])
+    dispatch_parser.add_argument('--runs', type=int, default=10)
+    dispatch_parser.set_defaults(func=bench_dispatch)
+
+    channel_dispatch_parser = bench_sub.add_parser(
+        'channel_dispatch',
+        help='Channel dispatch latency vs subscriber count',
+        description=bench_channel_dispatch.__doc__
+    )
+
+    channel_dispatch_parser.add_argument('channel_id', type=int)
+    channel_dispatch_parser.add_argument(
+        '--subscribers', type=int, nargs='+', default=[10, 100, 1000])
+    channel_dispatch_parser.add_argument('--runs', type=int, default=100)
+    channel_dispatch_parser.set_defaults(func=bench_channel_dispatch)
+
+    fanout_parser = bench_sub.add_parser(
+        'fanout',
+        help='Dispatch delivery latency vs session count',
+        description=bench_fanout.__doc__
+    )
+
+    fanout_parser.add_argument(
+        '--sessions', type=int, nargs='+', default=[1000, 10000])
+    fanout_parser.add_argument('--runs', type=int, default=5)
+    fanout_parser.set_defaults(func=bench_fanout)
+
+    codec_parser = bench_sub.add_parser(
+        'codec',
+        help='Gateway payload encoding and decoding (JSON vs ETF)',
+        description=bench_codec.__doc__
+    )
+
+    codec_parser.add_argument('--iterations', type=int, default=1000)
+    codec_parser.add_argument('--runs', type=int, default=10)
+    codec_parser.set_defaults(func=bench_codec)
+
+    compression_parser = bench_sub.add_parser(
+        'compression',
+        help='Gateway transport compression (zlib-stream vs zstd-stream)',
+        description=bench_compression.__doc__
+    )
+
+    compression_parser.add_argument('--corpus', help='JSON lines file')
+    compression_parser.add_argument('--events', type=int, default=5000)
+    compression_parser.add_argument(
+        '--encoding', default='json', choices=['json', 'etf'])
+    compression_parser.add_argument('--level', type=int, default=3)
+    compression_parser.add_argument('--window-log', type=int, default=None)
+    compression_parser.add_argument('--dict', help='zstd dictionary file')
+    compression_parser.add_argument(
+        '--train-dict', help='train a zstd dictionary into this file')
+    compression_parser.add_argument(
+        '--dict-size', type=int, default=16 * 1024)
+    compression_parser.add_argument('--runs', type=int, default=5)
+    compression_parser.set_defaults(func=bench_compression)
+
+    heartbeat_parser = bench_sub.add_parser(
+        'heartbeat',
+        help='Heartbeat tracking overhead with many sessions',
+        description=bench_heartbeat.__doc__
+    )
+
+    heartbeat_parser.add_argument(
+        '--sessions', type=int, nargs='+', default=[10000, 100000])
+    heartbeat_parser.add_argument('--runs', type=int, default=5)
+    heartbeat_parser.set_defaults(func=bench_heartbeat)
+
+    guild_payload_parser = bench_sub.add_parser(
+        'guild_payload',
+        help='GUILD_CREATE size and build time vs large_threshold',
+        description=bench_guild_payload.__doc__
+    )
+
+    guild_payload_parser.add_argument(
+        '--members', type=int, nargs='+', default=[1000, 10000, 100000])
+    guild_payload_parser.add_argument('--large', type=int, default=250)
+    guild_payload_parser.add_argument(
+        '--online', type=float, default=0.1,
+        help='fraction of members that are online')
+    guild_payload_parser.add_argument('--runs', type=int, default=5)
+    guild_payload_parser.set_defaults(func=bench_guild_payload)
+
+    workers_parser = bench_sub.add_parser(
+        'workers',
+        help='Dispatch throughput over the worker bus vs worker count',
+        description=bench_workers.__doc__
+    )
+
+    workers_parser.add_argument(
+        '--workers', type=int, nargs='+', default=[1, 2, 4])
+    workers_parser.add_argument('--sessions', type=int, default=10000)
+    workers_parser.add_argument('--events', type=int, default=200)
+    workers_parser.set_defaults(func=bench_workers)
+
+    broker_parser = bench_sub.add_parser(
+        'broker',
+        help='Dispatch throughput through a TCP broker vs node count',
+        description=bench_broker.__doc__
+    )
+
+    broker_parser.add_argument(
+        '--nodes', type=int, nargs='+', default=[1, 4, 16])
+    broker_parser.add_argument('--events', type=int, default=10000)
+    broker_parser.set_defaults(func=bench_broker)
@@ -0,0 +1,25 @@
+from discord.pubsub.broker import BrokerServer
+
+
+async def run_broker(ctx, args):
+    """Run a broker, relaying dispatches between server nodes.
+
+    Set PUBSUB_BROKER on every node to its address.
+    """
+    server = BrokerServer()
+    await server.start_tcp(args.host, args.port)
+
+    print(f'broker listening on {args.host}:{args.port}')
+    await server.serve_forever()
+
+
+def setup(subparser):
+    broker_parser = subparser.add_parser(
+        'broker',
+        help='run a pub/sub broker for many server nodes',
+        description=run_broker.__doc__
+    )
+
+    broker_parser.add_argument('--host', default='127.0.0.1')
+    broker_parser.add_argument('--port', type=int, default=5003)
+    broker_parser.set_defaults(func=run_broker)
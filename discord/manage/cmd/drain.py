@@ -0,0 +1,63 @@
+import json
+import os
+import signal
+
+
+async def drain_start(ctx, args):
+    """Start draining the sessions of a running server.
+
+    Sessions are disconnected in waves, following the
+    DRAIN_RATE and DRAIN_WINDOW settings of that server.
+    """
+    try:
+        os.kill(args.pid, signal.SIGUSR1)
+    except ProcessLookupError:
+        return print(f'no process with pid {args.pid}')
+
+    print(f'OK: sent drain signal to {args.pid}')
+
+
+async def drain_status(ctx, args):
+    """Show the progress of a drain."""
+    path = args.status_file or ctx.config.get('DRAIN_STATUS_FILE')
+
+    if not path:
+        return print('DRAIN_STATUS_FILE is not set')
+
+    try:
+        with open(path) as status_file:
+            progress = json.load(status_file)
+    except FileNotFoundError:
+        return print('no drain was started')
+
+    state = 'finished' if progress['finished'] else 'draining'
+    print(f'{state}: {progress["drained"]} / {progress["total"]} sessions, '
+          f'{progress["waves"]} waves, {progress["elapsed"]:.1f}s')
+
+
+def setup(subparser):
+    drain_parser = subparser.add_parser(
+        'drain',
+        help='Disconnect the sessions of a running server in waves',
+    )
+
+    drain_sub = drain_parser.add_subparsers(help='operations')
+
+    start_parser = drain_sub.add_parser(
+        'start',
+        help='start draining a running server',
+        description=drain_start.__doc__
+    )
+
+    start_parser.add_argument('pid', type=int, help='pid of the server')
+    start_parser.set_defaults(func=drain_start)
+
+    status_parser = drain_sub.add_parser(
+        'status',
+        help='show the progress of a drain',
+        description=drain_status.__doc__
+    )
+
+    status_parser.add_argument(
+        '--status-file', help='defaults to DRAIN_STATUS_FILE')
+    status_parser.set_defaults(func=drain_status)
@@ -0,0 +1,16 @@
+-- keep the last message id of a channel on the channel
+-- itself, instead of scanning messages for it.
+ALTER TABLE channels
+  ADD COLUMN last_message_id bigint DEFAULT NULL;
+
+UPDATE channels
+  SET last_message_id = (
+    SELECT MAX(id)
+    FROM messages
+    WHERE messages.channel_id = channels.id
+  );
+
+-- message history and last message recalculation
+-- go through this index.
+CREATE INDEX IF NOT EXISTS messages_channel_id_idx
+  ON messages (channel_id, id);
@@ -7,7 +7,7 @@ from logbook import Logger
 
 from run import init_app_managers, init_app_db
 from manage.cmd.migration import migration
-from manage.cmd import users, tests, invites
+from manage.cmd import users, tests, invites, bench, drain, broker
 
 log = Logger(__name__)
 
@@ -33,6 +33,9 @@ def init_parser():
     users.setup(subparser)
     tests.setup(subparser)
     invites.setup(subparser)
+    bench.setup(subparser)
+    drain.setup(subparser)
+    broker.setup(subparser)
 
     return parser
 
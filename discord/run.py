@@ -1,4 +1,5 @@
 import asyncio
+import signal
 import sys
 
 import asyncpg
@@ -38,16 +39,31 @@ from discord.blueprints.user.billing_job import (
     payment_job
 )
 
+from discord import request_cache
 from discord.ratelimits.handler import ratelimit_handler
 from discord.ratelimits.main import RatelimitManager
 
 from discord.gateway import websocket_handler
 from discord.errors import DiscordError
 from discord.gateway.state_manager import StateManager
+from discord.gateway.heartbeat import HeartbeatSupervisor
+from discord.gateway.admission import AdmissionController
+from discord.gateway.ready import ready_semaphore
+from discord.gateway.drain import Drainer
+from discord.gateway.websocket import subscribe_state
+from discord.pubsub.broker import make_broker
+from discord.gateway.session_store import (
+    make_store, save_sessions, restore_sessions, expire_sessions
+)
 from discord.storage import Storage
+from discord.guild_cache import GuildCache
+from discord.channel_cache import ChannelCache
+from discord.message_buffer import MessageBuffer
+from discord.permission_engine import PermissionEngine
 from discord.user_storage import UserStorage
 from discord.dispatcher import EventDispatcher
 from discord.presence import PresenceManager
+from discord.stats import stats_job
 from discord.images import IconManager
 from discord.jobs import JobManager
 
@@ -133,6 +149,7 @@ set_blueprints(app)
 async def app_before_request():
     """Functions to call before the request actually
     takes place."""
+    request_cache.start()
     await ratelimit_handler()
 
 
@@ -182,6 +199,18 @@ async def app_set_ratelimit_headers(resp):
     return resp
 
 
+@app.after_request
+async def app_request_cache_counters(resp):
+    """Report how many database queries the request
+    cache saved, on debug."""
+    cache = request_cache.finish(f'{request.method} {request.path}')
+
+    if cache is not None and app.debug:
+        resp.headers['X-Debug-Queries-Saved'] = str(cache.queries_saved)
+
+    return resp
+
+
 async def init_app_db(app):
     """Connect to databases.
 
@@ -198,8 +227,37 @@ def init_app_managers(app):
     app.loop = asyncio.get_event_loop()
     app.ratelimiter = RatelimitManager(app.config.get('_testing'))
     app.state_manager = StateManager()
+    app.heartbeats = HeartbeatSupervisor(
+        app.config.get('HEARTBEAT_RESOLUTION', 1.0))
+    app.ready_semaphore = ready_semaphore(app.config)
+    app.admission = AdmissionController(
+        app.config.get('IDENTIFY_CONCURRENCY', 16))
+    app.drainer = Drainer(
+        app.state_manager,
+        app.config.get('DRAIN_RATE', 50),
+        app.config.get('DRAIN_WINDOW', 60),
+        status_path=app.config.get('DRAIN_STATUS_FILE'))
+    app.session_store = make_store(app.config)
 
     app.storage = Storage(app.db)
+
+    app.guild_cache = GuildCache(
+        app.config.get('GUILD_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    app.storage.guild_cache = app.guild_cache
+
+    app.channel_cache = ChannelCache(
+        app.config.get('CHANNEL_CACHE_SIZE', 100_000))
+    app.storage.channel_cache = app.channel_cache
+
+    app.message_buffer = MessageBuffer(
+        app.config.get('MESSAGE_BUFFER_DEPTH', 100),
+        app.config.get('MESSAGE_BUFFER_MAX_BYTES', 32 * 1024 * 1024))
+    app.storage.message_buffer = app.message_buffer
+
+    app.perm_engine = PermissionEngine(
+        app.storage, app.config.get('PERMISSION_MATRIX_MIN_MEMBERS', 1000))
+    app.storage.perm_engine = app.perm_engine
+
     app.user_storage = UserStorage(app.storage)
 
     app.icons = IconManager(app)
@@ -214,6 +272,16 @@ def init_app_managers(app):
 
     app.storage.presence = app.presence
 
+    # nodes and workers share dispatches through the broker
+    app.broker = make_broker(app.config, app.dispatcher.handle_broker)
+    app.dispatcher.broker = app.broker
+
+    # and the changes made to their caches
+    if app.broker is not None:
+        for name in ('guild_cache', 'channel_cache',
+                     'message_buffer', 'perm_engine'):
+            app.dispatcher.share_cache(name, getattr(app, name))
+
 
 async def api_index(app):
     to_find = {}
@@ -268,11 +336,48 @@ async def api_index(app):
     log.debug('missing: {}', missing)
 
 
+async def restore_app_sessions(app):
+    """Load the sessions saved on the last shutdown,
+    so that clients can resume them."""
+    if app.session_store is None:
+        return
+
+    states = await restore_sessions(
+        app.session_store, app.state_manager,
+        store_max_events=app.config.get('GATEWAY_RESUME_MAX_EVENTS', 250),
+        store_max_bytes=app.config.get(
+            'GATEWAY_RESUME_MAX_BYTES', 1024 * 1024))
+
+    # so that they store their dispatches until resumed
+    for state in states:
+        await subscribe_state(app.dispatcher, app.user_storage, state)
+
+    app.sched.spawn(expire_sessions(
+        app.state_manager, states,
+        app.config.get('SESSION_RESTORE_TIMEOUT', 60)))
+
+
 async def post_app_start(app):
     # we'll need to start a billing job
     app.sched.spawn(payment_job(app))
+    app.sched.spawn(app.heartbeats.run())
+
+    if app.broker is not None:
+        app.sched.spawn(app.broker.run())
     app.sched.spawn(api_index(app))
 
+    stats_interval = app.config.get('STATS_LOG_INTERVAL')
+    if stats_interval:
+        app.sched.spawn(stats_job(app, stats_interval))
+
+    await restore_app_sessions(app)
+
+    # 'manage.py drain start' sends SIGUSR1
+    try:
+        app.loop.add_signal_handler(signal.SIGUSR1, app.drainer.start)
+    except (AttributeError, NotImplementedError):
+        log.warning('draining by signal is not supported here')
+
 
 @app.before_serving
 async def app_before_serving():
@@ -295,7 +400,9 @@ async def app_before_serving():
         # so we can pass quart's app object.
         await websocket_handler(app, ws, url)
 
-    ws_future = websockets.serve(_wrapper, host, port)
+    # with a broker, many workers can share the gateway port
+    ws_future = websockets.serve(_wrapper, host, port,
+                                 reuse_port=app.broker is not None)
 
     await post_app_start(app)
     await ws_future
@@ -306,9 +413,10 @@ async def app_after_serving():
     """Shutdown tasks for the server."""
 
     # first close all clients, then close db
-    tasks = app.state_manager.gen_close_tasks()
-    if tasks:
-        await asyncio.wait(tasks, loop=app.loop)
+    await app.drainer.drain()
+
+    if app.session_store is not None:
+        await save_sessions(app.session_store, app.drainer.drained_states)
 
     app.state_manager.close()
 
@@ -281,7 +281,12 @@ CREATE TABLE IF NOT EXISTS connections (
 
 CREATE TABLE IF NOT EXISTS channels (
     id bigint PRIMARY KEY,
-    channel_type int NOT NULL
+    channel_type int NOT NULL,
+
+    -- maintained on message create/delete, so we don't
+    -- need to scan messages to find it.
+    -- not a foreign key, to keep message deletes simple.
+    last_message_id bigint DEFAULT NULL
 );
 
 CREATE TABLE IF NOT EXISTS user_read_state (
@@ -619,6 +624,9 @@ CREATE TABLE IF NOT EXISTS messages (
     message_type int NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS messages_channel_id_idx
+    ON messages (channel_id, id);
+
 CREATE TABLE IF NOT EXISTS message_attachments (
     message_id bigint REFERENCES messages (id),
     attachment bigint REFERENCES attachments (id),
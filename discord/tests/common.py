@@ -1,5 +1,12 @@
+from discord.snowflake import get_snowflake
+
 from .credentials import CREDS
 
+#: permission bits used by test guilds
+READ_MESSAGES = 1 << 10
+SEND_MESSAGES = 1 << 11
+ADMINISTRATOR = 1 << 3
+
 async def login(acc_name: str, test_cli):
     creds = CREDS[acc_name]
 
@@ -25,3 +32,101 @@ async def get_uid(token, test_cli):
 
     rjson = await resp.json
     return rjson['id']
+
+
+async def user_id_of(db, acc_name: str) -> int:
+    """Get the user ID of a test account."""
+    return await db.fetchval("""
+    SELECT id
+    FROM users
+    WHERE email = $1
+    """, CREDS[acc_name]['email'])
+
+
+async def create_guild(db, owner_id: int, member_ids: list) -> dict:
+    """Create a guild straight in the database, returning its IDs.
+
+    The first member gets a role that can send messages, the
+    second one an administrator role. Channel 'private' is only
+    readable by the first role, and channel 'muted' denies
+    sending messages to the first member.
+    """
+    guild_id = get_snowflake()
+    senders_id, admins_id = get_snowflake(), get_snowflake()
+    channel_ids = {name: get_snowflake()
+                   for name in ('general', 'private', 'muted')}
+
+    await db.execute("""
+    INSERT INTO guilds (id, name, region, owner_id)
+    VALUES ($1, 'test guild', 'brazil', $2)
+    """, guild_id, owner_id)
+
+    await db.executemany("""
+    INSERT INTO roles (id, guild_id, name, position, permissions)
+    VALUES ($1, $2, $3, $4, $5)
+    """, [(guild_id, guild_id, '@everyone', 0, READ_MESSAGES),
+          (senders_id, guild_id, 'senders', 1, SEND_MESSAGES),
+          (admins_id, guild_id, 'admins', 2, ADMINISTRATOR)])
+
+    all_members = [owner_id] + list(member_ids)
+
+    await db.executemany("""
+    INSERT INTO members (user_id, guild_id)
+    VALUES ($1, $2)
+    """, [(user_id, guild_id) for user_id in all_members])
+
+    member_roles = [(user_id, guild_id, guild_id) for user_id in all_members]
+    member_roles.extend(
+        (user_id, guild_id, role_id)
+        for user_id, role_id in zip(member_ids, (senders_id, admins_id)))
+
+    await db.executemany("""
+    INSERT INTO member_roles (user_id, guild_id, role_id)
+    VALUES ($1, $2, $3)
+    """, member_roles)
+
+    for position, (name, channel_id) in enumerate(channel_ids.items()):
+        await db.execute("""
+        INSERT INTO channels (id, channel_type)
+        VALUES ($1, 0)
+        """, channel_id)
+
+        await db.execute("""
+        INSERT INTO guild_channels (id, guild_id, name, position)
+        VALUES ($1, $2, $3, $4)
+        """, channel_id, guild_id, name, position)
+
+        await db.execute("""
+        INSERT INTO guild_text_channels (id)
+        VALUES ($1)
+        """, channel_id)
+
+    await db.executemany("""
+    INSERT INTO channel_overwrites
+        (channel_id, target_type, target_role, target_user, allow, deny)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    """, [(channel_ids['private'], 1, guild_id, None, 0, READ_MESSAGES),
+          (channel_ids['private'], 1, senders_id, None, READ_MESSAGES, 0)]
+         + [(channel_ids['muted'], 0, None, user_id, 0, SEND_MESSAGES)
+            for user_id in member_ids[:1]])
+
+    return {
+        'id': guild_id,
+        'owner_id': owner_id,
+        'member_ids': all_members,
+        'role_ids': [guild_id, senders_id, admins_id],
+        'channel_ids': channel_ids,
+    }
+
+
+async def delete_guild(db, guild: dict):
+    """Delete a guild made by create_guild."""
+    await db.execute("""
+    DELETE FROM guilds
+    WHERE id = $1
+    """, guild['id'])
+
+    await db.execute("""
+    DELETE FROM channels
+    WHERE id = ANY($1::bigint[])
+    """, list(guild['channel_ids'].values()))
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from discord.gateway.admission import AdmissionController
+
+
+@pytest.mark.asyncio
+async def test_admission_limit():
+    admission = AdmissionController(max_concurrent=2)
+    running = 0
+    peak = 0
+
+    async def _identify():
+        nonlocal running, peak
+
+        async with admission.slot('identify'):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(_identify() for _ in range(10)))
+
+    assert peak == 2
+    assert admission.active == 0
+    assert admission.stats['identify']['queued'] == 8
+    assert admission.stats['identify']['wait_p99'] > 0
+
+
+@pytest.mark.asyncio
+async def test_admission_order():
+    admission = AdmissionController(max_concurrent=1)
+    order = []
+    release = asyncio.Event()
+
+    async def _first():
+        async with admission.slot('identify'):
+            await release.wait()
+
+    async def _waiter(kind, name):
+        async with admission.slot(kind):
+            order.append(name)
+
+    first = asyncio.ensure_future(_first())
+    await asyncio.sleep(0)
+
+    waiters = [
+        asyncio.ensure_future(_waiter('identify', 'identify 1')),
+        asyncio.ensure_future(_waiter('identify', 'identify 2')),
+        asyncio.ensure_future(_waiter('resume', 'resume')),
+    ]
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(first, *waiters)
+
+    # resumes go first, identifies are first come first served
+    assert order == ['resume', 'identify 1', 'identify 2']
+
+
+@pytest.mark.asyncio
+async def test_admission_cancel():
+    admission = AdmissionController(max_concurrent=1)
+    release = asyncio.Event()
+
+    async def _first():
+        async with admission.slot('identify'):
+            await release.wait()
+
+    first = asyncio.ensure_future(_first())
+    await asyncio.sleep(0)
+
+    async def _queued():
+        async with admission.slot('identify'):
+            pass
+
+    # a connection that goes away while waiting leaves the line
+    queued = asyncio.ensure_future(_queued())
+    await asyncio.sleep(0)
+    assert len(admission) == 1
+
+    queued.cancel()
+    await asyncio.sleep(0)
+    assert len(admission) == 0
+
+    release.set()
+    await first
+    assert admission.active == 0
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from discord.pubsub.broker import (
+    BrokerServer, BusClient, TcpBroker, pack_message, unpack_message
+)
+
+
+@pytest.mark.asyncio
+async def test_bus_client(tmp_path):
+    path = str(tmp_path / 'bus.sock')
+    received = {'first': [], 'second': []}
+
+    def _handler(name):
+        async def _handle(frame):
+            received[name].append(frame)
+
+        return _handle
+
+    first = BusClient(path, _handler('first'))
+    second = BusClient(path, _handler('second'))
+
+    tasks = [asyncio.ensure_future(client.run())
+             for client in (first, second)]
+
+    await first.connected.wait()
+    await second.connected.wait()
+
+    # only one of them hosts the hub
+    assert first.hub is not None
+    assert second.hub is None
+
+    # let the hub accept both connections
+    await asyncio.sleep(0.1)
+
+    first.publish(b'hello')
+    first.publish(b'world')
+    await first.drain()
+
+    for _ in range(50):
+        if len(received['second']) == 2:
+            break
+
+        await asyncio.sleep(0.01)
+
+    # publishers don't get their own frames back
+    assert received == {'first': [], 'second': [b'hello', b'world']}
+
+    for task in tasks:
+        task.cancel()
+
+    first.hub.close()
+
+    # let the hub connections wind down
+    await asyncio.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_tcp_broker():
+    server = BrokerServer()
+    await server.start_tcp('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    received = []
+
+    async def _receive(frame):
+        received.append(frame)
+
+    async def _ignore(_frame):
+        pass
+
+    publisher = TcpBroker('127.0.0.1', port, _ignore)
+    subscriber = TcpBroker('127.0.0.1', port, _receive)
+
+    tasks = [asyncio.ensure_future(broker.run())
+             for broker in (publisher, subscriber)]
+
+    await publisher.connected.wait()
+    await subscriber.connected.wait()
+    await asyncio.sleep(0.1)
+
+    for idx in range(100):
+        publisher.publish(b'%d' % idx)
+
+    await publisher.drain()
+
+    for _ in range(50):
+        if len(received) == 100:
+            break
+
+        await asyncio.sleep(0.01)
+
+    assert received == [b'%d' % idx for idx in range(100)]
+
+    # publishes of the same loop iteration are batched
+    assert publisher.stats['writes'] == 1
+
+    for task in tasks:
+        task.cancel()
+
+    server.close()
+    await asyncio.sleep(0.1)
+
+
+def test_pack_message():
+    message = ['dispatch', 'member', (1, 2), ('MESSAGE_CREATE', {
+        'ids': {3, 4},
+        'by_id': {5: 'a', (6, 7): 'b'},
+        'roles': [{'__tuple__': 'not a tuple'}],
+    }), {}]
+
+    assert unpack_message(pack_message(message)) == message
@@ -0,0 +1,71 @@
+from discord.channel_cache import ChannelCache, ChannelMeta
+from discord.shared_cache import apply_shared
+
+
+def _metas(guild_id=1, count=3):
+    return [ChannelMeta(guild_id * 100 + idx, 0, guild_id, None)
+            for idx in range(count)]
+
+
+def test_channel_cache_hit_miss():
+    cache = ChannelCache()
+
+    assert cache.get(100) is None
+    cache.put_many(_metas(), cache.generation)
+
+    assert cache.get(100).guild_id == 1
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_channel_cache_stale_put():
+    cache = ChannelCache()
+
+    generation = cache.generation
+    cache.invalidate(100)
+    cache.put_many(_metas(), generation)
+
+    assert cache.get(100) is None
+
+
+def test_channel_cache_invalidate_guild():
+    cache = ChannelCache()
+    cache.put_many(_metas(1) + _metas(2), cache.generation)
+
+    cache.invalidate_guild(1)
+
+    assert cache.get(100) is None
+    assert cache.get(200) is not None
+    assert len(cache) == 3
+
+
+def test_channel_cache_lru_eviction():
+    cache = ChannelCache(max_channels=3)
+    cache.put_many(_metas(1), cache.generation)
+
+    # mark 100 as recently used, so 101 is the one evicted
+    cache.get(100)
+    cache.put_many([ChannelMeta(5, 1, None, None)], cache.generation)
+
+    assert cache.get(101) is None
+    assert cache.get(100) is not None
+    assert cache.stats['evictions'] == 1
+
+
+def test_channel_cache_shared():
+    published = []
+    cache, other = ChannelCache(), ChannelCache()
+    cache.publish = lambda method, args: published.append((method, args))
+
+    for node in (cache, other):
+        node.put_many(_metas(), node.generation)
+
+    cache.invalidate_guild(1)
+    assert published == [('invalidate_guild', (1,))]
+
+    # other nodes apply it without publishing it again
+    other.publish = cache.publish
+    apply_shared(other, *published[0])
+
+    assert len(published) == 1
+    assert other.get(100) is None
@@ -0,0 +1,33 @@
+import zlib
+
+import pytest
+
+from discord.gateway.compression import ZlibStream, ZstdStream, transports
+
+FRAMES = [b'{"op":0,"t":"MESSAGE_CREATE","s":%d,"d":{}}' % seq
+          for seq in range(1, 20)]
+
+
+def test_zlib_stream():
+    stream = ZlibStream()
+    decomp = zlib.decompressobj()
+
+    # every frame must be decompressable on its own arrival
+    for frame in FRAMES:
+        assert decomp.decompress(stream.compress(frame)) == frame
+
+
+def test_zstd_stream():
+    zstd = pytest.importorskip('zstandard')
+    assert 'zstd-stream' in transports()
+
+    dict_data = zstd.ZstdCompressionDict(
+        b'{"op":0,"t":"MESSAGE_CREATE","d":{}}' * 4)
+
+    for kwargs in ({}, {'window_log': 17}, {'dict_data': dict_data}):
+        stream = ZstdStream(**kwargs)
+        decomp = zstd.ZstdDecompressor(
+            dict_data=kwargs.get('dict_data')).decompressobj()
+
+        for frame in FRAMES:
+            assert decomp.decompress(stream.compress(frame)) == frame
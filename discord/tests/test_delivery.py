@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from discord.gateway.encoding import DispatchFrames
+from discord.gateway.state import GatewayState
+from discord.pubsub.delivery import Delivery
+
+
+class _Websocket:
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.frames = []
+
+    async def dispatch_frames(self, frames):
+        if self.error is not None:
+            raise self.error
+
+        self.frames.append(frames)
+
+
+def _state(**kwargs) -> GatewayState:
+    state = GatewayState(user_id=1)
+    state.ws = _Websocket(**kwargs)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_delivery_order():
+    delivery = Delivery()
+
+    states = [_state() for _ in range(10)]
+    states[3].ws.error = ConnectionError()
+
+    sessions = await delivery.deliver(
+        states, DispatchFrames('MESSAGE_CREATE', {}))
+
+    assert sessions == [state.session_id for idx, state
+                        in enumerate(states) if idx != 3]
+    assert all(len(state.ws.frames) == 1 for idx, state
+               in enumerate(states) if idx != 3)
+
+    stats = delivery.stats['MESSAGE_CREATE']
+    assert stats['dispatches'] == 1
+    assert stats['failed'] == 1
+    assert stats['last_p50'] >= stats['first_p50'] > 0
+
+    assert await delivery.deliver([], None) == []
+
+
+@pytest.mark.asyncio
+async def test_delivery_cancel():
+    delivery = Delivery()
+    states = [_state(error=asyncio.CancelledError()), _state()]
+
+    with pytest.raises(asyncio.CancelledError):
+        await delivery.deliver(states, DispatchFrames('TYPING_START', {}))
+
+    assert not states[1].ws.frames
@@ -0,0 +1,48 @@
+import pytest
+
+from discord.gateway.encoding import (
+    DispatchFrames, encode_json, encode_etf, decode_json, decode_etf
+)
+
+DATA = {
+    'id': '1234',
+    'content': 'hello "world" ☃',
+    'mentions': [{'id': '1', 'username': 'a'}],
+    'nonce': None,
+    'pinned': False,
+}
+
+
+@pytest.mark.parametrize('seq', [1, 255, 256, 70000])
+def test_frames_match_encoders(seq):
+    frames = DispatchFrames('message_create', DATA)
+    payload = frames.payload(seq)
+
+    assert payload['t'] == 'MESSAGE_CREATE'
+    assert decode_etf(frames.frame('etf', seq)) == \
+        decode_etf(encode_etf(payload))
+    assert decode_json(frames.frame('json', seq)) == \
+        decode_json(encode_json(payload))
+
+
+def test_frames_decode():
+    frames = DispatchFrames('MESSAGE_CREATE', DATA)
+
+    for encoding, decoder in (('json', decode_json), ('etf', decode_etf)):
+        decoded = decoder(frames.frame(encoding, 42))
+        assert decoded['s'] == 42
+        assert decoded['d']['content'] == DATA['content']
+
+
+def test_etf_decode_nested():
+    payload = {
+        'op': 14,
+        'd': {
+            'guild_id': '1',
+            'channels': {'2': [[0, 99]]},
+            'members': [{'user': {'id': '3'}, 'roles': []}],
+        },
+    }
+
+    assert decode_etf(encode_etf(payload)) == payload
+
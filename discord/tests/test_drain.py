@@ -0,0 +1,77 @@
+import pytest
+
+from discord.gateway.drain import Drainer
+from discord.gateway.encoding import DispatchFrames
+from discord.gateway.state import GatewayState, ParkedConnection
+
+
+class _StateManager:
+    def __init__(self, states):
+        self.states_raw = {state.session_id: state for state in states}
+        self.accept_new = True
+        self.drained = []
+
+    async def shutdown_single(self, state):
+        self.drained.append(state.session_id)
+        state.ws = None
+
+
+def _state(session_id: str, status: str, afk: bool = False):
+    state = GatewayState(session_id=session_id, ws=object())
+    state.presence = {'status': status, 'afk': afk}
+    return state
+
+
+@pytest.mark.asyncio
+async def test_drain_order():
+    manager = _StateManager([
+        _state('online', 'online'),
+        _state('idle', 'idle'),
+        _state('afk', 'online', afk=True),
+        _state('dnd', 'dnd'),
+        _state('invisible', 'invisible'),
+    ])
+
+    # 2 sessions per wave
+    drainer = Drainer(manager, rate=2000, window=60, interval=0.001)
+    await drainer.drain()
+
+    assert not manager.accept_new
+    assert manager.drained == ['afk', 'invisible', 'idle', 'dnd', 'online']
+
+    assert drainer.progress['finished']
+    assert drainer.progress['drained'] == 5
+    assert drainer.progress['waves'] == 3
+
+
+@pytest.mark.asyncio
+async def test_drain_window():
+    manager = _StateManager([_state(str(idx), 'online')
+                             for idx in range(100)])
+
+    # 1 session per wave wouldn't fit 100 sessions in 10ms
+    drainer = Drainer(manager, rate=1, window=0.01, interval=0.001)
+    await drainer.drain()
+
+    assert len(manager.drained) == 100
+    assert drainer.progress['waves'] == 10
+
+
+@pytest.mark.asyncio
+async def test_drain_parked():
+    parked = _state('parked', 'online')
+    parked.seq = 3
+    parked.ws = ParkedConnection(parked, 'json')
+
+    manager = _StateManager([parked])
+    drainer = Drainer(manager, rate=2000, window=60, interval=0.001)
+    await drainer.drain()
+
+    # already disconnected, but still saved
+    assert manager.drained == []
+    assert drainer.drained_states == [parked]
+
+    # and storing dispatches until then
+    await parked.ws.dispatch_frames(DispatchFrames('TYPING_START', {}))
+    assert parked.seq == 4
+    assert [entry[0] for entry in parked.store.replay(4, 4)] == [4]
@@ -0,0 +1,68 @@
+from discord.guild_cache import GuildCache
+
+
+def _parts(name='guild', member_count=1):
+    return {
+        'guild': {'id': '1', 'name': name},
+        'roles': ({'id': '1', 'name': '@everyone'},),
+        'channels': (),
+        'emojis': (),
+        'member_count': member_count,
+    }
+
+
+def test_guild_cache_hit_miss():
+    cache = GuildCache()
+
+    assert cache.get(1) is None
+    snapshot = cache.put(1, cache.generation(1), **_parts())
+
+    assert cache.get(1) is snapshot
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_guild_cache_partial_invalidate():
+    cache = GuildCache()
+    snapshot = cache.put(1, cache.generation(1), **_parts())
+
+    cache.invalidate(1, 'roles')
+    partial = cache.get(1)
+
+    assert partial.missing == ['roles']
+    assert partial.guild == snapshot.guild
+    assert partial.version > snapshot.version
+
+
+def test_guild_cache_stale_put():
+    cache = GuildCache()
+
+    generation = cache.generation(1)
+    cache.invalidate(1)
+    cache.put(1, generation, **_parts())
+
+    assert cache.get(1) is None
+
+
+def test_guild_cache_member_count():
+    cache = GuildCache()
+    cache.put(1, cache.generation(1), **_parts(member_count=10))
+
+    cache.patch_member_count(1, 1)
+    assert cache.get(1).member_count == 11
+
+
+def test_guild_cache_lru_eviction():
+    cache = GuildCache()
+    size = cache.put(1, cache.generation(1), **_parts()).size
+    cache.max_bytes = size * 2
+
+    cache.put(2, cache.generation(2), **_parts())
+
+    # mark 1 as recently used, so 2 is the one evicted
+    cache.get(1)
+    cache.put(3, cache.generation(3), **_parts())
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.stats['evictions'] == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from discord.gateway.heartbeat import HeartbeatSupervisor
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Conn:
+    def __init__(self):
+        self.expired = False
+
+    async def heartbeat_expired(self):
+        self.expired = True
+
+
+def test_heartbeat_expiry():
+    clock = _Clock()
+    wheel = HeartbeatSupervisor(resolution=1, slots=8, clock=clock)
+
+    fast, slow = _Conn(), _Conn()
+    wheel.beat(fast, 3)
+    wheel.beat(slow, 20)
+
+    clock.now += 2
+    assert wheel.advance() == []
+
+    clock.now += 1
+    assert wheel.advance() == [fast]
+
+    # more than a full turn of the wheel later
+    clock.now += 16
+    assert wheel.advance() == []
+
+    clock.now += 1
+    assert wheel.advance() == [slow]
+    assert len(wheel) == 0
+
+
+def test_heartbeat_bump():
+    clock = _Clock()
+    wheel = HeartbeatSupervisor(resolution=1, slots=8, clock=clock)
+
+    conn = _Conn()
+    wheel.beat(conn, 3)
+
+    for _ in range(10):
+        clock.now += 2
+        wheel.beat(conn, 3)
+        assert wheel.advance() == []
+
+    wheel.forget(conn)
+    clock.now += 10
+    assert wheel.advance() == []
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_expire_call():
+    wheel = HeartbeatSupervisor()
+    conn = _Conn()
+
+    await wheel._expire([conn])
+    assert conn.expired
@@ -0,0 +1,29 @@
+import pytest
+
+from tests.common import user_id_of, create_guild, delete_guild
+
+
+@pytest.mark.asyncio
+async def test_members_bulk(app):
+    owner_id = await user_id_of(app.db, 'normal')
+    member_id = await user_id_of(app.db, 'admin')
+    guild = await create_guild(app.db, owner_id, [member_id])
+    guild_id = guild['id']
+
+    try:
+        members = await app.storage.get_members_bulk(guild_id)
+
+        assert set(members) == {owner_id, member_id}
+        assert members[owner_id]['roles'] == []
+        assert members[member_id]['roles'] == [str(guild['role_ids'][1])]
+        assert members[member_id]['user']['id'] == str(member_id)
+
+        # a slice of the member list
+        members = await app.storage.get_members_bulk(guild_id, [member_id])
+        assert list(members) == [member_id]
+
+        member = await app.storage.get_member_data_one(guild_id, owner_id)
+        assert member['user']['id'] == str(owner_id)
+        assert member['nick'] is None
+    finally:
+        await delete_guild(app.db, guild)
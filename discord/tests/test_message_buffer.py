@@ -0,0 +1,133 @@
+from discord.message_buffer import MessageBuffer
+
+
+def _message(message_id, content='hi'):
+    return {'id': str(message_id), 'content': content,
+            'reactions': [], 'pinned': False}
+
+
+def _seeded(ids, exhaustive=True, **kwargs):
+    buffer = MessageBuffer(**kwargs)
+    buffer.seed(1, buffer.generation(1), [_message(mid) for mid in ids],
+                {}, exhaustive)
+    return buffer
+
+
+def _ids(result):
+    return [int(payload['id']) for payload, _ in result]
+
+
+def test_message_buffer_newest():
+    buffer = _seeded(range(1, 11))
+
+    assert _ids(buffer.query(1, 3)) == [10, 9, 8]
+    assert buffer.query(2, 3) is None
+    assert buffer.stats['hits'] == 1
+    assert buffer.stats['misses'] == 1
+
+
+def test_message_buffer_window():
+    buffer = _seeded(range(5, 11), exhaustive=False)
+
+    # a full page inside the buffer
+    assert _ids(buffer.query(1, 2, before=8)) == [7, 6]
+
+    # pages that might need messages older than the buffer
+    assert buffer.query(1, 5, before=8) is None
+    assert buffer.query(1, 50) is None
+
+    # all messages newer than 'after' are in the buffer
+    assert _ids(buffer.query(1, 50, after=6)) == [10, 9, 8, 7]
+
+
+def test_message_buffer_mutations():
+    buffer = _seeded(range(1, 4))
+
+    buffer.append(1, _message(4))
+    buffer.update(1, _message(2, 'edited'))
+    buffer.remove(1, 3)
+    buffer.add_reaction(1, 4, {'user_id': 1, 'emoji_type': 1,
+                               'emoji_id': None, 'emoji_text': 'x'})
+
+    result = buffer.query(1, 10)
+    assert _ids(result) == [4, 2, 1]
+    assert result[0][1][0]['emoji_text'] == 'x'
+    assert result[1][0]['content'] == 'edited'
+    assert 'reactions' not in result[0][0]
+
+
+def test_message_buffer_depth():
+    buffer = _seeded(range(1, 4), depth=3)
+    buffer.append(1, _message(4))
+
+    assert _ids(buffer.query(1, 3)) == [4, 3, 2]
+
+    # message 1 fell off the buffer
+    assert buffer.query(1, 4) is None
+
+
+def test_message_buffer_stale_seed():
+    buffer = MessageBuffer()
+
+    generation = buffer.generation(1)
+    buffer.append(1, _message(2))
+    buffer.seed(1, generation, [_message(1)], {}, True)
+
+    assert buffer.query(1, 10) is None
+
+
+def test_message_buffer_seed_generations():
+    buffer = MessageBuffer()
+
+    # channels without a seed in flight keep no generation
+    buffer.append(1, _message(1))
+    buffer.drop(2)
+    assert not buffer._seeds
+
+    generation = buffer.generation(1)
+    buffer.abort_seed(1)
+    assert not buffer._seeds
+
+    first = buffer.generation(1)
+    second = buffer.generation(1)
+    buffer.seed(1, first, [_message(1)], {}, True)
+    assert buffer._seeds
+
+    buffer.seed(1, second, [_message(1)], {}, True)
+    assert not buffer._seeds
+    assert buffer.query(1, 10) is not None
+    assert generation == first
+
+
+def test_message_buffer_lru_eviction():
+    buffer = _seeded(range(1, 4))
+    buffer.max_bytes = buffer.stats['bytes'] * 2
+
+    for channel_id in (2, 3):
+        buffer.seed(channel_id, buffer.generation(channel_id),
+                    [_message(mid) for mid in range(1, 4)], {}, True)
+
+    assert buffer.query(1, 1) is None
+    assert buffer.query(3, 1) is not None
+    assert buffer.stats['evictions'] == 1
+
+
+def test_message_buffer_invalidate_user():
+    buffer = MessageBuffer()
+
+    for channel_id in (1, 2):
+        buffer.seed(channel_id, buffer.generation(channel_id), [{
+            **_message(channel_id),
+            'author': {'id': str(channel_id * 10)},
+            'mentions': [{'id': '30', 'member': {'nick': 'old'}}],
+        }], {}, True)
+
+    buffer.invalidate_user(10)
+    assert buffer.query(1, 10) is None
+    assert buffer.query(2, 10) is not None
+
+    # both channels mention the user
+    buffer.invalidate_user(30)
+    assert buffer.query(2, 10) is None
+    assert buffer.stats['channels'] == 0
+    assert not buffer._user_channels
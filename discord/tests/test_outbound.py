@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from discord.gateway.encoding import DispatchFrames
+from discord.gateway.outbound import OutboundQueue, coalesce_key
+
+
+def _presence(user_id, status):
+    frames = DispatchFrames('PRESENCE_UPDATE', {
+        'guild_id': '1', 'user': {'id': str(user_id)}, 'status': status,
+    })
+
+    return frames, coalesce_key(frames)
+
+
+@pytest.mark.asyncio
+async def test_outbound_order():
+    queue = OutboundQueue()
+
+    for idx in range(3):
+        queue.put(b'%d' % idx)
+
+    assert [await queue.get() for _ in range(3)] == [b'0', b'1', b'2']
+    assert queue.stats['max_depth'] == 3
+
+
+@pytest.mark.asyncio
+async def test_outbound_coalescing():
+    queue = OutboundQueue()
+
+    queue.put(*_presence(1, 'online'))
+    queue.put(b'message')
+    queue.put(*_presence(1, 'idle'))
+    queue.put(*_presence(2, 'dnd'))
+
+    assert len(queue) == 3
+    assert queue.coalesced == 1
+
+    first = await queue.get()
+    assert first.data['status'] == 'idle'
+    assert await queue.get() == b'message'
+
+    # once written, a presence isn't coalesced anymore
+    queue.put(*_presence(1, 'online'))
+    assert len(queue) == 2
+
+
+def test_outbound_overflow():
+    queue = OutboundQueue(high_water=2, max_size=4, timeout=0)
+
+    for idx in range(3):
+        queue.put(b'x')
+
+    # over the high water mark for longer than the timeout
+    assert queue.overflowing()
+
+    queue = OutboundQueue(high_water=2, max_size=4, timeout=60)
+
+    for idx in range(3):
+        queue.put(b'x')
+
+    assert not queue.overflowing()
+
+    queue.put(b'x')
+    assert queue.overflowing()
+
+
+@pytest.mark.asyncio
+async def test_outbound_join():
+    queue = OutboundQueue()
+    queue.put(b'x')
+
+    async def _writer():
+        await queue.get()
+        queue.task_done()
+
+    await asyncio.wait_for(
+        asyncio.gather(_writer(), queue.join()), 1)
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from discord.permission_engine import GuildPermissions, ADMINISTRATOR
+
+np = pytest.importorskip('numpy')
+
+from discord.permission_matrix import PermissionMatrix  # noqa: E402
+
+
+def _random_state(seed: int, members=60, channels=12, roles=8):
+    rand = random.Random(seed)
+
+    guild_id = 1
+    role_ids = [guild_id] + list(range(2, roles + 2))
+    member_ids = list(range(1000, 1000 + members))
+    channel_ids = list(range(500, 500 + channels))
+
+    role_perms = {role_id: rand.getrandbits(20) & ~ADMINISTRATOR
+                  for role_id in role_ids}
+    role_perms[role_ids[-1]] = ADMINISTRATOR
+
+    member_roles = {
+        member_id: (guild_id,) + tuple(rand.sample(role_ids[1:], 2))
+        for member_id in member_ids}
+
+    overwrites = {}
+    for channel_id in channel_ids:
+        targets = rand.sample(role_ids, 3) + rand.sample(member_ids, 2)
+        overwrites[channel_id] = {
+            target: (rand.getrandbits(20), rand.getrandbits(20))
+            for target in targets}
+
+    return GuildPermissions(guild_id, member_ids[0], role_perms,
+                            member_roles, overwrites)
+
+
+def _assert_matches(state, matrix):
+    for member_id in state.members:
+        base = state.base(member_id)
+        row = matrix.row(state, member_id)
+
+        assert set(row) == set(state.overwrites)
+
+        for channel_id, perms in row.items():
+            assert perms == state.channel(base, member_id, channel_id)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matrix_matches_engine(seed):
+    state = _random_state(seed)
+    _assert_matches(state, PermissionMatrix(state))
+
+
+def test_matrix_updates():
+    state = _random_state(42)
+    matrix = PermissionMatrix(state)
+
+    # role changes for an existing member
+    state.members[1001] = (1, 2)
+    matrix.update_member(state, 1001)
+
+    # a member that joined after the matrix was built
+    state.members[5000] = (1, 3)
+    matrix.update_member(state, 5000)
+
+    # overwrite changes, a new channel and a deleted channel
+    state.overwrites[500] = {1: (0, 1 << 10), 1001: (1 << 10, 0)}
+    matrix.update_channel(state, 500)
+
+    state.overwrites[900] = {2: (1 << 11, 0)}
+    matrix.update_channel(state, 900)
+
+    state.overwrites.pop(501)
+    matrix.update_channel(state, 501)
+
+    _assert_matches(state, matrix)
+
+    column = matrix.column(state, 900, [1001, 5000, 9999])
+    assert column[9999] == state.channel(state.base(9999), 9999, 900)
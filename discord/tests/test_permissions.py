@@ -0,0 +1,199 @@
+import pytest
+
+from tests.common import (
+    login, get_uid, user_id_of, create_guild, delete_guild
+)
+
+from discord.storage import Storage
+from discord.permissions import (
+    get_permissions, base_permissions, role_permissions
+)
+from discord.permission_engine import (
+    GuildPermissions, PermissionEngine, ADMINISTRATOR
+)
+
+
+def _state():
+    # guild 1: @everyone can read (1 << 10), role 2 can send (1 << 11),
+    # role 3 is an administrator. user 10 owns the guild.
+    return GuildPermissions(1, 10, {
+        1: 1 << 10,
+        2: 1 << 11,
+        3: ADMINISTRATOR,
+    }, {
+        20: (1, 2),
+        30: (1, 3),
+        40: (1,),
+    }, {
+        100: {},
+
+        # deny reading to @everyone, allow to role 2
+        101: {1: (0, 1 << 10), 2: (1 << 10, 0)},
+
+        # deny sending to user 20 specifically
+        102: {20: (0, 1 << 11)},
+    })
+
+
+@pytest.mark.asyncio
+async def test_engine_channel_guilds():
+    class FakeStorage:
+        async def guild_from_channel(self, channel_id):
+            return channel_id // 100
+
+    engine = PermissionEngine(FakeStorage())
+
+    assert await engine.guild_from_channel(101) == 1
+    assert await engine.guild_from_channel(201) == 2
+
+    # dropping a guild forgets its channels only
+    engine.invalidate(1)
+    assert engine._channel_guild == {201: 2}
+
+
+def test_engine_base():
+    state = _state()
+
+    assert state.base(20) == (1 << 10) | (1 << 11)
+    assert state.base(40) == 1 << 10
+    assert state.base(30) & ADMINISTRATOR
+    assert state.base(10) & ADMINISTRATOR
+
+
+def test_engine_overwrites():
+    state = _state()
+
+    assert state.channel(state.base(40), 40, 101) == 0
+    assert state.channel(state.base(20), 20, 101) == (1 << 10) | (1 << 11)
+    assert state.channel(state.base(20), 20, 102) == 1 << 10
+
+    # administrators skip overwrites
+    assert state.channel(state.base(30), 30, 101) & ADMINISTRATOR
+
+    assert state.role(1, 101) == 0
+    assert state.role(2, 101) == (1 << 10) | (1 << 11)
+
+
+async def _assert_equivalent(app, guild_id: int):
+    """Compare every permission the engine gives for a guild
+    with the database implementation, returning how many
+    channel permissions were compared."""
+    legacy = Storage(app.db)
+
+    member_ids = await legacy.get_member_ids(guild_id)
+    channel_ids = await legacy.get_channel_ids(guild_id)
+    roles = await legacy.get_role_data(guild_id)
+    checked = 0
+
+    for member_id in member_ids:
+        assert (await base_permissions(member_id, guild_id)).binary == \
+            (await base_permissions(member_id, guild_id, legacy)).binary
+
+        for channel_id in channel_ids:
+            engine_perms = await get_permissions(member_id, channel_id)
+            db_perms = await get_permissions(
+                member_id, channel_id, storage=legacy)
+
+            assert engine_perms.binary == db_perms.binary
+            checked += 1
+
+    for role in roles:
+        for channel_id in channel_ids:
+            engine_perms = await role_permissions(
+                guild_id, int(role['id']), channel_id)
+            db_perms = await role_permissions(
+                guild_id, int(role['id']), channel_id, legacy)
+
+            assert engine_perms.binary == db_perms.binary
+            checked += 1
+
+    return checked
+
+
+@pytest.mark.asyncio
+async def test_engine_matches_db(app):
+    owner_id = await user_id_of(app.db, 'normal')
+    member_id = await user_id_of(app.db, 'admin')
+    guild = await create_guild(app.db, owner_id, [member_id])
+
+    try:
+        async with app.app_context():
+            checked = await _assert_equivalent(app, guild['id'])
+            muted = await get_permissions(
+                member_id, guild['channel_ids']['muted'])
+
+        # the member overwrite is applied
+        assert muted.bits.read_messages
+        assert not muted.bits.send_messages
+
+        # members x channels, roles x channels
+        assert checked == 2 * 3 + 3 * 3
+    finally:
+        await delete_guild(app.db, guild)
+
+
+@pytest.mark.asyncio
+async def test_engine_invalidation(app, test_cli):
+    token = await login('normal', test_cli)
+    other_token = await login('admin', test_cli)
+    other_id = int(await get_uid(other_token, test_cli))
+
+    resp = await test_cli.post('/api/v6/guilds', headers={
+        'Authorization': token
+    }, json={
+        'name': 'permission engine test',
+        'region': 'brazil',
+    })
+
+    assert resp.status_code == 200
+    guild = await resp.json
+    guild_id = int(guild['id'])
+    channel_id = int(guild['channels'][0]['id'])
+
+    async def _check():
+        async with app.app_context():
+            await _assert_equivalent(app, guild_id)
+
+    try:
+        resp = await test_cli.post(
+            f'/api/v6/channels/{channel_id}/invites',
+            headers={'Authorization': token}, json={})
+        invite = await resp.json
+
+        await test_cli.post(f'/api/v6/invite/{invite["code"]}',
+                            headers={'Authorization': other_token})
+        await _check()
+
+        resp = await test_cli.post(
+            f'/api/v6/guilds/{guild_id}/roles',
+            headers={'Authorization': token},
+            json={'name': 'senders', 'permissions': 1 << 11})
+        role_id = int((await resp.json)['id'])
+        await _check()
+
+        await test_cli.patch(
+            f'/api/v6/guilds/{guild_id}/members/{other_id}',
+            headers={'Authorization': token},
+            json={'roles': [str(role_id)]})
+        await _check()
+
+        await test_cli.put(
+            f'/api/v6/channels/{channel_id}/permissions/{role_id}',
+            headers={'Authorization': token},
+            json={'allow': 0, 'deny': 1 << 11, 'type': 'role'})
+        await _check()
+
+        await test_cli.patch(
+            f'/api/v6/guilds/{guild_id}/roles/{role_id}',
+            headers={'Authorization': token},
+            json={'permissions': ADMINISTRATOR})
+        await _check()
+
+        await test_cli.delete(
+            f'/api/v6/guilds/{guild_id}/roles/{role_id}',
+            headers={'Authorization': token})
+        await _check()
+    finally:
+        await test_cli.delete(f'/api/v6/guilds/{guild_id}', headers={
+            'Authorization': token
+        })
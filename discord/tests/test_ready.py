@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from discord.gateway.ready import (
+    ReadyTimings, bounded_gather, ready_semaphore
+)
+
+
+@pytest.mark.asyncio
+async def test_bounded_gather():
+    running = 0
+    peak = 0
+
+    async def _work(value):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+
+        # later ones finish first
+        await asyncio.sleep(0.01 * (5 - value))
+
+        running -= 1
+        return value
+
+    semaphore = asyncio.Semaphore(2)
+    results, other = await asyncio.gather(
+        bounded_gather(semaphore, (_work(val) for val in range(5))),
+        bounded_gather(semaphore, (_work(val) for val in range(5))))
+
+    # the limit is shared by both
+    assert results == other == list(range(5))
+    assert peak == 2
+
+
+def test_ready_semaphore():
+    semaphore = ready_semaphore({'POSTGRES': {'max_size': 20}})
+    assert semaphore._value == 10
+
+    semaphore = ready_semaphore({'POSTGRES': {},
+                                 'READY_CONCURRENCY': 3})
+    assert semaphore._value == 3
+
+
+@pytest.mark.asyncio
+async def test_ready_timings():
+    timings = ReadyTimings()
+
+    async def _value():
+        await asyncio.sleep(0.01)
+        return 42
+
+    assert await timings.section('value', _value()) == 42
+    assert timings.sections['value'] >= 10
+    assert timings.total >= timings.sections['value']
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from discord import request_cache
+
+
+def _counted():
+    calls = []
+
+    async def _lookup():
+        calls.append(1)
+        return len(calls)
+
+    return calls, _lookup
+
+
+@pytest.mark.asyncio
+async def test_request_cache_memoizes():
+    calls, lookup = _counted()
+    cache = request_cache.start()
+
+    assert await request_cache.memoize('key', lookup, 3) == 1
+    assert await request_cache.memoize('key', lookup, 3) == 1
+    assert await request_cache.memoize('other', lookup) == 2
+
+    assert len(calls) == 2
+    assert cache.hits == 1
+    assert cache.queries_saved == 3
+
+    request_cache.clear()
+    assert await request_cache.memoize('key', lookup) == 3
+
+    assert request_cache.finish('test') is cache
+    assert request_cache.current() is None
+
+
+@pytest.mark.asyncio
+async def test_request_cache_outside_request():
+    calls, lookup = _counted()
+
+    await request_cache.memoize('key', lookup)
+    await request_cache.memoize('key', lookup)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_request_cache_spawned_tasks():
+    calls, lookup = _counted()
+
+    async def _after_request():
+        await request_cache.memoize('key', lookup)
+
+    request_cache.start()
+    await request_cache.memoize('key', lookup)
+
+    # tasks copy the context of the request that spawned them,
+    # but must not use the cache once the request is done.
+    spawned = asyncio.get_event_loop().create_task(_after_request())
+    request_cache.finish('test')
+    await spawned
+
+    assert len(calls) == 2
@@ -0,0 +1,61 @@
+from discord.gateway.state import ResumeBuffer
+
+
+def _fill(buffer, start, end, size=10):
+    for seq in range(start, end + 1):
+        buffer.append(seq, 'MESSAGE_CREATE', 'json', b'x' * size)
+
+
+def _seqs(entries):
+    return [entry[0] for entry in entries]
+
+
+def test_resume_buffer_replay():
+    buffer = ResumeBuffer(max_events=5)
+    _fill(buffer, 1, 3)
+
+    assert _seqs(buffer.replay(2, 3)) == [2, 3]
+    assert buffer.get(4) is None
+    assert buffer.stats['bytes'] == 30
+
+
+def test_resume_buffer_event_limit():
+    buffer = ResumeBuffer(max_events=5)
+    _fill(buffer, 1, 8)
+
+    assert len(buffer) == 5
+    assert buffer.first == 4
+    assert _seqs(buffer.replay(1, 8)) == [4, 5, 6, 7, 8]
+    assert buffer.nbytes == 50
+
+
+def test_resume_buffer_byte_limit():
+    buffer = ResumeBuffer(max_events=100, max_bytes=35)
+    _fill(buffer, 1, 5)
+
+    assert _seqs(buffer.replay(1, 5)) == [3, 4, 5]
+
+    # too big to be kept at all
+    buffer.append(6, 'READY', 'json', b'x' * 100)
+    assert buffer.get(6) is None
+    assert _seqs(buffer.replay(1, 6)) == [3, 4, 5]
+    assert buffer.nbytes == 30
+
+
+def test_resume_buffer_missing():
+    buffer = ResumeBuffer(max_events=100, max_bytes=35)
+    _fill(buffer, 1, 2)
+
+    assert buffer.first_missing(1, 2) is None
+
+    # a hole left by a dispatch too big to be kept
+    buffer.append(3, 'GUILD_CREATE', 'json', b'x' * 100)
+    _fill(buffer, 4, 4)
+
+    assert buffer.first_missing(4, 4) is None
+    assert buffer.first_missing(2, 4) == 3
+
+    # and the ones evicted to make room
+    _fill(buffer, 5, 7)
+    assert buffer.first_missing(1, 7) == 1
+    assert buffer.first_missing(5, 7) is None
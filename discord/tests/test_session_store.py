@@ -0,0 +1,102 @@
+import pytest
+
+from discord.gateway.encoding import DispatchFrames
+from discord.gateway.state import GatewayState, ResumeBuffer
+from discord.gateway.session_store import (
+    FileSessionStore, snapshot, restore
+)
+from discord.pubsub.delivery import Delivery
+
+
+def _fill(buffer, start, end):
+    for seq in range(start, end + 1):
+        buffer.append(seq, 'MESSAGE_CREATE', 'json', b'{"s":%d}' % seq)
+
+
+def test_resume_buffer_load():
+    buffer = ResumeBuffer(max_events=10)
+    _fill(buffer, 1, 8)
+
+    # a buffer with smaller limits keeps the newest frames
+    smaller = ResumeBuffer(max_events=4)
+    smaller.load(buffer.dump())
+
+    assert (smaller.first, smaller.last) == (5, 8)
+    assert [entry[0] for entry in smaller.replay(1, 8)] == [5, 6, 7, 8]
+    assert smaller.evicted == 4
+    assert smaller.nbytes == sum(len(entry[3])
+                                 for entry in smaller.replay(5, 8))
+
+
+@pytest.mark.asyncio
+async def test_session_store(tmp_path):
+    state = GatewayState(user_id=1, bot=False, compress=False, large=250,
+                         shard=[0, 1], current_shard=0, shard_count=1)
+    state.presence = {'status': 'online', 'game': None}
+
+    for seq in range(1, 4):
+        state.seq = seq
+        state.store.append(seq, 'MESSAGE_CREATE', 'etf', bytes([131, seq]))
+
+    store = FileSessionStore(str(tmp_path / 'sessions.json'))
+    await store.save([snapshot(state)])
+
+    loaded = [restore(data) for data in await store.load()]
+    assert len(loaded) == 1
+
+    restored = loaded[0]
+    assert restored.restored
+    assert restored.session_id == state.session_id
+    assert restored.user_id == 1
+    assert restored.seq == 3
+    assert restored.presence == state.presence
+    assert restored.store.replay(2, 3) == state.store.replay(2, 3)
+
+    # sessions are only restored once
+    assert await store.load() == []
+
+
+@pytest.mark.asyncio
+async def test_session_store_workers(tmp_path):
+    store = FileSessionStore(str(tmp_path / 'sessions.json'))
+    await store.save([snapshot(GatewayState(user_id=1))])
+
+    saved, = tmp_path.iterdir()
+    assert saved.stat().st_mode & 0o777 == 0o600
+
+    # another worker's save doesn't replace it
+    other = tmp_path / f'{saved.name}0'
+    other.write_text(saved.read_text())
+
+    assert len(await store.load()) == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_session_store_max_age(tmp_path):
+    store = FileSessionStore(str(tmp_path / 'sessions.json'), max_age=-1)
+    await store.save([snapshot(GatewayState(user_id=1))])
+
+    assert await store.load() == []
+
+
+@pytest.mark.asyncio
+async def test_restored_dispatches():
+    state = GatewayState(user_id=1, bot=False, compress=False, large=250,
+                         shard=[0, 1], current_shard=0, shard_count=1,
+                         encoding='etf')
+    state.seq = 3
+
+    restored = restore(snapshot(state))
+    assert restored.encoding == 'etf'
+
+    # dispatches before the session is resumed are kept
+    delivery = Delivery()
+    sessions = await delivery.deliver(
+        [restored], DispatchFrames('MESSAGE_CREATE', {}))
+
+    assert sessions == [restored.session_id]
+    assert not delivery.failed
+    assert restored.seq == 4
+    assert [entry[:3] for entry in restored.store.replay(4, 4)] == [
+        (4, 'MESSAGE_CREATE', 'etf')]
@@ -0,0 +1,86 @@
+from discord.gateway.state import GatewayState
+from discord.gateway.state_manager import StateManager
+
+
+def _state(user_id: int, status: str) -> GatewayState:
+    state = GatewayState(user_id=user_id, current_shard=0, shard_count=1)
+    state.presence = {'status': status, 'game': None}
+    return state
+
+
+def test_online_states():
+    manager = StateManager()
+
+    for user_id, status in ((1, 'online'), (2, 'offline'),
+                            (3, 'idle'), (4, 'dnd')):
+        manager.insert(_state(user_id, status))
+
+    # a second session doesn't give a second presence
+    manager.insert(_state(1, 'online'))
+
+    member_ids = [1, 2, 3, 4, 5]
+    states = manager.online_states(member_ids, 1)
+    assert [state.user_id for state in states] == [1, 3, 4]
+
+    states = manager.online_states(member_ids, 1, limit=2)
+    assert [state.user_id for state in states] == [1, 3]
+
+    # members that never connected aren't added to the manager
+    assert 5 not in manager.states
+
+
+def test_guild_index():
+    manager = StateManager()
+
+    first, second, other = _state(1, 'online'), _state(1, 'idle'), \
+        _state(2, 'online')
+    restored = _state(2, 'online')
+
+    for state in (first, second, other, restored):
+        manager.insert(state)
+
+    # only states with a connection get indexed
+    for state in (first, second, other):
+        state.ws = object()
+
+    manager.index_member(1, 10)
+    manager.index_member(2, 10)
+
+    assert set(manager.guild_sessions(10)) == {first, second, other}
+    assert manager.guild_user_states(10, 2) == [other]
+
+    # a user is stale once their last state goes away
+    manager.remove(first)
+    assert manager.guild_user_states(10, 1) == [second]
+    assert manager.pop_stale(10) == []
+
+    manager.remove(second)
+    manager.remove(other)
+    assert manager.guild_sessions(10) == []
+    assert manager.guild_index == {}
+
+    # and not anymore if they came back in the meantime
+    manager.insert(second)
+    manager.index_member(1, 10)
+    assert manager.pop_stale(10) == [2]
+
+    manager.unindex_member(1, 10)
+    assert second.guild_ids == set()
+    assert manager.guild_sessions(10) == []
+
+
+def test_guild_index_offline():
+    manager = StateManager()
+
+    # joining a guild while offline, or only on other shards
+    manager.index_member(1, 10)
+
+    state = _state(2, 'online')
+    state.ws = object()
+    state.shard_count = 2
+    state.current_shard = 1
+    manager.insert(state)
+    manager.index_member(2, 10)
+
+    assert sorted(manager.pop_stale(10)) == [1, 2]
+    assert manager.guild_index == {}
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from discord.channel_cache import ChannelCache
+from discord.gateway.admission import AdmissionController
+from discord.gateway.state import GatewayState
+from discord.gateway.state_manager import StateManager
+from discord.guild_cache import GuildCache
+from discord.message_buffer import MessageBuffer
+from discord.permission_engine import PermissionEngine
+from discord.pubsub.delivery import Delivery
+from discord.stats import collect
+
+
+def test_collect():
+    state_manager = StateManager()
+    state = GatewayState(user_id=1)
+    state.store.append(1, 'MESSAGE_CREATE', 'json', b'{}')
+    state_manager.insert(state)
+
+    app = SimpleNamespace(
+        state_manager=state_manager,
+        admission=AdmissionController(),
+        dispatcher=SimpleNamespace(delivery=Delivery()),
+        guild_cache=GuildCache(),
+        channel_cache=ChannelCache(),
+        message_buffer=MessageBuffer(),
+        perm_engine=PermissionEngine(None),
+        broker=None,
+    )
+
+    stats = collect(app)
+
+    assert stats['resume'] == {'sessions': 1, 'events': 1, 'bytes': 2}
+    assert stats['outbound']['connections'] == 0
+    assert stats['admission']['active'] == 0
+    assert stats['message_buffer']['channels'] == 0
+    assert 'broker' not in stats